@@ -1,16 +1,21 @@
 from controllability.morris_n4_dc import MorrisN4Dc
+from controllability.morris_n3_dc import MorrisN3Dc
 from temporal_network.tpnu import Tpnu
 from tpn.tpn_autogen import tpn as ParseTpnClass
 
 class DynamicControllability(object):
     SOLVERS = [
-        'morris_n4_dc'
+        'morris_n4_dc',
+        'morris_n3_dc'
     ]
 
     @staticmethod
     def check(network, solver='morris_n4_dc'):
-        if solver == 'morris_n4_dc':
-            alg = MorrisN4Dc()
+        if solver == 'morris_n4_dc' or solver == 'morris_n3_dc':
+            if solver == 'morris_n4_dc':
+                alg = MorrisN4Dc()
+            else:
+                alg = MorrisN3Dc()
             if type(network) == ParseTpnClass:
                 network = Tpnu.from_tpn_autogen(network)
             elif type(network) == Tpnu:
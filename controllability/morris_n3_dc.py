@@ -0,0 +1,311 @@
+import heapq
+
+from controllability.distance_graph_edge import EdgeType
+from controllability.morris_n4_dc import MorrisN4Dc
+from controllability.temporal_consistency import EdgeSupports
+from graph_theory import DistanceGraph
+
+class MorrisN3Dc(MorrisN4Dc):
+    """Implementation based on paper "Dynamic Controllability and Dispatchability
+    Relationships" by Paul Morris (2014).
+
+    Every negative node (a node with a negative edge coming in) is processed
+    once, by a Dijkstra propagation backwards from it along the non-negative
+    edges. A negative node met on the way is processed first, and meeting
+    a node whose processing is still under way closes a negative cycle.
+    Each path that becomes non-negative is added as an ordinary edge.
+
+    The normalized distance graph and the conflict extraction are those
+    of MorrisN4Dc: a derived edge stands for each path, and its support
+    is the first edge of the path and the derived edge of the rest.
+    """
+
+    def __init__(self, epsilon=10E-5):
+        MorrisN4Dc.__init__(self)
+        self.epsilon = epsilon
+        # node -> ids of the edges coming into it
+        self.incoming_edges = None
+        self.negative_nodes = set()
+        # negative nodes whose processing has terminated
+        self.processed = set()
+        # negative node -> the nodes its propagation went through
+        self.visited_nodes = {}
+
+    def check(self, network):
+        # Generate distance graph from stnu.
+        graph, edges, K = self.generate_graph_from_tpnu(network)
+
+        self.incoming_edges = [[] for _ in range(graph.num_nodes + 1)]
+        self.negative_nodes = set()
+        for edge in edges:
+            self.incoming_edges[graph.edge_to[edge]].append(edge)
+            if graph.edge_value[edge] < 0:
+                self.negative_nodes.add(graph.edge_to[edge])
+
+        self.processed = set()
+        self.visited_nodes = {}
+        return self.process_negative_nodes()
+
+    def process_negative_nodes(self):
+        for node in sorted(self.negative_nodes):
+            if node not in self.processed:
+                negative_cycle = self.back_propagate_all(node, self.processed)
+                if negative_cycle is not None:
+                    return self.extract_conflict(negative_cycle)
+
+        return None
+
+    def back_propagate_all(self, node, processed):
+        # Process node, and the negative nodes its propagation meets, in the
+        # order of the recursion of the paper. The recursion is kept on
+        # an explicit stack of the propagations under way, which wait for
+        # the nodes they are given back to be processed.
+        # Returns the edges of a negative cycle, or None
+        sources = [node]
+        propagations = [self.back_propagate(node)]
+        # for each propagation but the last, the edge of the path from the
+        # node it waits for (the source of the next one) to its own source
+        waiting_edges = []
+
+        while len(propagations) > 0:
+            try:
+                negative_node, path_edge = next(propagations[-1])
+            except StopIteration:
+                processed.add(sources.pop())
+                propagations.pop()
+                if len(waiting_edges) > 0:
+                    waiting_edges.pop()
+                continue
+
+            if negative_node in processed:
+                continue
+
+            if negative_node in sources:
+                # An ancestor call with the same source: the paths from each
+                # source to the source of the propagation it waits on close a cycle
+                start = sources.index(negative_node)
+                return [path_edge] + list(reversed(waiting_edges[start:]))
+
+            sources.append(negative_node)
+            propagations.append(self.back_propagate(negative_node))
+            waiting_edges.append(path_edge)
+
+        return None
+
+    def back_propagate(self, source):
+        # Generator of the negative nodes to process before going on,
+        # with the edge of their path to source
+        graph = self.graph
+        fro = graph.edge_fro
+        value = graph.edge_value
+        edge_type = graph.edge_type
+        letter = graph.edge_letter
+        incoming_edges = self.incoming_edges
+
+        # node -> distance to source, the derived edge of its path,
+        # and the letter of the upper case edge the path starts with (or 0)
+        distance = {}
+        path = {}
+        path_letter = {}
+        queue = []
+
+        for edge in incoming_edges[source]:
+            node = fro[edge]
+            if value[edge] < 0 and (node not in distance or value[edge] < distance[node]):
+                distance[node] = value[edge]
+                path[node] = edge
+                path_letter[node] = letter[edge] if edge_type[edge] == EdgeType.UPPER_CASE else 0
+                heapq.heappush(queue, (value[edge], node))
+
+        visited = set()
+        self.visited_nodes[source] = visited
+        while len(queue) > 0:
+            node_distance, node = heapq.heappop(queue)
+            if node in visited or node_distance > distance[node]:
+                continue
+            visited.add(node)
+
+            if node_distance >= -self.epsilon:
+                # the path is no longer negative: its derived edge becomes
+                # an ordinary edge of the graph (label removal for paths
+                # starting with an upper case edge)
+                if node != source:
+                    incoming_edges[source].append(path[node])
+                continue
+
+            if node in self.negative_nodes:
+                yield node, path[node]
+
+            for edge in incoming_edges[node]:
+                if value[edge] < 0:
+                    continue
+                # a lower case edge of the contingent link of the upper case edge
+                # the path starts with is unsuitable (paper terminology)
+                if edge_type[edge] == EdgeType.LOWER_CASE and letter[edge] == path_letter[node]:
+                    continue
+
+                predecessor = fro[edge]
+                new_distance = node_distance + value[edge]
+                if predecessor not in distance or new_distance < distance[predecessor] - self.epsilon:
+                    distance[predecessor] = new_distance
+                    path[predecessor] = graph.add_edge(predecessor, source, new_distance,
+                                                       parents=(edge, path[node]))
+                    if edge_type[edge] == EdgeType.LOWER_CASE:
+                        # As the moats of MorrisN4Dc, a lower case edge reduced with
+                        # a negative path gives another way to resolve a conflict:
+                        # making that path non-negative
+                        self.moat_edges.add(path[predecessor])
+                    path_letter[predecessor] = path_letter[node]
+                    heapq.heappush(queue, (new_distance, predecessor))
+
+
+class IncrementalMorrisN3Dc(MorrisN3Dc):
+    """MorrisN3Dc that keeps its distance graph and the processing of
+    negative nodes between calls, for networks that differ a little.
+
+    The graph is kept in between: only the edges of the constraints whose
+    bounds changed, or that were activated, are added again. The propagation
+    from a negative node only reads the edges coming into the nodes it goes
+    through, among which the edges derived by processing the negative nodes
+    it meets. Its derived edges stay the same unless one of those nodes has
+    different edges coming in, or is a negative node processed again. Only
+    these negative nodes are processed again, from the edges that changed
+    (in the spirit of the incremental algorithm of Nilsson et al.).
+
+    The graph has the same edges and nodes as the one of
+    generate_graph_from_tpnu: a controllable constraint between the same
+    nodes as a previous one goes through a node of its own, which is kept
+    for it between calls, as the node of a contingent link is.
+    """
+
+    # The edges of previous calls stay in the graph. It is built again
+    # when it has grown that many times bigger than when it was last built
+    COMPACTION = 8
+
+    def __init__(self, epsilon=10E-5):
+        MorrisN3Dc.__init__(self, epsilon)
+        # constraint id -> what its edges were made from, and their ids
+        self.constraint_edges = {}
+        # constraint id -> the node added for its contingent link
+        self.added_nodes = {}
+        # node -> number of edges coming in that are not derived
+        self.base_edges = []
+        self.full_size = 0
+
+    def reset(self, network):
+        graph = DistanceGraph(network.num_nodes)
+        self.graph = graph
+        self.edge_support = EdgeSupports(graph)
+        self.moat_edges = set()
+        self.start_node = network.start_node
+        self.incoming_edges = [[] for _ in range(graph.num_nodes + 1)]
+        self.negative_nodes = set()
+        self.processed = set()
+        self.visited_nodes = {}
+        self.constraint_edges = {}
+        self.added_nodes = {}
+        self.base_edges = [0] * (graph.num_nodes + 1)
+        self.full_size = 0
+
+    def check(self, network):
+        network.initialize()
+        if self.graph is None or self.graph.num_edges() > self.COMPACTION * self.full_size:
+            self.reset(network)
+
+        changed = self.update_edges(network)
+        if self.full_size == 0:
+            self.full_size = self.graph.num_edges()
+
+        # the processed negative nodes to process again
+        again = set(source for source in self.processed
+                    if source in changed or not self.visited_nodes[source].isdisjoint(changed))
+        grown = len(again) > 0
+        while grown:
+            grown = False
+            for source in self.processed - again:
+                if not self.visited_nodes[source].isdisjoint(again):
+                    again.add(source)
+                    grown = True
+        self.processed -= again
+
+        # drop the edges derived by the negative nodes not processed
+        for node in range(1, self.graph.num_nodes + 1):
+            if node not in self.processed:
+                del self.incoming_edges[node][self.base_edges[node]:]
+
+        return self.process_negative_nodes()
+
+    def update_edges(self, network):
+        # add the edges of the constraints that changed, and update the base
+        # edges coming into their nodes. Returns the nodes they come into
+        graph = self.graph
+        constraint_edges = {}
+        changed = set()
+        encoded_node_pairs = {}
+
+        for e in network.temporal_constraints.values():
+            # We only consider constraints that are active
+            if not e.activated:
+                continue
+            if e.fro == 0 or e.to == 0:
+                raise Exception("Node with id zero is not allowed (see documentation for check function.)")
+
+            # as in generate_graph_from_tpnu, no two controllable
+            # constraints share the same from and to nodes
+            duplicate = False
+            if e.controllable:
+                duplicate = (e.fro, e.to) in encoded_node_pairs
+                encoded_node_pairs[(e.fro, e.to)] = True
+            elif e.lower_bound == 0:
+                encoded_node_pairs[(e.fro, e.to)] = True
+
+            description = (e.fro, e.to, e.controllable, duplicate, e.lower_bound, e.get_lower_bound(), e.get_upper_bound())
+            if e.id in self.constraint_edges and self.constraint_edges[e.id][0] == description:
+                constraint_edges[e.id] = self.constraint_edges[e.id]
+                continue
+
+            edge_list = []
+            if e.controllable and not duplicate:
+                self.add_controllable(graph, edge_list, e.fro, e.to, e.get_lower_bound(), e.get_upper_bound(), e.id)
+            elif e.controllable:
+                new_node = self.added_node(network, e.id, network.node_number_to_id[e.to] + "'")
+                self.add_controllable(graph, edge_list, e.fro, new_node, e.get_lower_bound(), e.get_upper_bound(), e.id)
+                self.add_controllable(graph, edge_list, new_node, e.to, 0, 0, None)
+            elif e.lower_bound == 0:
+                self.add_uncontrollable(graph, edge_list, e.fro, None, e.to, e.get_lower_bound(), e.get_upper_bound(), e.id)
+            else:
+                new_node = self.added_node(network, e.id, network.node_number_to_id[e.fro] + "'")
+                self.add_uncontrollable(graph, edge_list, e.fro, new_node, e.to,
+                                        e.get_lower_bound(), e.get_upper_bound(), e.id)
+            constraint_edges[e.id] = (description, edge_list)
+            changed.update(graph.edge_to[edge] for edge in edge_list)
+
+        for id, (description, edge_list) in self.constraint_edges.items():
+            if id not in constraint_edges or constraint_edges[id][1] is not edge_list:
+                changed.update(graph.edge_to[edge] for edge in edge_list)
+        self.constraint_edges = constraint_edges
+
+        if len(changed) > 0:
+            for node in changed:
+                self.incoming_edges[node] = []
+                self.negative_nodes.discard(node)
+            for description, edge_list in constraint_edges.values():
+                for edge in edge_list:
+                    node = graph.edge_to[edge]
+                    if node in changed:
+                        self.incoming_edges[node].append(edge)
+                        if graph.edge_value[edge] < 0:
+                            self.negative_nodes.add(node)
+            for node in changed:
+                self.base_edges[node] = len(self.incoming_edges[node])
+
+        return changed
+
+    def added_node(self, network, constraint_id, name):
+        # the node added to the graph for a constraint
+        if constraint_id not in self.added_nodes:
+            self.added_nodes[constraint_id] = self.graph.add_node()
+            network.node_number_to_id[self.added_nodes[constraint_id]] = name
+            self.incoming_edges.append([])
+            self.base_edges.append(0)
+        return self.added_nodes[constraint_id]
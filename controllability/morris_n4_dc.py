@@ -1,9 +1,9 @@
 from collections import defaultdict
 from queue import PriorityQueue
 
-from graph_theory import spfa
-from controllability.distance_graph_edge import EdgeType, DistanceGraphEdge
-from controllability.temporal_consistency import EdgeSupport
+from graph_theory import spfa, DistanceGraph
+from controllability.distance_graph_edge import EdgeType
+from controllability.temporal_consistency import EdgeSupport, EdgeSupports
 import math
 
 class MorrisN4Dc(object):
@@ -11,105 +11,27 @@ class MorrisN4Dc(object):
     Dynamic Controllability" by Paul Morris"""
 
     def __init__(self):
-        self.edge_support = {}
+        self.graph = None
+        # edge id -> support, of the edges of the graph
+        self.edge_support = None
         self.moat_edges = set()
         self.includeReductionCycle = True
         self.start_node = 0
+        # ids of the edges from the artificial node 0
+        self.source_edges = []
 
     def generate_graph_from_tpnu(self, network):
         """Generates graph of edges from a tpnu"""
 
-        num_nodes = network.num_nodes
+        graph = DistanceGraph(network.num_nodes)
+        self.graph = graph
+        self.edge_support = EdgeSupports(graph)
         self.start_node = network.start_node
         edge_list = []
 
         if hasattr(network, 'node_number_to_id'):
             renaming = network.node_number_to_id
 
-        def add_controllable(fro, to, lb, ub, edge_id):
-
-            # lb cannot be larger than ub
-            # assert lb <= ub
-
-            ub_edge = DistanceGraphEdge(fro, to, ub, EdgeType.SIMPLE, renaming=renaming)
-            lb_edge = DistanceGraphEdge(to, fro, -lb, EdgeType.SIMPLE, renaming=renaming)
-            if edge_id is not None:
-                self.edge_support[ub_edge] = EdgeSupport.base({
-                                                                 (EdgeSupport.UPPER, edge_id): 1,
-                                                              })
-                self.edge_support[lb_edge] = EdgeSupport.base({
-                                                                  (EdgeSupport.LOWER, edge_id): -1,
-                                                              })
-            else:
-                self.edge_support[ub_edge] = EdgeSupport.base({})
-                self.edge_support[lb_edge] = EdgeSupport.base({})
-
-            if not math.isinf(ub):
-                edge_list.append(ub_edge)
-                # print("UB edge: "+ str(ub_edge))
-            # else:
-            #     print("Ignoring +inf UB of " + e.id)
-
-            if not math.isinf(lb):
-                edge_list.append(lb_edge)
-                # print("LB edge: "+ str(lb_edge))
-            # else:
-            #     print("Ignoring -inf LB of " + e.id)
-
-        def add_uncontrollable(fro, new_node, to, lb, ub, edge_id):
-
-            # no negative lower bound
-            # no infinite upperbound
-            assert lb <= ub
-            assert not lb < 0
-            assert not math.isinf(ub)
-
-            if new_node is not None:
-                lb_ub_edge = DistanceGraphEdge(fro, new_node, lb, EdgeType.SIMPLE, renaming=renaming)
-                lb_lb_edge = DistanceGraphEdge(new_node, fro, -lb, EdgeType.SIMPLE, renaming=renaming)
-                self.edge_support[lb_ub_edge] = EdgeSupport.base({
-                                                                    (EdgeSupport.LOWER, edge_id): 1,
-                                                                 })
-                self.edge_support[lb_lb_edge] = EdgeSupport.base({
-                                                                    (EdgeSupport.LOWER, edge_id): -1,
-                                                                })
-
-                edge_list.append(lb_ub_edge)
-                edge_list.append(lb_lb_edge)
-
-                # print("LBUB edge: "+ str(lb_ub_edge))
-                # print("LBLB edge: "+ str(lb_lb_edge))
-            else:
-                new_node = fro
-
-            ub_edge = DistanceGraphEdge(new_node, to, ub-lb, EdgeType.SIMPLE, renaming=renaming)
-            lb_edge = DistanceGraphEdge(to, new_node, 0, EdgeType.SIMPLE, renaming=renaming)
-
-            self.edge_support[ub_edge] = EdgeSupport.base({
-                                                              (EdgeSupport.LOWER, edge_id): -1,
-                                                              (EdgeSupport.UPPER, edge_id): 1,
-                                                          })
-            self.edge_support[lb_edge] = EdgeSupport.base({})
-
-            ub_cond_edge = DistanceGraphEdge(to, new_node, lb-ub, EdgeType.UPPER_CASE, to, renaming=renaming)
-            lb_cond_edge = DistanceGraphEdge(new_node, to, 0, EdgeType.LOWER_CASE, to, renaming=renaming)
-
-            self.edge_support[ub_cond_edge] =  EdgeSupport.base({
-                                                                (EdgeSupport.LOWER, edge_id): 1,
-                                                                (EdgeSupport.UPPER, edge_id): -1,
-                                                           })
-            self.edge_support[lb_cond_edge] = EdgeSupport.base({})
-
-            edge_list.append(ub_edge)
-            edge_list.append(lb_edge)
-            edge_list.append(ub_cond_edge)
-            edge_list.append(lb_cond_edge)
-
-            # print("UB edge: "+ str(ub_edge))
-            # print("LB edge: "+ str(lb_edge))
-            # print("UB cond edge: "+ str(ub_cond_edge))
-            # print("LB cond edge: "+ str(lb_cond_edge))
-
         K = 0
         encoded_node_pairs = {}
         for e in network.temporal_constraints.values():
@@ -121,73 +43,108 @@ class MorrisN4Dc(object):
                 if e.controllable:
                     # Make sure no two edges share the same from and to nodes
                     if (e.fro,e.to) not in encoded_node_pairs:
-                        add_controllable(e.fro,e.to,e.get_lower_bound(),e.get_upper_bound(),e.id)
+                        self.add_controllable(graph,edge_list,e.fro,e.to,e.get_lower_bound(),e.get_upper_bound(),e.id)
                         encoded_node_pairs[(e.fro,e.to)] = True
                     else:
-                        new_node = num_nodes + 1
-                        num_nodes += 1
+                        new_node = graph.add_node()
                         renaming[new_node] = renaming[e.to] + "'"
-                        add_controllable(e.fro,new_node,e.get_lower_bound(),e.get_upper_bound(),e.id)
-                        add_controllable(new_node,e.to,0,0,None)
+                        self.add_controllable(graph,edge_list,e.fro,new_node,e.get_lower_bound(),e.get_upper_bound(),e.id)
+                        self.add_controllable(graph,edge_list,new_node,e.to,0,0,None)
                 else:
                     K += 1
                     if e.lower_bound == 0:
-                        add_uncontrollable(e.fro,None,e.to,e.get_lower_bound(),e.get_upper_bound(), e.id)
+                        self.add_uncontrollable(graph,edge_list,e.fro,None,e.to,e.get_lower_bound(),e.get_upper_bound(), e.id)
                         encoded_node_pairs[(e.fro,e.to)] = True
                     else:
                         # contingent edges with bounds [l, u] can be normalized to edge
                         # can be replaced by requirement edge [l,l] followed by upper case edge
-                        new_node = num_nodes + 1
-                        num_nodes += 1
+                        new_node = graph.add_node()
                         renaming[new_node] = renaming[e.fro] + "'"
-                        add_uncontrollable(e.fro, new_node, e.to, e.get_lower_bound(),e.get_upper_bound(), e.id)
+                        self.add_uncontrollable(graph, edge_list, e.fro, new_node, e.to, e.get_lower_bound(),e.get_upper_bound(), e.id)
+
+        return graph, edge_list, K
+
+    @staticmethod
+    def add_controllable(graph, edge_list, fro, to, lb, ub, edge_id):
+
+        # lb cannot be larger than ub
+        # assert lb <= ub
+
+        if not math.isinf(ub):
+            edge_list.append(graph.add_edge(fro, to, ub, constraint=edge_id, upper=1))
+            # print("UB edge: "+ str(graph.edge(edge_list[-1])))
+        # else:
+        #     print("Ignoring +inf UB of " + e.id)
+
+        if not math.isinf(lb):
+            edge_list.append(graph.add_edge(to, fro, -lb, constraint=edge_id, lower=-1))
+            # print("LB edge: "+ str(graph.edge(edge_list[-1])))
+        # else:
+        #     print("Ignoring -inf LB of " + e.id)
+
+    @staticmethod
+    def add_uncontrollable(graph, edge_list, fro, new_node, to, lb, ub, edge_id):
+
+        # no negative lower bound
+        # no infinite upperbound
+        assert lb <= ub
+        assert not lb < 0
+        assert not math.isinf(ub)
+
+        if new_node is not None:
+            lb_ub_edge = graph.add_edge(fro, new_node, lb, constraint=edge_id, lower=1)
+            lb_lb_edge = graph.add_edge(new_node, fro, -lb, constraint=edge_id, lower=-1)
+
+            edge_list.append(lb_ub_edge)
+            edge_list.append(lb_lb_edge)
+
+            # print("LBUB edge: "+ str(graph.edge(lb_ub_edge)))
+            # print("LBLB edge: "+ str(graph.edge(lb_lb_edge)))
+        else:
+            new_node = fro
+
+        ub_edge = graph.add_edge(new_node, to, ub-lb, constraint=edge_id, lower=-1, upper=1)
+        lb_edge = graph.add_edge(to, new_node, 0)
+
+        ub_cond_edge = graph.add_edge(to, new_node, lb-ub, EdgeType.UPPER_CASE, to,
+                                      constraint=edge_id, lower=1, upper=-1)
+        lb_cond_edge = graph.add_edge(new_node, to, 0, EdgeType.LOWER_CASE, to)
 
-        return num_nodes, edge_list, K
+        edge_list.append(ub_edge)
+        edge_list.append(lb_edge)
+        edge_list.append(ub_cond_edge)
+        edge_list.append(lb_cond_edge)
 
-    def allmax(self, num_nodes, edge_list):
+        # print("UB edge: "+ str(graph.edge(ub_edge)))
+        # print("LB edge: "+ str(graph.edge(lb_edge)))
+        # print("UB cond edge: "+ str(graph.edge(ub_cond_edge)))
+        # print("LB cond edge: "+ str(graph.edge(lb_cond_edge)))
+
+    def allmax(self, graph, edge_list):
         """Calculates allmax projection of STNU (see section 2.2).
-        Returns two parameters:
-            success - true if consistent
+        Compiles the projection into the graph, and
+        returns two parameters:
             potentials - potentials for use in Dijkstra algorithm
+            edges_on_cycle - ids of the edges on a negative cycle,
+                             or None if consistent
         """
-        weights = {}
-        neighbor_list = defaultdict(lambda: set())
-
-        spfa_graph_to_distance_graph = {}
-
-        for e in edge_list:
-            if e.edge_type != EdgeType.LOWER_CASE:
-                pair = (e.fro, e.to)
-                if (pair not in weights) or (weights[pair] > e.value):
-                    spfa_graph_to_distance_graph[pair] = e
-                    neighbor_list[e.fro].add(e.to)
-                    weights[pair] = e.value
+        edge_types = graph.edge_type
+        projection = [edge for edge in edge_list if edge_types[edge] != EdgeType.LOWER_CASE]
 
         # Like in Johnson's algorithm we add node 0 artificially
-        for node in range(1, num_nodes + 1):
-            weights[(0,node)] = 0
-            neighbor_list[0].add(node)
-
-        # weights[(0,self.start_node)] = 0
-        # neighbor_list[0].add(self.start_node)
+        projection.extend(self.source_edges)
+        graph.compile(projection)
 
         distances, negative_cycle = spfa(source = 0,
-                                     num_nodes=num_nodes + 1,
-                                     weights=weights,
-                                     neighbor_list=neighbor_list)
+                                     num_nodes=graph.num_nodes + 1,
+                                     weights=graph)
 
         edges_on_cycle = None
 
         if negative_cycle is not None:
             assert(0 not in negative_cycle)
-            edges_on_cycle = []
-            nvalue = 0
-            # print('---- to edge ')
-            for fro, to in zip(negative_cycle, negative_cycle[1:] + negative_cycle[:1]):
-                edge = spfa_graph_to_distance_graph[(fro, to)]
-                edges_on_cycle.append(edge)
-                nvalue += edge.value
-                # print(str(fro) + '->' + str(to) + ':' + str(edge.value))
+            edges_on_cycle = graph.cycle_edges(negative_cycle)
+            nvalue = sum(graph.edge_value[edge] for edge in edges_on_cycle)
             # print('Cycle size: ' + str(len(edges_on_cycle)) + ' with value ' + str(nvalue))
 
             if nvalue > 0:
@@ -199,33 +156,38 @@ class MorrisN4Dc(object):
 
     def reduce_edge(self, edge1, edge2):
 
+        graph = self.graph
+        type1 = graph.edge_type[edge1]
+        type2 = graph.edge_type[edge2]
+        value2 = graph.edge_value[edge2]
+
         # X ---edge1----> Y ----edge2----> Z
-        assert edge2.fro == edge1.to
-        new_fro = edge1.fro
-        new_to = edge2.to
-        new_value = edge1.value + edge2.value
+        assert graph.edge_fro[edge2] == graph.edge_to[edge1]
+        new_fro = graph.edge_fro[edge1]
+        new_to = graph.edge_to[edge2]
+        new_value = graph.edge_value[edge1] + value2
         new_type = None
-        new_maybe_letter = None
+        new_maybe_letter = 0
 
         # UPPER CASE REDUCTION
-        if edge1.edge_type == EdgeType.SIMPLE and edge2.edge_type == EdgeType.UPPER_CASE:
-            new_maybe_letter = edge2.maybe_letter
+        if type1 == EdgeType.SIMPLE and type2 == EdgeType.UPPER_CASE:
+            new_maybe_letter = graph.edge_letter[edge2]
             new_type = EdgeType.UPPER_CASE
-            # print("Upper Case " + str(edge1) + "+++" + str(edge2));
+            # print("Upper Case " + str(graph.edge(edge1)) + "+++" + str(graph.edge(edge2)));
 
         # LOWER CASE REDUCTION
-        elif (edge1.edge_type == EdgeType.LOWER_CASE and edge2.edge_type == EdgeType.SIMPLE and
-                edge2.value < 0):
+        elif (type1 == EdgeType.LOWER_CASE and type2 == EdgeType.SIMPLE and
+                value2 < 0):
             new_type = EdgeType.SIMPLE
 
         # CROSS CASE REDUCTION
-        elif (edge1.edge_type == EdgeType.LOWER_CASE and edge2.edge_type == EdgeType.UPPER_CASE and
-                edge2.value < 0 and edge1.maybe_letter != edge2.maybe_letter):
-            new_maybe_letter = edge2.maybe_letter
+        elif (type1 == EdgeType.LOWER_CASE and type2 == EdgeType.UPPER_CASE and
+                value2 < 0 and graph.edge_letter[edge1] != graph.edge_letter[edge2]):
+            new_maybe_letter = graph.edge_letter[edge2]
             new_type = EdgeType.UPPER_CASE
 
         # NO-CASE REDUCITON
-        elif edge1.edge_type == EdgeType.SIMPLE and edge2.edge_type == EdgeType.SIMPLE:
+        elif type1 == EdgeType.SIMPLE and type2 == EdgeType.SIMPLE:
             new_type = EdgeType.SIMPLE
 
         if new_type is None:
@@ -238,46 +200,50 @@ class MorrisN4Dc(object):
             # better than upper case.
             if new_value >= 0:
                 new_type = EdgeType.SIMPLE
-                new_maybe_letter = None
+                new_maybe_letter = 0
 
-        new_edge = DistanceGraphEdge(new_fro, new_to, new_value, new_type, new_maybe_letter, renaming=edge1.renaming)
-        self.edge_support[new_edge] = EdgeSupport.derived(edge1, edge2)
-        # if (new_edge.fro == new_edge.to and new_edge.value < 0):
-        #     print('combine \t%s \twith \t%s \tto get \t%s' %(edge1, edge2, new_edge))
+        new_edge = graph.add_edge(new_fro, new_to, new_value, new_type, new_maybe_letter,
+                                  parents=(edge1, edge2))
+        # if (new_fro == new_to and new_value < 0):
+        #     print('combine \t%s \twith \t%s \tto get \t%s' %(graph.edge(edge1), graph.edge(edge2), graph.edge(new_edge)))
         #     return None
 
         return new_edge
 
 
-    def reduce_lower_case(self, num_nodes, edge_list, potentials, lc_edge, epsilon=10E-5):
-        new_edges = set()
+    def reduce_lower_case(self, outgoing_edges, potentials, lc_edge, epsilon=10E-5):
+        """Returns two parameters:
+            new_edges - ids of the edges added by the reduction
+            conflict_edge - id of a negative self loop if one is added, or None
+        """
+        graph = self.graph
+        fro = graph.edge_fro
+        to = graph.edge_to
+        value = graph.edge_value
+        edge_type = graph.edge_type
+        letter = graph.edge_letter
+        new_edges = []
 
         # Notice that here we are going to be using Johnson's algorithm in
         # a nonintuitive way, we will remove some edges from the original
         # graph which we use to calculate potentials. If you look through
         # proof of Johnson's algorithms you will notice that removing edges
-        # never invalidate the key properties of potentials
-        outgoing_edges = defaultdict(lambda: [])
-        for edge in edge_list:
-            # Ignore lower case edges and upper-case edges with the same letter as lc_edge
-            # (paper terminology: breach)
-            if (edge.edge_type == EdgeType.LOWER_CASE or
-                    (edge.edge_type == EdgeType.UPPER_CASE and
-                    edge.maybe_letter == lc_edge.maybe_letter)):
-                continue
-            outgoing_edges[edge.fro].append(edge)
+        # never invalidate the key properties of potentials.
+        # outgoing_edges are those of the allmax projection, which has
+        # no lower case edges already.
+        num_nodes = graph.num_nodes
         # distance in shortest path's graph
         reduced_edge = [None] * (num_nodes + 1)
         distance = [None] * (num_nodes + 1)
         visited = [False] * (num_nodes + 1)
 
-        source = lc_edge.to
+        source = to[lc_edge]
         distance[source] = 0
 
         q = PriorityQueue()
         q.put((0, source))
 
-        # print('processing LCE %s' % (lc_edge,))
+        # print('processing LCE %s' % (graph.edge(lc_edge),))
 
         while not q.empty():
             _, node = q.get()
@@ -286,8 +252,12 @@ class MorrisN4Dc(object):
             #print 'visiting %d' % node
             visited[node] = True
             for edge in outgoing_edges[node]:
-                neighbor = edge.to
-                edge_value_potential = edge.value + potentials[edge.fro] - potentials[edge.to]
+                # Ignore upper-case edges with the same letter as lc_edge
+                # (paper terminology: breach)
+                if edge_type[edge] == EdgeType.UPPER_CASE and letter[edge] == letter[lc_edge]:
+                    continue
+                neighbor = to[edge]
+                edge_value_potential = value[edge] + potentials[node] - potentials[neighbor]
                 if (distance[neighbor] is None or
                         distance[neighbor] > distance[node] + edge_value_potential):
                     # add calculate reduced edge that lead us here
@@ -302,7 +272,7 @@ class MorrisN4Dc(object):
                     distance[neighbor] = distance[node] + edge_value_potential
                     real_reduced_distance = distance[neighbor] + potentials[neighbor] - potentials[source]
 
-                    if new_reduced_edge.value >= 0:
+                    if value[new_reduced_edge] >= 0:
                         reduced_edge[neighbor] = new_reduced_edge
                         q.put((distance[neighbor], neighbor))
 
@@ -311,14 +281,14 @@ class MorrisN4Dc(object):
 
                     # check if we have a moat
                     if real_reduced_distance < 0 - epsilon \
-                            and lc_edge.fro != new_reduced_edge.to\
-                            and edge.value < 0:
-                        # print("Edge value " + str(reduced_edge[node].value))
+                            and fro[lc_edge] != to[new_reduced_edge]\
+                            and value[edge] < 0:
+                        # print("Edge value " + str(value[reduced_edge[node]]))
                         relevant_edge = self.reduce_edge(lc_edge, new_reduced_edge)
 
                         if relevant_edge is not None:
                             #print '^^ moat ^^'
-                            new_edges.add(relevant_edge)
+                            new_edges.append(relevant_edge)
 
                             # record another conflict
                             # based on this moat edge
@@ -333,15 +303,15 @@ class MorrisN4Dc(object):
                             # return immediately if an edge with the same from and to
                             # and has negative value is detected. Since it itself is already
                             # a negative cycle.
-                            if (relevant_edge.fro == relevant_edge.to and relevant_edge.value < 0):
+                            if (fro[relevant_edge] == to[relevant_edge] and value[relevant_edge] < 0):
                                 # print("Reduction conflict detected")
-                                # print('Neg edge: with value ' + str(relevant_edge.value))
-                                return relevant_edge
+                                # print('Neg edge: with value ' + str(value[relevant_edge]))
+                                return new_edges, relevant_edge
 
-        # for edge in list(new_edges):
-        #    print('   %s' % (edge,))
+        # for edge in new_edges:
+        #    print('   %s' % (graph.edge(edge),))
 
-        return list(new_edges)
+        return new_edges, None
 
     def extract_conflict(self, edge_list, include_combined=True):
         conflicts = []
@@ -429,7 +399,8 @@ class MorrisN4Dc(object):
         # Number of uncontrollable edge determines upper bound on number of algorithm iterations.
 
         # Generate distance graph from stnu.
-        num_nodes, new_edges, K = self.generate_graph_from_tpnu(network)
+        graph, new_edges, K = self.generate_graph_from_tpnu(network)
+        self.source_edges = [graph.add_edge(0, node, 0) for node in range(1, graph.num_nodes + 1)]
 
         # body of algorithm.
         potential_conflict = None
@@ -441,7 +412,7 @@ class MorrisN4Dc(object):
             all_edges.extend(new_edges)
             new_edges = []
             # check consistency in allmax projection of distance graph.
-            potentials, negative_cycle = self.allmax(num_nodes, all_edges)
+            potentials, negative_cycle = self.allmax(graph, all_edges)
 
             # if allmax projection contains negative cycle that means that STNU is not
             # dynamically controllable.
@@ -468,17 +439,21 @@ class MorrisN4Dc(object):
                 potential_conflict = conflict
                 break
 
+            # the edges of the allmax projection leaving each node
+            offsets = graph.offsets.tolist()
+            edge_ids = graph.edge_ids.tolist()
+            outgoing_edges = [edge_ids[offsets[node]:offsets[node + 1]] for node in range(graph.num_nodes + 1)]
+
             # try to reduce all the lower case edges.
             for e in all_edges:
-                if e.edge_type == EdgeType.LOWER_CASE:
-                    # print("Reducing Lower case edge " + str(e.fro) + "-->" + str(e.to))
-                    reduced_edges = self.reduce_lower_case(num_nodes,
-                                                           all_edges,
-                                                           potentials,
-                                                           e)
-
-                    if type(reduced_edges) is DistanceGraphEdge:
-                        potential_conflict = self.extract_conflict([reduced_edges],include_combined=False)
+                if graph.edge_type[e] == EdgeType.LOWER_CASE:
+                    # print("Reducing Lower case edge " + str(graph.edge(e)))
+                    reduced_edges, conflict_edge = self.reduce_lower_case(outgoing_edges,
+                                                                          potentials,
+                                                                          e)
+
+                    if conflict_edge is not None:
+                        potential_conflict = self.extract_conflict([conflict_edge],include_combined=False)
                         return potential_conflict
 
                     new_edges.extend(reduced_edges)
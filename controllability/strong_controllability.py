@@ -5,9 +5,8 @@ from tpn.tpn_autogen import tpn as ParseTpnClass
 
 from collections import defaultdict
 
-from graph_theory import spfa
-from controllability.distance_graph_edge import EdgeType, DistanceGraphEdge
-from controllability.temporal_consistency import EdgeSupport
+from graph_theory import spfa, DistanceGraph
+from controllability.temporal_consistency import EdgeSupport, EdgeSupports
 import math
 
 class StrongControllability(object):
@@ -33,15 +32,17 @@ contingency in temporal constraint networks: from
 consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
 
     def __init__(self):
-        self.edge_support = {}
+        self.graph = None
+        # edge id -> support, of the edges of the graph
+        self.edge_support = None
 
     def check(self, network):
 
         # Generate distance graph from stnu.
-        num_nodes, all_edges = self.generate_graph_from_tpnu(network)
+        graph, reduced_edges = self.generate_graph_from_tpnu(network)
 
         potential_conflict = None
-        negative_cycle = self.consistent(num_nodes, all_edges)
+        negative_cycle = self.consistent(graph, reduced_edges)
 
         if negative_cycle is not None:
 
@@ -68,7 +69,9 @@ consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
     def generate_graph_from_tpnu(self, network):
         """Generates distance graph from a tpnu"""
 
-        num_nodes = network.num_nodes
+        graph = DistanceGraph(network.num_nodes)
+        self.graph = graph
+        self.edge_support = EdgeSupports(graph)
         contingent_edges_at_node = {}
         edge_list = []
 
@@ -80,23 +83,13 @@ consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
             # lb cannot be larger than ub
             # assert lb <= ub
 
-            ub_edge = DistanceGraphEdge(fro, to, ub, EdgeType.SIMPLE, renaming=renaming)
-            lb_edge = DistanceGraphEdge(to, fro, -lb, EdgeType.SIMPLE, renaming=renaming)
-
-            if edge_id is not None:
-                self.edge_support[ub_edge] = EdgeSupport.base({(EdgeSupport.UPPER, edge_id): 1,})
-                self.edge_support[lb_edge] = EdgeSupport.base({(EdgeSupport.LOWER, edge_id): -1,})
-            else:
-                self.edge_support[ub_edge] = EdgeSupport.base({})
-                self.edge_support[lb_edge] = EdgeSupport.base({})
-
             if not math.isinf(ub):
-                edge_list.append(ub_edge)
+                edge_list.append(graph.add_edge(fro, to, ub, constraint=edge_id, upper=1))
             # else:
             #     print("Ignoring +inf UB of " + e.id)
 
             if not math.isinf(lb):
-                edge_list.append(lb_edge)
+                edge_list.append(graph.add_edge(to, fro, -lb, constraint=edge_id, lower=-1))
             # else:
             #     print("Ignoring -inf LB of " + e.id)
 
@@ -108,17 +101,12 @@ consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
             assert not lb < 0
             assert not math.isinf(ub)
 
-            ub_edge = DistanceGraphEdge(fro, to, ub, EdgeType.SIMPLE, renaming=renaming)
-            lb_edge = DistanceGraphEdge(to, fro, -lb, EdgeType.SIMPLE, renaming=renaming)
-
-            if edge_id is not None:
-                # Note that the sign for the upper and lower bound supports are reversed
-                # Since they are being subtracted during the reduction
-                self.edge_support[ub_edge] = EdgeSupport.base({(EdgeSupport.UPPER, edge_id): -1,})
-                self.edge_support[lb_edge] = EdgeSupport.base({(EdgeSupport.LOWER, edge_id): 1,})
-            else:
-                self.edge_support[ub_edge] = EdgeSupport.base({})
-                self.edge_support[lb_edge] = EdgeSupport.base({})
+            # The contingent edges are only used in the reduction:
+            # they get an id for their support, but are not compiled.
+            # Note that the sign for the upper and lower bound supports are reversed
+            # Since they are being subtracted during the reduction
+            ub_edge = graph.add_edge(fro, to, ub, constraint=edge_id, upper=-1)
+            lb_edge = graph.add_edge(to, fro, -lb, constraint=edge_id, lower=1)
 
             #edge_list.append(ub_edge)
             #edge_list.append(lb_edge)
@@ -146,8 +134,7 @@ consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
                         add_controllable(e.fro,e.to,e.get_lower_bound(),e.get_upper_bound(),e.id)
                         encoded_node_pairs[(e.fro,e.to)] = True
                     else:
-                        new_node = num_nodes + 1
-                        num_nodes += 1
+                        new_node = graph.add_node()
                         renaming[new_node] = renaming[e.to] + "'"
                         add_controllable(e.fro,new_node,e.get_lower_bound(),e.get_upper_bound(),e.id)
                         add_controllable(new_node,e.to,0,0,None)
@@ -157,24 +144,27 @@ consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
                         add_uncontrollable(e.fro,e.to,e.get_lower_bound(),e.get_upper_bound(),e.id)
                         encoded_node_pairs[(e.fro,e.to)] = True
                     else:
-                        new_node = num_nodes + 1
-                        num_nodes += 1
+                        new_node = graph.add_node()
                         renaming[new_node] = renaming[e.to] + "'"
                         add_uncontrollable(e.fro,new_node,e.get_lower_bound(),e.get_upper_bound(),e.id)
                         add_controllable(new_node,e.to,0,0,None)
 
+        fro = graph.edge_fro
+        to = graph.edge_to
+        value = graph.edge_value
+
         # Execute triangular reduction procedure on the edges
         reduced_edges = []
         for edge in edge_list:
 
             new_edges = []
 
-            if edge.fro in contingent_edges_at_node:
-                contingent_edges = contingent_edges_at_node[edge.fro]
+            if fro[edge] in contingent_edges_at_node:
+                contingent_edges = contingent_edges_at_node[fro[edge]]
                 for contingent_edge in contingent_edges:
-                    if contingent_edge.fro == edge.fro:
-                        reduced_edge = DistanceGraphEdge(contingent_edge.to, edge.to, edge.value-contingent_edge.value, EdgeType.SIMPLE, renaming=renaming)
-                        self.edge_support[reduced_edge] = EdgeSupport.derived(edge, contingent_edge)
+                    if fro[contingent_edge] == fro[edge]:
+                        reduced_edge = graph.add_edge(to[contingent_edge], to[edge], value[edge]-value[contingent_edge],
+                                                      parents=(edge, contingent_edge))
                         new_edges.append(reduced_edge)
                         # print("Reducing: " + str(edge) + " and " + str(contingent_edge))
                         # print("Adding reduced from edge: " + str(reduced_edge.fro) + "->" + str(reduced_edge.to) + " (" + str(reduced_edge.value) + ")")
@@ -182,60 +172,41 @@ consistencies to controllabilities" by Thierry VIDAL and Helene FARGIER"""
                 new_edges.append(edge)
 
             for new_edge in new_edges:
-                if new_edge.to in contingent_edges_at_node:
-                    contingent_edges = contingent_edges_at_node[edge.to]
+                if to[new_edge] in contingent_edges_at_node:
+                    contingent_edges = contingent_edges_at_node[to[edge]]
                     for contingent_edge in contingent_edges:
-                        if contingent_edge.to == edge.to:
-                            reduced_edge = DistanceGraphEdge(edge.fro, contingent_edge.fro, edge.value-contingent_edge.value, EdgeType.SIMPLE, renaming=renaming)
-                            self.edge_support[reduced_edge] = EdgeSupport.derived(edge, contingent_edge)
+                        if to[contingent_edge] == to[edge]:
+                            reduced_edge = graph.add_edge(fro[edge], fro[contingent_edge], value[edge]-value[contingent_edge],
+                                                          parents=(edge, contingent_edge))
                             reduced_edges.append(reduced_edge)
                             # print("Reducing: " + str(new_edge) + " and " + str(contingent_edge))
                             # print("Adding reduced to edge: " + str(reduced_edge.fro) + "->" + str(reduced_edge.to) + " (" + str(reduced_edge.value) + ")")
                 else:
                     reduced_edges.append(new_edge)
 
-        return num_nodes, reduced_edges
+        return graph, reduced_edges
 
-    def consistent(self,num_nodes, edge_list):
+    def consistent(self, graph, edge_list):
         """Calculates consistency of reduced STNU.
         Returns one parameter:
-            success - true if consistent
+            edges_on_cycle - ids of the edges on a negative cycle,
+                             or None if consistent
         """
-        weights = {}
-        neighbor_list = defaultdict(lambda: set())
-
-        spfa_graph_to_distance_graph = {}
-
-        for e in edge_list:
-            pair = (e.fro, e.to)
-            if (pair not in weights) or (weights[pair] > e.value):
-                spfa_graph_to_distance_graph[pair] = e
-                neighbor_list[e.fro].add(e.to)
-                weights[pair] = e.value
-
         # Like in Johnson's algorithm we add node 0 artificially
-        for node in range(1, num_nodes + 1):
-            weights[(0,node)] = 0
-            neighbor_list[0].add(node)
+        for node in range(1, graph.num_nodes + 1):
+            edge_list.append(graph.add_edge(0, node, 0))
+        graph.compile(edge_list)
 
         distances, negative_cycle = spfa(source = 0,
-                                     num_nodes=num_nodes + 1,
-                                     weights=weights,
-                                     neighbor_list=neighbor_list)
+                                     num_nodes=graph.num_nodes + 1,
+                                     weights=graph)
 
         edges_on_cycle = None
 
         if negative_cycle is not None:
             assert(0 not in negative_cycle)
-            edges_on_cycle = []
-            nvalue = 0
-            # print('---- to edge ')
-            for fro, to in zip(negative_cycle, negative_cycle[1:] + negative_cycle[:1]):
-                edge = spfa_graph_to_distance_graph[(fro, to)]
-                edges_on_cycle.append(edge)
-                nvalue += edge.value
-                # print(str(fro) + '->' + str(to) + ':' + str(edge.value))
-            # print('Cycle size: ' + str(len(edges_on_cycle)) + ' with value ' + str(nvalue))
+            edges_on_cycle = graph.cycle_edges(negative_cycle)
+            nvalue = sum(graph.edge_value[edge] for edge in edges_on_cycle)
 
             if nvalue > 0:
                 raise Exception('Positive cycle value detected!');
@@ -4,9 +4,9 @@ from temporal_network.tpnu import Tpnu
 from tpn.tpn_autogen import tpn as ParseTpnClass
 
 from collections import defaultdict
+import heapq
 
-from graph_theory import spfa
-from controllability.distance_graph_edge import EdgeType, DistanceGraphEdge
+from graph_theory import spfa, DistanceGraph
 import math
 
 class TemporalConsistency(object):
@@ -31,15 +31,17 @@ class NrgativeCycleDetection(object):
     """Negative Cycle Detection Implementation"""
 
     def __init__(self):
-        self.edge_support = {}
+        self.graph = None
+        # edge id -> support, of the edges of the graph
+        self.edge_support = None
 
     def check(self, network):
 
         # Generate distance graph from stnu.
-        num_nodes, all_edges = self.generate_graph_from_tpnu(network)
+        graph = self.generate_graph_from_tpnu(network)
 
         potential_conflict = None
-        negative_cycle = self.consistent(num_nodes, all_edges)
+        negative_cycle = self.consistent(graph)
 
         if negative_cycle is not None:
 
@@ -65,9 +67,9 @@ class NrgativeCycleDetection(object):
     def generate_graph_from_tpnu(self, network):
         """Generates distance graph from a tpnu"""
 
-        num_nodes = network.num_nodes
-        contingent_edges_at_node = {}
-        edge_list = []
+        graph = DistanceGraph(network.num_nodes)
+        self.graph = graph
+        self.edge_support = EdgeSupports(graph)
 
         if hasattr(network, 'node_number_to_id'):
             renaming = network.node_number_to_id
@@ -77,23 +79,13 @@ class NrgativeCycleDetection(object):
             # lb cannot be larger than ub
             # assert lb <= ub
 
-            ub_edge = DistanceGraphEdge(fro, to, ub, EdgeType.SIMPLE, renaming=renaming)
-            lb_edge = DistanceGraphEdge(to, fro, -lb, EdgeType.SIMPLE, renaming=renaming)
-
-            if edge_id is not None:
-                self.edge_support[ub_edge] = EdgeSupport.base({(EdgeSupport.UPPER, edge_id): 1,})
-                self.edge_support[lb_edge] = EdgeSupport.base({(EdgeSupport.LOWER, edge_id): -1,})
-            else:
-                self.edge_support[ub_edge] = EdgeSupport.base({})
-                self.edge_support[lb_edge] = EdgeSupport.base({})
-
             if not math.isinf(ub):
-                edge_list.append(ub_edge)
+                graph.add_edge(fro, to, ub, constraint=edge_id, upper=1)
             # else:
             #     print("Ignoring +inf UB of " + e.id)
 
             if not math.isinf(lb):
-                edge_list.append(lb_edge)
+                graph.add_edge(to, fro, -lb, constraint=edge_id, lower=-1)
             # else:
             #     print("Ignoring -inf LB of " + e.id)
 
@@ -110,54 +102,34 @@ class NrgativeCycleDetection(object):
                     add_controllable(e.fro,e.to,e.get_lower_bound(),e.get_upper_bound(),e.id)
                     encoded_node_pairs[(e.fro,e.to)] = True
                 else:
-                    new_node = num_nodes + 1
-                    num_nodes += 1
+                    new_node = graph.add_node()
                     renaming[new_node] = renaming[e.to] + "'"
                     add_controllable(e.fro,new_node,e.get_lower_bound(),e.get_upper_bound(),e.id)
                     add_controllable(new_node,e.to,0,0,None)
 
-        return num_nodes, edge_list
+        return graph
 
-    def consistent(self,num_nodes, edge_list):
+    def consistent(self, graph):
         """Calculates consistency of reduced STNU.
         Returns one parameter:
-            success - true if consistent
+            edges_on_cycle - ids of the edges on a negative cycle,
+                             or None if consistent
         """
-        weights = {}
-        neighbor_list = defaultdict(lambda: set())
-
-        spfa_graph_to_distance_graph = {}
-
-        for e in edge_list:
-            pair = (e.fro, e.to)
-            if (pair not in weights) or (weights[pair] > e.value):
-                spfa_graph_to_distance_graph[pair] = e
-                neighbor_list[e.fro].add(e.to)
-                weights[pair] = e.value
-
         # Like in Johnson's algorithm we add node 0 artificially
-        for node in range(1, num_nodes + 1):
-            weights[(0,node)] = 0
-            neighbor_list[0].add(node)
+        for node in range(1, graph.num_nodes + 1):
+            graph.add_edge(0, node, 0)
+        graph.compile()
 
         distances, negative_cycle = spfa(source = 0,
-                                     num_nodes=num_nodes + 1,
-                                     weights=weights,
-                                     neighbor_list=neighbor_list)
+                                     num_nodes=graph.num_nodes + 1,
+                                     weights=graph)
 
         edges_on_cycle = None
 
         if negative_cycle is not None:
             assert(0 not in negative_cycle)
-            edges_on_cycle = []
-            nvalue = 0
-            # print('---- to edge ')
-            for fro, to in zip(negative_cycle, negative_cycle[1:] + negative_cycle[:1]):
-                edge = spfa_graph_to_distance_graph[(fro, to)]
-                edges_on_cycle.append(edge)
-                nvalue += edge.value
-                # print(str(fro) + '->' + str(to) + ':' + str(edge.value))
-            # print('Cycle size: ' + str(len(edges_on_cycle)) + ' with value ' + str(nvalue))
+            edges_on_cycle = graph.cycle_edges(negative_cycle)
+            nvalue = sum(graph.edge_value[edge] for edge in edges_on_cycle)
 
             if nvalue > 0:
                 raise Exception('Positive cycle value detected!');
@@ -199,7 +171,7 @@ class NrgativeCycleDetection(object):
 
         neg_value = 0
         for edge in edge_list:
-            neg_value += edge.value
+            neg_value += self.graph.edge_value[edge]
 
         if include_combined:
             # print('NValue: ' + str(neg_value))
@@ -211,6 +183,192 @@ class NrgativeCycleDetection(object):
 
         return conflicts
 
+class IncrementalConsistency(NrgativeCycleDetection):
+
+    """Negative cycle detection that keeps its distance graph and node
+    potentials between calls.
+
+    The graph is kept in between: only the edges of the constraints whose
+    bounds changed, or that were activated, are added again, and those of
+    the constraints that changed or were deactivated are taken out. As in
+    generate_graph_from_tpnu, a constraint between the same nodes as
+    a previous one goes through a node of its own, which is kept for it.
+
+    The potentials are a solution of the edges taken into account:
+    p(to) <= p(fro) + weight for each of them, and p(node) <= 0 as for
+    the distances from the artificial node 0 of the full check. Taking
+    an edge out keeps them a solution. Each edge added is followed by
+    a Dijkstra-style propagation of the decrease of the potentials
+    (Ramalingam and Reps), which finds the negative cycles through it.
+    The edges that would make a cycle are left out, and tried again
+    at the next call.
+    """
+
+    # The edges of previous calls stay in the graph. It is built again
+    # when it has grown that many times bigger than when it was last built
+    COMPACTION = 8
+
+    def __init__(self, epsilon=10E-5):
+        NrgativeCycleDetection.__init__(self)
+        self.epsilon = epsilon
+
+        # constraint id -> what its edges were made from, and their ids
+        self.constraint_edges = {}
+        # constraint id -> the node added for it
+        self.added_nodes = {}
+        # node -> ids of the edges leaving it that the potentials are a solution of
+        self.successors = []
+        # ids of the edges of active constraints left out
+        self.pending = set()
+        self.potentials = [0]
+        self.full_size = 0
+
+    def reset(self, network):
+        graph = DistanceGraph(network.num_nodes)
+        self.graph = graph
+        self.edge_support = EdgeSupports(graph)
+        self.constraint_edges = {}
+        self.added_nodes = {}
+        self.successors = [set() for _ in range(graph.num_nodes + 1)]
+        self.pending = set()
+        self.full_size = 0
+
+    def check(self, network):
+        if self.graph is None or self.graph.num_edges() > self.COMPACTION * self.full_size:
+            self.reset(network)
+
+        added = self.update_edges(network)
+        if self.full_size == 0:
+            self.full_size = self.graph.num_edges()
+        while len(self.potentials) <= self.graph.num_nodes:
+            self.potentials.append(0)
+
+        # the edges left out may not make a cycle any more
+        added.extend(sorted(self.pending))
+        self.pending = set()
+        for position, edge in enumerate(added):
+            negative_cycle = self.tighten(edge)
+            if negative_cycle is not None:
+                self.pending.update(added[position:])
+                return self.extract_conflict(negative_cycle)
+
+        return None
+
+    def update_edges(self, network):
+        # add the edges of the constraints that changed to the graph, and take
+        # out those of the constraints that changed or were deactivated.
+        # Returns the ids of the edges added
+        graph = self.graph
+        constraint_edges = {}
+        added = []
+        encoded_node_pairs = {}
+
+        for e in network.temporal_constraints.values():
+            # We only consider constraints that are active
+            if not e.activated:
+                continue
+            if e.fro == 0 or e.to == 0:
+                raise Exception("Node with id zero is not allowed (see documentation for check function.)")
+
+            # Make sure no two edges share the same from and to nodes
+            duplicate = (e.fro, e.to) in encoded_node_pairs
+            encoded_node_pairs[(e.fro, e.to)] = True
+
+            description = (e.fro, e.to, duplicate, e.get_lower_bound(), e.get_upper_bound())
+            if e.id in self.constraint_edges and self.constraint_edges[e.id][0] == description:
+                constraint_edges[e.id] = self.constraint_edges[e.id]
+                continue
+
+            edge_list = []
+            if not duplicate:
+                self.add_controllable(graph, edge_list, e.fro, e.to, e.get_lower_bound(), e.get_upper_bound(), e.id)
+            else:
+                new_node = self.added_node(network, e.id, network.node_number_to_id[e.to] + "'")
+                self.add_controllable(graph, edge_list, e.fro, new_node, e.get_lower_bound(), e.get_upper_bound(), e.id)
+                self.add_controllable(graph, edge_list, new_node, e.to, 0, 0, None)
+            constraint_edges[e.id] = (description, edge_list)
+            added.extend(edge_list)
+
+        for id, (description, edge_list) in self.constraint_edges.items():
+            if id not in constraint_edges or constraint_edges[id][1] is not edge_list:
+                for edge in edge_list:
+                    self.successors[graph.edge_fro[edge]].discard(edge)
+                    self.pending.discard(edge)
+        self.constraint_edges = constraint_edges
+
+        return added
+
+    def added_node(self, network, constraint_id, name):
+        # the node added to the graph for a constraint
+        if constraint_id not in self.added_nodes:
+            self.added_nodes[constraint_id] = self.graph.add_node()
+            network.node_number_to_id[self.added_nodes[constraint_id]] = name
+            self.successors.append(set())
+        return self.added_nodes[constraint_id]
+
+    @staticmethod
+    def add_controllable(graph, edge_list, fro, to, lb, ub, edge_id):
+        if not math.isinf(ub):
+            edge_list.append(graph.add_edge(fro, to, ub, constraint=edge_id, upper=1))
+        if not math.isinf(lb):
+            edge_list.append(graph.add_edge(to, fro, -lb, constraint=edge_id, lower=-1))
+
+    def tighten(self, edge):
+        # take an edge of the graph into account, and repair the potentials.
+        # If that makes a negative cycle, the edge is left out and
+        # the potentials are left as they were, and the ids
+        # of the edges on the cycle are returned
+        graph = self.graph
+        potentials = self.potentials
+        fro, to = graph.edge_fro[edge], graph.edge_to[edge]
+
+        decrease = potentials[fro] + graph.edge_value[edge] - potentials[to]
+        if decrease >= -self.epsilon:
+            self.successors[fro].add(edge)
+            return None
+        if fro == to:
+            return [edge]
+
+        # node -> potential before the repair, for the nodes decreased
+        previous = {}
+        # node -> the edge its decrease comes through
+        predecessor = {to: edge}
+        best = {to: decrease}
+        queue = [(decrease, to)]
+        while len(queue) > 0:
+            decrease, node = heapq.heappop(queue)
+            if node in previous or decrease > best[node]:
+                continue
+
+            previous[node] = potentials[node]
+            potentials[node] += decrease
+
+            for successor_edge in self.successors[node]:
+                successor = graph.edge_to[successor_edge]
+                if successor in previous:
+                    continue
+                new_decrease = potentials[node] + graph.edge_value[successor_edge] - potentials[successor]
+                if new_decrease < -self.epsilon and (successor not in best or new_decrease < best[successor]):
+                    if successor == fro:
+                        # a path back to the start of the edge:
+                        # fro -> to -> ... -> node -> fro is a negative cycle
+                        cycle = [successor_edge]
+                        while graph.edge_fro[cycle[-1]] != to:
+                            cycle.append(predecessor[graph.edge_fro[cycle[-1]]])
+                        cycle.append(edge)
+
+                        for decreased, potential in previous.items():
+                            potentials[decreased] = potential
+                        return list(reversed(cycle))
+
+                    best[successor] = new_decrease
+                    predecessor[successor] = successor_edge
+                    heapq.heappush(queue, (new_decrease, successor))
+
+        self.successors[fro].add(edge)
+        return None
+
+
 class EdgeSupport(object):
     BASE = 1
     DERIVED = 2
@@ -230,3 +388,26 @@ class EdgeSupport(object):
         es.type = EdgeSupport.DERIVED
         es.parents = [parent1, parent2]
         return es
+
+
+class EdgeSupports(object):
+
+    """Edge id -> EdgeSupport, for the edges of a DistanceGraph,
+    which keeps their supports in arrays."""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, edge):
+        graph = self.graph
+        if graph.edge_parent1[edge] >= 0:
+            return EdgeSupport.derived(graph.edge_parent1[edge], graph.edge_parent2[edge])
+
+        expression = {}
+        if graph.edge_constraint[edge] >= 0:
+            constraint_id = graph.constraints[graph.edge_constraint[edge]]
+            if graph.edge_lower[edge] != 0:
+                expression[(EdgeSupport.LOWER, constraint_id)] = graph.edge_lower[edge]
+            if graph.edge_upper[edge] != 0:
+                expression[(EdgeSupport.UPPER, constraint_id)] = graph.edge_upper[edge]
+        return EdgeSupport.base(expression)
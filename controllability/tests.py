@@ -1,7 +1,13 @@
 import unittest
 from os.path import join, dirname
 
-from controllability.temporal_consistency import TemporalConsistency
+from controllability.temporal_consistency import TemporalConsistency, NrgativeCycleDetection, IncrementalConsistency, EdgeSupport
+from controllability.morris_n4_dc import MorrisN4Dc
+from controllability.morris_n3_dc import IncrementalMorrisN3Dc
+from temporal_network.decision_variable import DecisionVariable
+from temporal_network.assignment import Assignment
+from temporal_network.temporal_constraint import TemporalConstraint
+import random
 from tpn import Tpn
 from temporal_network.tpnu import Tpnu
 from controllability.dynamic_controllability import DynamicControllability
@@ -115,6 +121,137 @@ class ControllabilityTests(unittest.TestCase):
         self.assert_consistency_result('Route1_2_1.cctp', False)
         self.assert_consistency_result('Route1_2_2.cctp', False)
 
+    def test_incremental_consistency(self):
+        # random edits of a small network, checked from scratch
+        # and incrementally from the previous state
+        generator = random.Random(1)
+        # the bounds are drawn around the durations of a schedule,
+        # so that some of the networks are consistent
+        schedule = [generator.uniform(0, 100) for node in range(9)]
+        tpnu = Tpnu('random','random')
+        tpnu.num_nodes = 8
+        for node in range(1, 9):
+            tpnu.node_number_to_id[node] = str(node)
+
+        def draw_bounds(constraint):
+            duration = schedule[constraint.to] - schedule[constraint.fro]
+            constraint.lower_bound = duration - generator.uniform(0, 5)
+            constraint.upper_bound = duration + generator.uniform(-2, 5)
+
+        for i in range(16):
+            fro, to = generator.sample(range(1, 9), 2)
+            constraint = TemporalConstraint(i, str(i), fro, to, 0, 0)
+            draw_bounds(constraint)
+            tpnu.add_temporal_constraint(constraint)
+
+        incremental = IncrementalConsistency()
+        inconsistent = 0
+        for step in range(300):
+            constraint = tpnu.temporal_constraints[generator.randrange(16)]
+            if generator.random() < 0.3:
+                constraint.activated = not constraint.activated
+            else:
+                draw_bounds(constraint)
+
+            conflict = incremental.check(tpnu)
+            self.assertEqual(conflict is None, NrgativeCycleDetection().check(tpnu) is None)
+            if conflict is not None:
+                inconsistent += 1
+                # the cycle is negative
+                value = 0
+                for (bound, id), coefficient in conflict[0].items():
+                    cycle_constraint = tpnu.temporal_constraints[id]
+                    value += coefficient * (cycle_constraint.upper_bound if bound == EdgeSupport.UPPER else cycle_constraint.lower_bound)
+                self.assertTrue(value < 0)
+
+        self.assertTrue(0 < inconsistent < 300)
+
+    def test_incremental_dc(self):
+        # random edits of a small network with contingent links,
+        # checked from scratch and incrementally from the previous state
+        generator = random.Random(2)
+        schedule = [generator.uniform(0, 100) for node in range(9)]
+        # the contingent links are 1 -> 2, 3 -> 4 and 5 -> 6
+        for node in [2, 4, 6]:
+            schedule[node] = schedule[node - 1] + generator.uniform(0, 20)
+        tpnu = Tpnu('random','random')
+        tpnu.num_nodes = 8
+        for node in range(1, 9):
+            tpnu.node_number_to_id[node] = str(node)
+
+        # the requirement constraints can be deactivated
+        variable = DecisionVariable('x','x')
+        guard = Assignment(variable,'a',0)
+        variable.add_domain_value(guard)
+        tpnu.add_decision_variable(variable)
+
+        def draw_bounds(constraint):
+            duration = schedule[constraint.to] - schedule[constraint.fro]
+            if constraint.controllable:
+                constraint.lower_bound = duration - generator.uniform(0, 20)
+                constraint.upper_bound = duration + generator.uniform(0, 20)
+            else:
+                constraint.lower_bound = generator.choice([0, duration])
+                constraint.upper_bound = duration + generator.uniform(0, 5)
+
+        for i in range(16):
+            if i < 3:
+                fro, to = 2 * i + 1, 2 * i + 2
+            else:
+                fro, to = generator.sample(range(1, 9), 2)
+            constraint = TemporalConstraint(i, str(i), fro, to, 0, 0)
+            if i < 3:
+                constraint.controllable = False
+            else:
+                constraint.add_guard(guard)
+            draw_bounds(constraint)
+            tpnu.add_temporal_constraint(constraint)
+
+        incremental = IncrementalMorrisN3Dc()
+        uncontrollable = 0
+        for step in range(300):
+            constraint = tpnu.temporal_constraints[generator.randrange(16)]
+            if constraint.controllable and generator.random() < 0.3:
+                constraint.activated = not constraint.activated
+            else:
+                draw_bounds(constraint)
+
+            conflict = incremental.check(tpnu)
+            self.assertEqual(conflict is None, MorrisN4Dc().check(tpnu) is None)
+            if conflict is not None:
+                uncontrollable += 1
+                # each way to resolve the conflict relaxes a negative sum
+                for expression in conflict:
+                    value = 0
+                    for (bound, id), coefficient in expression.items():
+                        cycle_constraint = tpnu.temporal_constraints[id]
+                        value += coefficient * (cycle_constraint.upper_bound if bound == EdgeSupport.UPPER else cycle_constraint.lower_bound)
+                    self.assertTrue(value < 0)
+
+        self.assertTrue(0 < uncontrollable < 300)
+
+        # a second requirement between the same nodes, which is tighter
+        # than the first one, makes the network uncontrollable
+        tpnu = Tpnu('duplicate','duplicate')
+        tpnu.num_nodes = 2
+        tpnu.node_number_to_id[1] = 'A'
+        tpnu.node_number_to_id[2] = 'C'
+        tpnu.add_decision_variable(variable)
+        contingent = TemporalConstraint(0, 'c', 1, 2, 0, 7.61)
+        contingent.controllable = False
+        tpnu.add_temporal_constraint(contingent)
+        tpnu.add_temporal_constraint(TemporalConstraint(1, 'q', 2, 1, -17.48, 1.34))
+        requirement = TemporalConstraint(2, 'r', 2, 1, -20.67, -6.82)
+        requirement.add_guard(guard)
+        tpnu.add_temporal_constraint(requirement)
+
+        incremental = IncrementalMorrisN3Dc()
+        self.assertIsNone(incremental.check(tpnu))
+        requirement.activated = True
+        self.assertIsNotNone(MorrisN4Dc().check(tpnu))
+        self.assertIsNotNone(incremental.check(tpnu))
+        self.assertIsNotNone(IncrementalMorrisN3Dc().check(tpnu))
+
     def test_nozeronode(self):
         with self.assertRaises(Exception):
             stnu = Stnu()
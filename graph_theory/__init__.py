@@ -1 +1,3 @@
-from graph_theory.spfa import spfa
\ No newline at end of file
+from graph_theory.distance_graph import DistanceGraph
+from graph_theory.spfa import spfa, CycleDetection
+from graph_theory.all_pairs import floyd_warshall, johnson
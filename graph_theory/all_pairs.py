@@ -0,0 +1,69 @@
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import johnson as scipy_johnson, NegativeCycleError
+except ImportError:
+    scipy_johnson = None
+
+
+def floyd_warshall(weights):
+    """All pairs shortest paths of a complete graph, given by the dense
+    n x n array of the weights of its edges (the diagonal is ignored).
+
+    Floyd-Warshall, with the relaxation through each intermediate node
+    done as one min-plus operation over the whole array. Row and column k
+    do not change during step k, so the result is the same as the one
+    of the triple loop relaxing the pairs one by one.
+    Returns the array of the distances, with zeros on the diagonal.
+    """
+    distance = np.array(weights, dtype=np.float64)
+    num_nodes = distance.shape[0]
+
+    # An infinite diagonal keeps step k from changing row and column k,
+    # and paths from a node to itself are left out
+    np.fill_diagonal(distance, np.inf)
+    for k in range(num_nodes):
+        np.minimum(distance, distance[:, k, None] + distance[None, k, :], out=distance)
+        np.fill_diagonal(distance, np.inf)
+
+    np.fill_diagonal(distance, 0)
+    return distance
+
+
+def johnson(weights, edges, default):
+    """The distances floyd_warshall computes for a complete graph whose
+    weights are those of weights where edges is true, and default elsewhere,
+    when edges is sparse.
+
+    Johnson's algorithm (from scipy) finds the distances d of the sparse
+    graph. A path of the complete graph that is shorter than default
+    takes at most one default edge, and the shortest one from i to j
+    has a weight of default + min_a d(i, a) + min_b d(b, j).
+    Returns None if scipy is missing, or if that does not hold:
+    the complete graph has a negative cycle, or an edge heavier than default.
+    """
+    if scipy_johnson is None:
+        return None
+    if np.any(weights[edges] > default):
+        return None
+
+    sources, targets = np.nonzero(edges)
+    graph = csr_matrix((weights[sources, targets], (sources, targets)), shape=weights.shape)
+    try:
+        distance = scipy_johnson(graph, directed=True)
+    except NegativeCycleError:
+        return None
+
+    # a cycle through a default edge is negative
+    if distance.min() < -default:
+        return None
+
+    # with the diagonal of zeros, these include the paths
+    # that start or end with the default edge
+    leaving = distance.min(axis=1)
+    entering = distance.min(axis=0)
+    np.minimum(distance, default + leaving[:, None] + entering[None, :], out=distance)
+
+    np.fill_diagonal(distance, 0)
+    return distance
@@ -0,0 +1,142 @@
+from array import array
+
+import numpy as np
+
+from controllability.distance_graph_edge import EdgeType, DistanceGraphEdge
+
+
+class DistanceGraph(object):
+    """Distance graph stored in flat arrays.
+
+    Edges are numbered in the order they are added, and their number
+    indexes their value, type, letter and support. compile() sorts a set
+    of them by source node into compressed sparse row (CSR) arrays:
+    the edges leaving node n are at positions offsets[n] to offsets[n + 1]
+    of sources, targets, weights, edge_types, letters and edge_ids.
+
+    Nodes are numbered from 0 to num_nodes (inclusive). A letter is
+    the node of a contingent edge, and 0 when there is none.
+
+    The support of an edge is what its value is made of: either the
+    lower and upper bounds of one constraint, each with a coefficient,
+    or two parent edges it was derived from.
+    """
+
+    def __init__(self, num_nodes=0):
+        self.num_nodes = num_nodes
+
+        # edge id -> attributes of the edge
+        self.edge_fro = array('i')
+        self.edge_to = array('i')
+        self.edge_value = array('d')
+        self.edge_type = array('b')
+        self.edge_letter = array('i')
+
+        # edge id -> support: the index of its constraint in constraints
+        # (-1 for none) and the coefficients of the constraint's bounds,
+        # or the ids of its two parents (-1 for base edges)
+        self.edge_constraint = array('i')
+        self.edge_lower = array('b')
+        self.edge_upper = array('b')
+        self.edge_parent1 = array('i')
+        self.edge_parent2 = array('i')
+        self.constraints = []
+        self.constraint_index = {}
+
+        # the compiled edges, in CSR order
+        self.offsets = None
+        self.sources = None
+        self.targets = None
+        self.weights = None
+        self.edge_types = None
+        self.letters = None
+        self.edge_ids = None
+
+    @staticmethod
+    def from_weights(num_nodes, weights, neighbor_list):
+        # a compiled graph of nodes 0 to num_nodes - 1 from a dict of weights
+        # keyed by (fro, to) pairs, and the successors of each node
+        graph = DistanceGraph(num_nodes - 1)
+        for fro in range(num_nodes):
+            for to in neighbor_list[fro]:
+                graph.add_edge(fro, to, weights[(fro, to)])
+        graph.compile()
+        return graph
+
+    def add_node(self):
+        self.num_nodes += 1
+        return self.num_nodes
+
+    def add_edge(self, fro, to, value, edge_type=EdgeType.SIMPLE, letter=0,
+                 constraint=None, lower=0, upper=0, parents=None):
+        # return the id of the new edge. Its support is either
+        # lower * (lower bound) + upper * (upper bound) of the constraint,
+        # or the two parent edges
+        self.edge_fro.append(fro)
+        self.edge_to.append(to)
+        self.edge_value.append(value)
+        self.edge_type.append(edge_type)
+        self.edge_letter.append(letter)
+
+        if constraint is None:
+            self.edge_constraint.append(-1)
+        else:
+            if constraint not in self.constraint_index:
+                self.constraint_index[constraint] = len(self.constraints)
+                self.constraints.append(constraint)
+            self.edge_constraint.append(self.constraint_index[constraint])
+        self.edge_lower.append(lower)
+        self.edge_upper.append(upper)
+
+        if parents is None:
+            self.edge_parent1.append(-1)
+            self.edge_parent2.append(-1)
+        else:
+            self.edge_parent1.append(parents[0])
+            self.edge_parent2.append(parents[1])
+
+        return len(self.edge_fro) - 1
+
+    def num_edges(self):
+        return len(self.edge_fro)
+
+    def compile(self, edge_ids=None):
+        # sort the given edges (all of them by default) into the CSR arrays.
+        # Edges leaving the same node keep the order of their ids
+        if edge_ids is None:
+            edge_ids = np.arange(self.num_edges(), dtype=np.int32)
+        else:
+            edge_ids = np.asarray(edge_ids, dtype=np.int32)
+
+        sources = np.array(self.edge_fro, dtype=np.int32)[edge_ids]
+        order = np.argsort(sources, kind='stable')
+
+        self.edge_ids = edge_ids[order]
+        self.sources = sources[order]
+        self.targets = np.array(self.edge_to, dtype=np.int32)[self.edge_ids]
+        self.weights = np.array(self.edge_value, dtype=np.float64)[self.edge_ids]
+        self.edge_types = np.array(self.edge_type, dtype=np.int8)[self.edge_ids]
+        self.letters = np.array(self.edge_letter, dtype=np.int32)[self.edge_ids]
+
+        self.offsets = np.zeros(self.num_nodes + 2, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources, minlength=self.num_nodes + 1), out=self.offsets[1:])
+
+    def cycle_edges(self, cycle):
+        # the ids of the compiled edges along a cycle of nodes:
+        # the tightest edge between each two consecutive nodes,
+        # the first one added among equally tight edges
+        offsets = self.offsets
+        edges = []
+        for fro, to in zip(cycle, cycle[1:] + cycle[:1]):
+            start, end = offsets[fro], offsets[fro + 1]
+            positions = start + np.flatnonzero(self.targets[start:end] == to)
+            if len(positions) == 0:
+                raise Exception("No edge from %s to %s in the distance graph" % (fro, to))
+            edges.append(int(self.edge_ids[positions[np.argmin(self.weights[positions])]]))
+        return edges
+
+    def edge(self, edge_id, renaming=None):
+        # the edge as an object, to print it
+        letter = self.edge_letter[edge_id]
+        return DistanceGraphEdge(self.edge_fro[edge_id], self.edge_to[edge_id], self.edge_value[edge_id],
+                                 self.edge_type[edge_id], letter if letter != 0 else None, renaming=renaming)
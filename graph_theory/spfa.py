@@ -1,14 +1,46 @@
 from collections import deque
 
-def spfa(source, num_nodes, weights, neighbor_list, epsilon=10E-5):
+from graph_theory.distance_graph import DistanceGraph
+
+
+class CycleDetection(object):
+    # How spfa finds out about a negative cycle:
+    #   COUNT - a node enters the queue more than num_nodes times
+    #   WALK - every num_nodes relaxations, the predecessor graph is
+    #          searched for a cycle (amortized search, Cherkassky and Goldberg)
+    #   SUBTREE - the shortest path tree is kept, and the subtree of a node
+    #             is disassembled when its distance decreases. Relaxing
+    #             an edge into an ancestor closes a cycle (Tarjan)
+    COUNT = 1
+    WALK = 2
+    SUBTREE = 3
+
+
+def spfa(source, num_nodes, weights, neighbor_list=None, epsilon=10E-5,
+         detection=CycleDetection.SUBTREE, statistics=None):
     """Shortest Paths Fastests Algorithm - think optimized Bellman-Ford,
 
         Assumes nodes have numbers from 0 to num_nodes (inclusive).
+        weights is either a compiled DistanceGraph, or a dict of
+        edge weights keyed by (fro, to) with neighbor_list
+        the successors of each node.
+        If a statistics dict is given, the numbers of edges scanned
+        and of distances decreased are added to it.
         Returns two variables:
             success - true if no negative cycle
             distances - shortest distance from the source to each node
                         or None if negative cycle
         """
+    if isinstance(weights, DistanceGraph):
+        graph = weights
+    else:
+        graph = DistanceGraph.from_weights(num_nodes, weights, neighbor_list)
+
+    # Python lists are faster to index one element at a time
+    offsets = graph.offsets.tolist()
+    targets = graph.targets.tolist()
+    edge_weights = graph.weights.tolist()
+
     # None is Infinity
     distance = [None] * num_nodes
     currently_in_queue = [False for i in range(num_nodes)]
@@ -19,56 +51,130 @@ def spfa(source, num_nodes, weights, neighbor_list, epsilon=10E-5):
     distance[source] = 0
     currently_in_queue[source] = True
     times_in_queue[source] = 1
-    q.append(0)
+    q.append(source)
+
+    if detection == CycleDetection.SUBTREE:
+        # The shortest path tree, as a preorder list of its nodes
+        # (doubly linked, -1 at both ends) and their depths.
+        # Nodes not in the tree have a depth of -1
+        after = [-1] * num_nodes
+        before = [-1] * num_nodes
+        depth = [-1] * num_nodes
+        depth[source] = 0
 
-    negative_cycle_exists = False
+    scans = 0
+    relaxations = 0
+    # relaxations since the last walk of the predecessor graph
+    unchecked = 0
+    negative_cycle = None
 
-    while len(q) > 0 and not negative_cycle_exists:
+    while len(q) > 0 and negative_cycle is None:
         node = q.popleft()
+        if not currently_in_queue[node]:
+            # removed from the queue with its subtree
+            continue
         currently_in_queue[node] = False
-        for neighbor in neighbor_list[node]:
+        for position in range(offsets[node], offsets[node + 1]):
+            neighbor = targets[position]
+            weight = edge_weights[position]
+            scans += 1
 
             if (distance[neighbor] is None or
-                        distance[neighbor] > distance[node] + weights[(node, neighbor)] + epsilon):
+                        distance[neighbor] > distance[node] + weight + epsilon):
+                relaxations += 1
+
+                if detection == CycleDetection.SUBTREE:
+                    # Take the subtree of neighbor out of the tree: the nodes
+                    # after it in preorder, up to the first one that is not deeper.
+                    # Their distances are going down as well, so they need not be
+                    # scanned until they are reached again
+                    if neighbor == node:
+                        negative_cycle = [node]
+                        break
+                    if depth[neighbor] >= 0:
+                        last = neighbor
+                        descendant = after[neighbor]
+                        while descendant != -1 and depth[descendant] > depth[neighbor]:
+                            if descendant == node:
+                                # node is a descendant of neighbor: the tree path
+                                # from neighbor to node and this edge are a negative cycle
+                                negative_cycle = [node]
+                                while negative_cycle[-1] != neighbor:
+                                    negative_cycle.append(predecessor[negative_cycle[-1]])
+                                negative_cycle.reverse()
+                                break
+                            depth[descendant] = -1
+                            currently_in_queue[descendant] = False
+                            last = descendant
+                            descendant = after[descendant]
+                        if negative_cycle is not None:
+                            break
+
+                        if before[neighbor] != -1:
+                            after[before[neighbor]] = descendant
+                        if descendant != -1:
+                            before[descendant] = before[neighbor]
+                        after[last] = -1
+
+                    # and make it a child of node
+                    depth[neighbor] = depth[node] + 1
+                    before[neighbor] = node
+                    after[neighbor] = after[node]
+                    if after[node] != -1:
+                        before[after[node]] = neighbor
+                    after[node] = neighbor
+
                 predecessor[neighbor] = node
 
-                distance[neighbor] = distance[node] + weights[(node, neighbor)]
+                distance[neighbor] = distance[node] + weight
                 if not currently_in_queue[neighbor]:
                     currently_in_queue[neighbor] = True
                     times_in_queue[neighbor] += 1
-                    if times_in_queue[neighbor] > num_nodes:
-                        negative_cycle_exists = True
+                    if detection == CycleDetection.COUNT and times_in_queue[neighbor] > num_nodes:
+                        negative_cycle = predecessor_cycle(predecessor, num_nodes)
+                        assert negative_cycle is not None
                         break
                     q.append(neighbor)
 
-    if negative_cycle_exists:
-        visited = [False for _ in range(num_nodes)]
-        negative_cycle = None
-
-        for node in range(num_nodes):
-            if not visited[node]:
-                # Here we are extracting cycle in predecessor graph.
-                # If we find any cycle it is necessarily negative cycle
-                # because predecessor graph cannot be cyclic otherwise.
-                potential_cycle_node = node
-                potential_cycle = []
-                while predecessor[potential_cycle_node] is not None and not visited[predecessor[potential_cycle_node]]:
-                    # print(str(predecessor[potential_cycle_node]) + '->' + str(potential_cycle_node) + ':' + str(weights[(predecessor[potential_cycle_node], potential_cycle_node)]))
-                    potential_cycle_node = predecessor[potential_cycle_node]
-                    potential_cycle.append(potential_cycle_node)
-                    visited[potential_cycle_node] = True
-                # If the predecessor of the last node was already visited in this run we have our cycle.
-                # it is not necessary spanning the entire array (we could have "entered" on cycle through
-                # simple path.
-                if predecessor[potential_cycle_node] in potential_cycle:
-                    # print(str(predecessor[potential_cycle_node]) + '->' + str(potential_cycle_node) + ':' + str(weights[(predecessor[potential_cycle_node], potential_cycle_node)]))
-                    cycle_start_index = potential_cycle.index(predecessor[potential_cycle_node])
-                    negative_cycle = list(reversed(potential_cycle[cycle_start_index:]))
-                    break
-                visited[node] = True
-
-        assert negative_cycle is not None
-        # print("NCycle size: " + str(len(negative_cycle)))
-        return distance, negative_cycle
-    else:
-        return distance, None
\ No newline at end of file
+                if detection == CycleDetection.WALK:
+                    unchecked += 1
+                    if unchecked >= num_nodes:
+                        unchecked = 0
+                        negative_cycle = predecessor_cycle(predecessor, num_nodes)
+                        if negative_cycle is not None:
+                            break
+
+    if statistics is not None:
+        statistics["Scans"] = statistics.get("Scans", 0) + scans
+        statistics["Relaxations"] = statistics.get("Relaxations", 0) + relaxations
+
+    # print("NCycle size: " + str(len(negative_cycle)))
+    return distance, negative_cycle
+
+
+def predecessor_cycle(predecessor, num_nodes):
+    # a cycle in the predecessor graph, or None. Any cycle found there
+    # is necessarily negative, because the predecessor graph
+    # cannot be cyclic otherwise.
+    # Each node is visited once: walk[node] is the number of the walk
+    # that reached it first, 0 if none has
+    walk = [0] * num_nodes
+
+    for start in range(num_nodes):
+        if walk[start] != 0:
+            continue
+        node = start
+        while node is not None and walk[node] == 0:
+            walk[node] = start + 1
+            node = predecessor[node]
+
+        # If the walk ran into itself we have our cycle. It does not
+        # necessarily contain start (we could have "entered" on cycle
+        # through simple path)
+        if node is not None and walk[node] == start + 1:
+            cycle = [node]
+            while predecessor[cycle[-1]] != node:
+                cycle.append(predecessor[cycle[-1]])
+            return list(reversed(cycle))
+
+    return None
@@ -1,6 +1,10 @@
 import unittest
+import random
 
-from graph_theory.spfa import spfa
+from graph_theory.spfa import spfa, CycleDetection
+from graph_theory.distance_graph import DistanceGraph
+from graph_theory.all_pairs import floyd_warshall, johnson
+import numpy as np
 
 
 class GraphTheoryTests(unittest.TestCase):
@@ -41,3 +45,84 @@ class GraphTheoryTests(unittest.TestCase):
         # Careful, double negation ahead
         assert(negative_cycle is not None)
         assert(self.is_cyclicily_equal(negative_cycle, self.example_graph_cycle))
+
+    def test_distance_graph(self):
+        source, num_nodes, weights, neighbour_list = self.example_graph
+        graph = DistanceGraph(num_nodes - 1)
+        edge_ids = {}
+        for fro in range(num_nodes):
+            for to in neighbour_list[fro]:
+                edge_ids[(fro, to)] = graph.add_edge(fro, to, weights[(fro, to)])
+        # a looser parallel edge is never on the cycle
+        graph.add_edge(3, 1, 5)
+        graph.compile()
+
+        self.assertEqual(list(graph.offsets), [0, 1, 2, 3, 6, 7])
+        self.assertEqual(list(graph.sources), [0, 1, 2, 3, 3, 3, 4])
+
+        _, negative_cycle = spfa(source, num_nodes, graph)
+        assert(self.is_cyclicily_equal(negative_cycle, self.example_graph_cycle))
+
+        edges = graph.cycle_edges(negative_cycle)
+        self.assertEqual(sorted(edges), sorted(edge_ids[pair] for pair in [(1, 2), (2, 3), (3, 1)]))
+
+    def test_cycle_detection(self):
+        # every strategy finds a negative cycle exactly when there is one,
+        # and the same distances otherwise
+        generator = random.Random(3)
+        strategies = [CycleDetection.COUNT, CycleDetection.WALK, CycleDetection.SUBTREE]
+        for _ in range(200):
+            num_nodes = generator.randint(2, 12)
+            weights = {}
+            neighbour_list = [[] for _ in range(num_nodes)]
+            for node in range(1, num_nodes):
+                weights[(0, node)] = 0
+                neighbour_list[0].append(node)
+            for _ in range(generator.randint(1, 3 * num_nodes)):
+                fro, to = generator.randint(1, num_nodes - 1), generator.randint(1, num_nodes - 1)
+                if (fro, to) not in weights:
+                    weights[(fro, to)] = generator.randint(-4, 10)
+                    neighbour_list[fro].append(to)
+
+            results = [spfa(0, num_nodes, weights, neighbour_list, detection=strategy) for strategy in strategies]
+            has_cycle = [negative_cycle is not None for _, negative_cycle in results]
+            self.assertEqual(len(set(has_cycle)), 1)
+
+            for distance, negative_cycle in results:
+                if negative_cycle is not None:
+                    value = sum(weights[pair] for pair in zip(negative_cycle, negative_cycle[1:] + negative_cycle[:1]))
+                    self.assertLess(value, 0)
+                else:
+                    self.assertEqual(distance, results[0][0])
+
+    def test_all_pairs(self):
+        # the vectorized Floyd-Warshall gives the distances of the triple loop,
+        # and Johnson's algorithm the same ones on sparse graphs
+        generator = random.Random(5)
+        default = 100.0
+        sparse_checked = 0
+        for _ in range(100):
+            num_nodes = generator.randint(2, 12)
+            weights = np.full((num_nodes, num_nodes), default)
+            edges = np.zeros((num_nodes, num_nodes), dtype=bool)
+            for _ in range(generator.randint(1, 2 * num_nodes)):
+                fro, to = generator.sample(range(num_nodes), 2)
+                weights[fro, to] = generator.randint(-20, 60)
+                edges[fro, to] = True
+
+            expected = weights.copy()
+            for k in range(num_nodes):
+                for i in range(num_nodes):
+                    for j in range(num_nodes):
+                        if i != j and i != k and j != k:
+                            expected[i, j] = min(expected[i, j], expected[i, k] + expected[k, j])
+            np.fill_diagonal(expected, 0)
+
+            self.assertTrue(np.array_equal(floyd_warshall(weights), expected))
+
+            distance = johnson(weights, edges, default)
+            if distance is not None:
+                sparse_checked += 1
+                self.assertTrue(np.allclose(distance, expected))
+
+        self.assertTrue(sparse_checked > 50)
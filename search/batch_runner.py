@@ -0,0 +1,212 @@
+__author__ = 'yupeng'
+
+from multiprocessing import Process, Queue
+from os.path import basename, isdir, join
+from queue import Empty
+from time import perf_counter
+from glob import glob
+import argparse
+import json
+import os
+import sys
+from search.portfolio import SolverConfiguration, solve_configuration, terminate
+from search.solve_server import parse_model
+
+
+def run_tasks(tasks, results, configuration, time_limit):
+    # a worker process: solve the files it is given on its own task queue,
+    # one at a time, until it is told to stop. Like the solvers of a
+    # portfolio, it leads its own process group, so that it can be
+    # terminated with the processes it starts
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        index, path = task
+        started = perf_counter()
+        try:
+            with open(path, "rb") as f:
+                tpnu = parse_model(f.read())
+            status, description = solve_configuration(tpnu, configuration, time_limit)
+        except Exception as e:
+            status, description = "Error: " + str(e), None
+
+        results.put((index, status, description, perf_counter() - started))
+
+
+class BatchRunner(object):
+
+    # Solves a batch of CCTP and TPN files with one solver configuration,
+    # on a pool of worker processes that lasts for the whole batch.
+    # A file that runs past the time limit has its worker terminated
+    # and replaced. Results are written as JSON Lines as they complete
+
+    EXTENSIONS = (".cctp", ".tpn")
+
+    # seconds given to a task past the time limit before its worker is terminated
+    GRACE_PERIOD = 10
+
+    # seconds between checks of the running tasks
+    POLL_INTERVAL = 1
+
+    def __init__(self, configuration, workers=None, time_limit=None, output=None):
+        self.configuration = configuration
+        self.workers = os.cpu_count() if workers is None else workers
+        self.time_limit = time_limit
+        # a stream for the JSON lines, if any
+        self.output = output
+
+    @staticmethod
+    def files(pattern):
+        # the problem files in a directory, or matching a glob pattern
+        if isdir(pattern):
+            paths = [join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            paths = glob(pattern)
+
+        return sorted(path for path in paths if path.endswith(BatchRunner.EXTENSIONS))
+
+    def run(self, paths):
+        # return the results of the files, in the order of the paths.
+        # Each worker is given its next file once it has reported the
+        # previous one, so the file of a worker that dies is always known
+        results = Queue()
+        waiting = list(range(len(paths)))
+
+        # pid -> worker process, and its task queue
+        processes = {}
+        tasks = {}
+        # pid -> (index of the file it was given, perf_counter() time it was given)
+        running = {}
+        for i in range(min(self.workers, len(paths))):
+            self.start_worker(processes, tasks, results)
+
+        for pid in list(processes.keys()):
+            self.assign(pid, paths, waiting, tasks, running)
+
+        records = [None] * len(paths)
+        remaining = len(paths)
+        try:
+            while remaining > 0:
+                # the workers that exited before this poll
+                # have already written their results, if any
+                exited = [pid for pid in processes if processes[pid].exitcode is not None]
+                try:
+                    message = results.get(timeout=BatchRunner.POLL_INTERVAL)
+                except Empty:
+                    message = None
+
+                if message is not None:
+                    index, status, description, seconds = message
+                    # the result of a file already recorded as
+                    # timed out, from a worker terminated too late
+                    if records[index] is None:
+                        records[index] = self.complete(paths[index], status, description, seconds)
+                        remaining -= 1
+
+                    for pid in list(running.keys()):
+                        if running[pid][0] == index:
+                            del running[pid]
+                            if processes[pid].exitcode is None:
+                                self.assign(pid, paths, waiting, tasks, running)
+
+                for pid in list(running.keys()):
+                    index, started = running[pid]
+                    seconds = perf_counter() - started
+                    if self.time_limit is not None and seconds > self.time_limit + BatchRunner.GRACE_PERIOD:
+                        status = "TimedOut"
+                        terminate(processes[pid])
+                        processes[pid].join()
+                    elif message is None and pid in exited:
+                        status = "Error: the worker process died"
+                    else:
+                        continue
+
+                    del running[pid]
+                    if records[index] is None:
+                        records[index] = self.complete(paths[index], status, None, seconds)
+                        remaining -= 1
+
+                # replace the workers that exited without a file,
+                # as long as there are files left
+                for pid in list(processes.keys()):
+                    if pid not in running and processes[pid].exitcode is not None:
+                        processes.pop(pid).join()
+                        del tasks[pid]
+                        if len(waiting) > 0:
+                            self.assign(self.start_worker(processes, tasks, results), paths, waiting, tasks, running)
+
+            for process in processes.values():
+                process.join()
+
+        finally:
+            for process in processes.values():
+                if process.is_alive():
+                    terminate(process)
+                    process.join()
+
+        return records
+
+    def start_worker(self, processes, tasks, results):
+        queue = Queue()
+        process = Process(target=run_tasks, args=(queue,results,self.configuration,self.time_limit,))
+        process.start()
+        processes[process.pid] = process
+        tasks[process.pid] = queue
+        return process.pid
+
+    def assign(self, pid, paths, waiting, tasks, running):
+        # give a worker the next file, or tell it to stop
+        if len(waiting) > 0:
+            index = waiting.pop(0)
+            tasks[pid].put((index, paths[index]))
+            running[pid] = (index, perf_counter())
+        else:
+            tasks[pid].put(None)
+
+    def complete(self, path, status, description, seconds):
+        # the result of a file, in the format of the benchmarks:
+        # the description of its solution, or the error
+        if description is not None:
+            record = dict(description)
+        else:
+            record = {}
+            record["Error"] = "No Solution Found"
+
+        record["TestName"] = basename(path)
+        record["Path"] = path
+        record["Solver"] = self.configuration.name
+        record["Runtime"] = seconds
+        record["Status"] = status
+
+        if self.output is not None:
+            self.output.write(json.dumps(record) + "\n")
+            self.output.flush()
+
+        return record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a directory or glob of CCTP and TPN files in parallel")
+    parser.add_argument("pattern", help="a directory, or a glob pattern of problem files")
+    parser.add_argument("--solver", default="CDRU")
+    parser.add_argument("--feasibility", default="DYNAMIC_CONTROLLABILITY")
+    parser.add_argument("--objective", default="MIN_COST")
+    parser.add_argument("--chance-constrained", default="OFF")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per file")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--output", default=None, help="JSON Lines file, defaults to the standard output")
+    args = parser.parse_args()
+
+    configuration = SolverConfiguration.from_names(args.solver, args.feasibility, args.objective,
+                                                   args.chance_constrained)
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        BatchRunner(configuration, args.workers, args.time_limit, output).run(BatchRunner.files(args.pattern))
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,60 @@
+__author__ = 'yupeng'
+
+from os.path import join, dirname
+from time import perf_counter
+import os
+import json
+from temporal_network.tpnu import Tpnu
+from controllability.dynamic_controllability import DynamicControllability
+
+class BenchmarkDC():
+
+    # Compares the dynamic controllability checkers on the bundled
+    # MBTA (Route*) and AUV examples: for each solver, the time of a check
+    # of the whole network (median of a few runs) and its outcome
+
+    REPEATS = 5
+
+    @staticmethod
+    def main():
+        cdru_dir = dirname(__file__)
+        examples_dir = join(cdru_dir, join('..', 'examples'))
+
+        totals = {}
+        for file in sorted(os.listdir(examples_dir)):
+            if not ((file.startswith("Route") or file.startswith("AUV")) and file.endswith(".cctp")):
+                continue
+            result = BenchmarkDC.runTest(examples_dir,file)
+            print(json.dumps(result))
+            for solver in DynamicControllability.SOLVERS:
+                totals[solver] = totals.get(solver, 0) + result[solver]["Seconds"]
+
+        print(json.dumps({"TestName": "Total", "Seconds": totals}))
+
+    @staticmethod
+    def runTest(directory,file):
+        path = join(directory, file)
+        tpnu = Tpnu.parseCCTP(path)
+
+        result = {}
+        result["TestName"] = file
+        result["Nodes"] = tpnu.num_nodes
+        result["Constraints"] = len(tpnu.temporal_constraints)
+        for solver in DynamicControllability.SOLVERS:
+            times = []
+            for i in range(BenchmarkDC.REPEATS):
+                started = perf_counter()
+                conflict = DynamicControllability.check(tpnu, solver=solver)
+                times.append(perf_counter() - started)
+
+            solverObj = {}
+            solverObj["Seconds"] = sorted(times)[len(times) // 2]
+            solverObj["Controllable"] = conflict is None
+            if conflict is not None:
+                solverObj["Cycles"] = len(conflict)
+            result[solver] = solverObj
+
+        return result
+
+if __name__ == "__main__":
+    BenchmarkDC.main()
@@ -1,42 +1,12 @@
 __author__ = 'yupeng'
 
 from os.path import join, dirname
-from os import listdir
 import json
-from math import fabs
-from tpn import Tpn
-from temporal_network.tpnu import Tpnu
-from search.search_problem import SearchProblem
+import sys
+from temporal_network.tpnu import ChanceConstrained
 from temporal_network.tpnu import FeasibilityType, ObjectiveType
-from datetime import datetime
-from search.mip_encode import MipEncode
-from multiprocessing import Process, Queue
-from multiprocessing.managers import BaseManager
-from search.candidate import Candidate
-
-class SolverType(object):
-    CDRU = 1
-    MIP = 2
-
-class MyManager(BaseManager): pass
-
-def Manager():
-    m = MyManager()
-    m.start()
-    return m
-
-class SolutionContainer(object):
-  def __init__(self):
-    self._value = None
-
-  def update(self, value):
-    self._value = value
-
-  def get_value(self):
-      return self._value
-
-
-MyManager.register('SolutionContainer', SolutionContainer, exposed = ['update', 'get_value'])
+from search.portfolio import SolverType, SolverConfiguration
+from search.batch_runner import BatchRunner
 
 class BenchmarkMBTA():
 
@@ -45,78 +15,17 @@ class BenchmarkMBTA():
         cdru_dir = dirname(__file__)
         examples_dir = join(cdru_dir, join('..', 'benchmark/MBTA/'))
 
-        solutions = []
-        for i in listdir(examples_dir):
-            if i.endswith(".cctp"):
-                solutionDesc = BenchmarkMBTA.runTest(examples_dir,i,SolverType.MIP,ObjectiveType.MIN_COST)
-                print(json.dumps(solutionDesc))
-                solutions.append(solutionDesc)
+        # the MIP solver does not stop by itself, its worker
+        # is terminated once past the time limit
+        configuration = SolverConfiguration(SolverType.MIP,FeasibilityType.DYNAMIC_CONTROLLABILITY,
+                                            ObjectiveType.MIN_COST,ChanceConstrained.OFF,
+                                            name=BenchmarkMBTA.getSolveName(SolverType.MIP))
+        runner = BatchRunner(configuration,time_limit=600,output=sys.stdout)
+        solutions = runner.run(BatchRunner.files(join(examples_dir,"*.cctp")))
 
         output = {"Results": solutions}
         print(json.dumps(output))
 
-    @staticmethod
-    def runTest(directory,file,solver,objType):
-        path = join(directory, file)
-        print("----------------------------------------")
-
-        if Tpnu.isCCTP(path):
-            tpnu = Tpnu.parseCCTP(path)
-        elif Tpnu.isTPN(path):
-            obj = Tpn.parseTPN(path)
-            tpnu = Tpnu.from_tpn_autogen(obj)
-        else:
-            raise Exception("Input file " + path + " is neither a CCTP nor a TPN")
-
-        startTime = datetime.now()
-
-        manager = Manager()
-        container = manager.SolutionContainer()
-
-        p = Process(target=BenchmarkMBTA.solve, name="Solve", args=(tpnu,solver,objType,startTime,file,container,))
-        p.start()
-        p.join(600)
-        if p.is_alive():
-            print("Solver is running... No solution found in time limit...")
-            # Terminate foo
-            p.terminate()
-            p.join()
-
-        solution = container.get_value()
-        runtime = datetime.now() - startTime
-
-        if solution is not None:
-            print(file + " solved in " + str(runtime))
-        else:
-            print(file + " not solved in " + str(runtime))
-
-        if solution is not None:
-            return solution
-        else:
-            result = {}
-            result["TestName"] = file
-            result["Solver"] = BenchmarkMBTA.getSolveName(solver)
-            result["Runtime"] = runtime.total_seconds()
-            result["Error"] = "No Solution Found"
-
-            return result
-
-    @staticmethod
-    def solve(tpnu,solver,objType,startTime,filename,container):
-        if solver == SolverType.CDRU:
-            search_problem = SearchProblem(tpnu,FeasibilityType.DYNAMIC_CONTROLLABILITY,objType)
-            search_problem.initialize()
-            solution = search_problem.next_solution()
-        elif solver == SolverType.MIP:
-            mip_solver = MipEncode(tpnu,objType)
-            solution = mip_solver.mip_solver()
-        else:
-            raise Exception('Unknown solver type')
-
-        runtime = datetime.now() - startTime
-        container.update(solution.json_description(filename,BenchmarkMBTA.getSolveName(solver),runtime.total_seconds()))
-
-
     @staticmethod
     def getSolveName(solver):
         if solver == SolverType.CDRU:
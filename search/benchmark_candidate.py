@@ -0,0 +1,136 @@
+__author__ = 'yupeng'
+
+from os.path import join, dirname
+from queue import PriorityQueue
+from datetime import datetime
+import tracemalloc
+import heapq
+import json
+from tpn import Tpn
+from temporal_network.tpnu import Tpnu, ChanceConstrained
+from temporal_network.tpnu import FeasibilityType, ObjectiveType
+from search.search_problem import SearchProblem
+from search.frontier import Frontier
+
+class BenchmarkCandidate():
+
+    # Micro benchmark for the cost of expanding a candidate.
+    # For each problem it reports the time and the number of
+    # memory blocks allocated per expansion, and the same figures for
+    # the containers the candidates and the frontier used to be built on
+    # (queue.PriorityQueue) against the ones they use now
+
+    @staticmethod
+    def main():
+        cdru_dir = dirname(__file__)
+        examples_dir = join(cdru_dir, join('..', 'examples'))
+
+        results = []
+        for file in ['AUV-2.cctp', 'bus-4.cctp', 'Zipcar-1.cctp', 'Zipcar-8.tpn']:
+            result = BenchmarkCandidate.runTest(examples_dir,file,5000)
+            print(json.dumps(result))
+            results.append(result)
+
+        results.append(BenchmarkCandidate.runContainerTest(20000))
+        print(json.dumps(results[-1]))
+
+    @staticmethod
+    def runTest(directory,file,expansions):
+        path = join(directory, file)
+
+        if Tpnu.isCCTP(path):
+            tpnu = Tpnu.parseCCTP(path)
+        elif Tpnu.isTPN(path):
+            obj = Tpn.parseTPN(path)
+            tpnu = Tpnu.from_tpn_autogen(obj)
+        else:
+            raise Exception("Input file " + path + " is neither a CCTP nor a TPN")
+
+        search_problem = SearchProblem(tpnu,FeasibilityType.CONSISTENCY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.initialize()
+        root = search_problem.queue.get()
+        variable = search_problem.check_complete(root)
+
+        result = {}
+        result["TestName"] = file
+
+        if variable is None:
+            result["Error"] = "No variable to expand on"
+            return result
+
+        # expand the root candidate on its first variable,
+        # and keep the children alive so that they are counted
+        def expand(children):
+            for domain_assignment in variable.domain:
+                children.append(search_problem.create_child_candidate_from_assignment(root,domain_assignment))
+
+        seconds, blocks = BenchmarkCandidate.measure(expand,expansions)
+        result["Expansions"] = expansions
+        result["ChildrenPerExpansion"] = len(variable.domain)
+        result["MicrosecondsPerExpansion"] = round(seconds * 1e6, 3)
+        result["BlocksPerExpansion"] = round(blocks, 2)
+
+        return result
+
+    @staticmethod
+    def runContainerTest(count):
+        result = {}
+        result["TestName"] = "Containers"
+
+        # the per-candidate queue of unassigned variables
+        seconds, blocks = BenchmarkCandidate.measure(lambda kept: kept.append(PriorityQueue()),count)
+        result["PriorityQueueMicroseconds"] = round(seconds * 1e6, 3)
+        result["PriorityQueueBlocks"] = round(blocks, 2)
+
+        seconds, blocks = BenchmarkCandidate.measure(lambda kept: kept.append([]),count)
+        result["HeapListMicroseconds"] = round(seconds * 1e6, 3)
+        result["HeapListBlocks"] = round(blocks, 2)
+
+        # the global frontier, one put and one get
+        def locked_frontier(kept):
+            if len(kept) == 0:
+                kept.append(PriorityQueue())
+            kept[0].put(len(kept))
+            kept[0].put(-len(kept))
+            kept[0].get()
+
+        def frontier(kept):
+            if len(kept) == 0:
+                kept.append(Frontier())
+            kept[0].put(len(kept))
+            kept[0].put(-len(kept))
+            kept[0].get()
+
+        seconds, _ = BenchmarkCandidate.measure(locked_frontier,count)
+        result["PriorityQueuePutGetMicroseconds"] = round(seconds * 1e6, 3)
+        seconds, _ = BenchmarkCandidate.measure(frontier,count)
+        result["FrontierPutGetMicroseconds"] = round(seconds * 1e6, 3)
+
+        return result
+
+    @staticmethod
+    def measure(operation,count):
+        # returns the average time, and the average number of memory
+        # blocks still allocated after each call of the operation
+        kept = []
+        startTime = datetime.now()
+        for i in range(count):
+            operation(kept)
+        runtime = datetime.now() - startTime
+
+        kept = []
+        tracemalloc.start()
+        before = BenchmarkCandidate.count_blocks(tracemalloc.take_snapshot())
+        for i in range(count):
+            operation(kept)
+        after = BenchmarkCandidate.count_blocks(tracemalloc.take_snapshot())
+        tracemalloc.stop()
+
+        return runtime.total_seconds() / count, float(after - before) / count
+
+    @staticmethod
+    def count_blocks(snapshot):
+        return sum(stat.count for stat in snapshot.statistics('filename'))
+
+if __name__ == "__main__":
+    BenchmarkCandidate.main()
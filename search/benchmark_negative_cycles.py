@@ -0,0 +1,87 @@
+__author__ = 'yupeng'
+
+from os.path import join, dirname
+from time import perf_counter
+import os
+import json
+from tpn import Tpn
+from temporal_network.tpnu import Tpnu
+from controllability.temporal_consistency import NrgativeCycleDetection
+from controllability.strong_controllability import Vidal99Reduction
+from graph_theory import spfa, CycleDetection
+
+class BenchmarkNegativeCycles():
+
+    # Compares the ways spfa detects negative cycles on the distance
+    # graphs of the bundled examples that have one: the temporal
+    # consistency graph, and the graph reduced for strong controllability.
+    # For each strategy it reports the number of edges scanned,
+    # the number of distances decreased and the time until the cycle is found
+
+    STRATEGIES = [("Count", CycleDetection.COUNT),
+                  ("Walk", CycleDetection.WALK),
+                  ("Subtree", CycleDetection.SUBTREE)]
+
+    @staticmethod
+    def main():
+        cdru_dir = dirname(__file__)
+        examples_dir = join(cdru_dir, join('..', 'examples'))
+
+        totals = {}
+        for file in sorted(os.listdir(examples_dir)):
+            if not (file.endswith(".cctp") or file.endswith(".tpn")):
+                continue
+            for result in BenchmarkNegativeCycles.runTest(examples_dir,file):
+                print(json.dumps(result))
+                for name, _ in BenchmarkNegativeCycles.STRATEGIES:
+                    total = totals.setdefault(name, {"Scans": 0, "Relaxations": 0})
+                    total["Scans"] += result[name]["Scans"]
+                    total["Relaxations"] += result[name]["Relaxations"]
+
+        print(json.dumps({"TestName": "Total", "Strategies": totals}))
+
+    @staticmethod
+    def runTest(directory,file):
+        path = join(directory, file)
+
+        if Tpnu.isCCTP(path):
+            tpnu = Tpnu.parseCCTP(path)
+        elif Tpnu.isTPN(path):
+            obj = Tpn.parseTPN(path)
+            tpnu = Tpnu.from_tpn_autogen(obj)
+        else:
+            raise Exception("Input file " + path + " is neither a CCTP nor a TPN")
+        tpnu.initialize()
+
+        results = []
+        consistency_graph = NrgativeCycleDetection().generate_graph_from_tpnu(tpnu)
+        strong_graph, reduced_edges = Vidal99Reduction().generate_graph_from_tpnu(tpnu)
+        for checker, graph, edges in [("Consistency", consistency_graph, None),
+                                      ("StrongControllability", strong_graph, reduced_edges)]:
+            # Like in the checkers, node 0 is added artificially
+            source_edges = [graph.add_edge(0, node, 0) for node in range(1, graph.num_nodes + 1)]
+            graph.compile(None if edges is None else edges + source_edges)
+
+            result = {}
+            result["TestName"] = file
+            result["Graph"] = checker
+            result["Nodes"] = graph.num_nodes
+            result["Edges"] = len(graph.edge_ids)
+            for name, strategy in BenchmarkNegativeCycles.STRATEGIES:
+                statistics = {}
+                started = perf_counter()
+                _, negative_cycle = spfa(0, graph.num_nodes + 1, graph, detection=strategy, statistics=statistics)
+                statistics["Seconds"] = round(perf_counter() - started, 6)
+                if negative_cycle is None:
+                    break
+                statistics["CycleLength"] = len(negative_cycle)
+                result[name] = statistics
+
+            # only the graphs with a negative cycle are reported
+            if negative_cycle is not None:
+                results.append(result)
+
+        return results
+
+if __name__ == "__main__":
+    BenchmarkNegativeCycles.main()
@@ -1,30 +1,91 @@
 __author__ = 'yupeng'
 
-from queue import PriorityQueue
+from search.persistent_set import PersistentSet
 import json
 
 class Candidate(object):
 
-    def __init__(self):
-        self.assignments = set()
-        self.temporal_relaxations = set()
+    # candidates are created for every expansion, so we keep them
+    # compact: no per-instance __dict__, and a plain heap
+    # (instead of a locked queue.PriorityQueue) for the unassigned variables
+    __slots__ = ('assignments', 'temporal_relaxations', 'temporal_allocations',
+                 'chance_constraint_relaxations', 'g', 'h', 'utility',
+                 'assignment_utility', 'relaxation_cost',
+                 'resolved_conflicts', 'continuously_resolved_cycles', 'assignments_to_avoid',
+                 'conflict_cursor', 'conflict_horizon', 'new_assignments',
+                 'assigned_variables', 'unassigned_variables', 'semantic_relaxations',
+                 'signature', 'parent', 'children', 'backed_up', 'original_h')
+
+    def __init__(self, parent=None, keep_relaxations=True):
+        # the sets below are persistent, so that a child
+        # candidate can share them with its parent.
+        # Only the changes made to the child are stored in it
+        if parent is None:
+            self.assignments = PersistentSet()
+            self.assigned_variables = PersistentSet()
+            self.resolved_conflicts = PersistentSet()
+            self.continuously_resolved_cycles = PersistentSet()
+            self.assignments_to_avoid = PersistentSet()
+            self.semantic_relaxations = PersistentSet()
+        else:
+            self.assignments = parent.assignments.branch()
+            self.assigned_variables = parent.assigned_variables.branch()
+            self.resolved_conflicts = parent.resolved_conflicts.branch()
+            self.continuously_resolved_cycles = parent.continuously_resolved_cycles.branch()
+            self.assignments_to_avoid = parent.assignments_to_avoid.branch()
+            self.semantic_relaxations = parent.semantic_relaxations.branch()
+
+        if parent is not None and keep_relaxations:
+            self.temporal_relaxations = parent.temporal_relaxations.branch()
+            self.relaxation_cost = parent.relaxation_cost
+        else:
+            self.temporal_relaxations = PersistentSet()
+            self.relaxation_cost = 0
+
         self.temporal_allocations = set()
         self.chance_constraint_relaxations = set()
-        self.g = 0 # reward/cost so far
-        self.h = 0 # max reward/min cost to go
 
-        self.resolved_conflicts = set()
-        self.continuously_resolved_cycles = set()
-        self.assignments_to_avoid = set()
+        # the two components of g that children inherit
+        self.assignment_utility = 0 if parent is None else parent.assignment_utility
 
-        self.assigned_variables = set()
-        self.unassigned_variables = PriorityQueue()
-
-        self.semantic_relaxations = set()
+        self.g = self.assignment_utility - self.relaxation_cost # reward/cost so far
+        self.h = 0 # max reward/min cost to go
+        self.utility = None
+
+        # position in the search problem's conflict index
+        # all conflicts before the cursor are resolved by this candidate
+        # and those before the horizon have been checked against its parent
+        self.conflict_cursor = 0 if parent is None else parent.conflict_cursor
+        self.conflict_horizon = 0 if parent is None else parent.conflict_horizon
+        # assignments added on top of the parent candidate
+        self.new_assignments = []
+
+        # heap of the available variables that are not assigned yet
+        self.unassigned_variables = []
+
+        # set by the search problem's candidate table
+        # when the candidate is queued
+        self.signature = None
+
+        # used by the memory bounded search only: the parent is not kept
+        # otherwise, as it would keep every ancestor in memory.
+        # children counts the children of this candidate still in memory,
+        # and backed_up is the best utility of those that were dropped
+        # since it was last expanded. While it is set, the candidate is
+        # queued with it, and original_h holds its own heuristic
+        self.parent = None
+        self.children = 0
+        self.backed_up = None
+        self.original_h = None
 
     def __lt__(self, other):
         return (self.g + self.h) > (other.g + other.h)
 
+    def create_child(self, keep_relaxations=True):
+        # create a child candidate that shares the assignments,
+        # resolutions and (optionally) temporal relaxations of this one
+        return Candidate(self, keep_relaxations)
+
     def add_assignment(self,new_assignment):
 
         if new_assignment in self.assignments:
@@ -38,15 +99,15 @@ class Candidate(object):
         if new_assignment in self.assignments_to_avoid:
             return False
 
-        # TODO: check if this assignment itself is in conflict with any existing assignment
-        # How to do it efficiently????
-        for existing_assignment in self.assignments:
-            if existing_assignment.decision_variable is new_assignment.decision_variable:
-                if not existing_assignment is new_assignment:
-                    return False
+        # check if this assignment itself is in conflict with any existing assignment,
+        # which is the case if its variable has been assigned a different value
+        if new_assignment.decision_variable in self.assigned_variables:
+            return False
 
         self.assignments.add(new_assignment)
+        self.new_assignments.append(new_assignment)
         self.g += new_assignment.utility
+        self.assignment_utility += new_assignment.utility
         self.assigned_variables.add(new_assignment.decision_variable)
 
         return True
@@ -65,11 +126,15 @@ class Candidate(object):
             return False
 
         self.temporal_relaxations.add(new_relaxation)
+        cost = 0
         if new_relaxation.relaxed_lb is not None:
-            self.g -= abs(new_relaxation.relaxed_lb - new_relaxation.constraint.lower_bound) * new_relaxation.constraint.relax_cost_lb
+            cost += abs(new_relaxation.relaxed_lb - new_relaxation.constraint.lower_bound) * new_relaxation.constraint.relax_cost_lb
 
         if new_relaxation.relaxed_ub is not None:
-            self.g -= abs(new_relaxation.relaxed_ub - new_relaxation.constraint.upper_bound) * new_relaxation.constraint.relax_cost_ub
+            cost += abs(new_relaxation.relaxed_ub - new_relaxation.constraint.upper_bound) * new_relaxation.constraint.relax_cost_ub
+
+        self.g -= cost
+        self.relaxation_cost += cost
 
         return True
 
@@ -128,7 +193,7 @@ class Candidate(object):
 
         print("Assignment# "+ str(len(self.assignments)) +"  Relaxation# " + str(len(self.temporal_relaxations))+"  Allocation# " + str(len(self.temporal_allocations)))
         print("Resolved Conflict# "+ str(len(self.resolved_conflicts)) +"  Cont Resolved# " + str(len(self.continuously_resolved_cycles)))
-        print("Assignment To Avoid# "+ str(len(self.assignments_to_avoid)) +"  Unassigned Var# " + str(self.unassigned_variables.qsize()))
+        print("Assignment To Avoid# "+ str(len(self.assignments_to_avoid)) +"  Unassigned Var# " + str(len(self.unassigned_variables)))
 
         for assignment in self.assignments:
             assignment.pretty_print()
@@ -0,0 +1,131 @@
+__author__ = 'yupeng'
+
+from collections import OrderedDict
+
+
+class CandidateTable(object):
+
+    # number of dequeued candidates remembered,
+    # beyond which the oldest ones are forgotten
+    CAPACITY = 100000
+
+    # relaxed bounds are compared after rounding to this precision,
+    # as the LPs may return slightly different values for the same relaxation
+    RESOLUTION = 1e-6
+
+    def __init__(self):
+        # the candidates in the queue, and those dequeued, by the key of their
+        # signature. Each entry lists the assignments to avoid and the cycles
+        # resolved by relaxation of one candidate.
+        # Candidates in the queue are kept in memory anyway, so only
+        # the closed table is bounded
+        self.open = {}
+        self.closed = OrderedDict()
+        self.closed_size = 0
+        self.pruned = 0
+
+    def add(self, candidate):
+        # return False if the candidate is a duplicate of
+        # one already in the queue or dequeued before,
+        # or of one that leads to all of its solutions
+        if candidate.signature is None:
+            candidate.signature = CandidateTable.signature(candidate)
+
+        key, avoided, resolved = candidate.signature
+
+        for entries in (self.open.get(key, ()), self.closed.get(key, ())):
+            for entry in entries:
+                if entry[0] <= avoided and entry[1] == resolved:
+                    self.pruned += 1
+                    return False
+
+        self.open.setdefault(key, []).append((avoided, resolved, candidate))
+        return True
+
+    def close(self, candidate):
+        # the candidate has been dequeued
+        key, avoided, resolved = candidate.signature
+
+        entries = self.open.get(key, [])
+        for i in range(len(entries)):
+            if entries[i][2] is candidate:
+                del entries[i]
+                if len(entries) == 0:
+                    del self.open[key]
+
+                self.closed.setdefault(key, []).append((avoided, resolved))
+                self.closed_size += 1
+                break
+
+        # forget the oldest dequeued candidates
+        while self.closed_size > CandidateTable.CAPACITY:
+            _, entries = self.closed.popitem(last=False)
+            self.closed_size -= len(entries)
+
+    def reopen(self, candidate):
+        # the candidate goes back to the queue after a new conflict was learned
+        key, avoided, resolved = candidate.signature
+
+        entries = self.closed.get(key, [])
+        if (avoided, resolved) in entries:
+            entries.remove((avoided, resolved))
+            self.closed_size -= 1
+            if len(entries) == 0:
+                del self.closed[key]
+
+        self.open.setdefault(key, []).append((avoided, resolved, candidate))
+
+    def forget(self, candidate):
+        # the candidate was dropped from the queue,
+        # and may be generated again later
+        key, avoided, resolved = candidate.signature
+
+        entries = self.open.get(key, [])
+        for i in range(len(entries)):
+            if entries[i][2] is candidate:
+                del entries[i]
+                if len(entries) == 0:
+                    del self.open[key]
+                break
+
+    @staticmethod
+    def signature(candidate):
+        # Two candidates with the same assignments and the same relaxed bounds
+        # (the key of the signature) have the same utility and heuristic.
+        # If they have also resolved the same negative cycles by relaxation,
+        # which constrain the relaxations of their children, the one that
+        # avoids fewer assignments (ignoring those of variables already assigned)
+        # leads to all the solutions of the other
+        assignments_to_avoid = []
+        for assignment in candidate.assignments_to_avoid:
+            if assignment.decision_variable not in candidate.assigned_variables:
+                assignments_to_avoid.append(assignment)
+
+        relaxations = []
+        for relaxation in candidate.temporal_relaxations:
+            relaxations.append((relaxation.constraint.id,
+                                CandidateTable.quantize(relaxation.relaxed_lb),
+                                CandidateTable.quantize(relaxation.relaxed_ub)))
+
+        allocations = []
+        for allocation in candidate.temporal_allocations:
+            allocations.append((allocation.constraint.id,
+                                CandidateTable.quantize(allocation.allocated_lb),
+                                CandidateTable.quantize(allocation.allocated_ub)))
+
+        cc_relaxations = []
+        for relaxation in candidate.chance_constraint_relaxations:
+            cc_relaxations.append((relaxation.constraint.id,
+                                   CandidateTable.quantize(relaxation.relaxed_bound)))
+
+        key = (frozenset(candidate.assignments), frozenset(relaxations),
+               frozenset(allocations), frozenset(cc_relaxations))
+
+        return key, frozenset(assignments_to_avoid), frozenset(candidate.continuously_resolved_cycles)
+
+    @staticmethod
+    def quantize(bound):
+        if bound is None:
+            return None
+
+        return int(round(bound / CandidateTable.RESOLUTION))
@@ -0,0 +1,117 @@
+__author__ = 'yupeng'
+
+import gzip
+import os
+import pickle
+
+
+class Checkpoint(object):
+
+    # Saves the state of a search problem to disk, and restores it into
+    # a search problem built on another parse of the same tpnu.
+    # The queue, candidate table and conflict index are pickled as they are,
+    # so that candidates, conflicts and negative cycles keep sharing
+    # their sets and objects. The decision variables, assignments and
+    # constraints they refer to are saved by id, and looked up
+    # in the tpnu of the search problem on restore
+
+    VERSION = 1
+
+    @staticmethod
+    def save(search_problem, path):
+        header = {}
+        header["Version"] = Checkpoint.VERSION
+        header["Problem"] = Checkpoint.fingerprint(search_problem)
+
+        state = {}
+        state["Queue"] = search_problem.queue
+        state["CandidateTable"] = search_problem.candidate_table
+        state["ConflictIndex"] = search_problem.conflict_index
+        state["CandidatesDequeued"] = search_problem.candidates_dequeued
+        state["MinimizationChecks"] = search_problem.minimization_checks
+        state["CandidatesDropped"] = search_problem.candidates_dropped
+        state["DroppedBound"] = search_problem.dropped_bound
+
+        # write to a temporary file first, so that an interrupted
+        # save leaves the previous checkpoint intact
+        temporary_path = path + ".tmp"
+        with gzip.open(temporary_path, "wb", compresslevel=1) as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+            references = Checkpoint.references(search_problem.tpnu)
+            pickler.persistent_id = lambda obj: references.get(id(obj))
+            pickler.dump(state)
+
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load(search_problem, path):
+        # the search problem must have been initialized
+        with gzip.open(path, "rb") as f:
+            header = pickle.load(f)
+            if header["Version"] != Checkpoint.VERSION:
+                raise Exception("Unsupported checkpoint version: " + str(header["Version"]))
+
+            if header["Problem"] != Checkpoint.fingerprint(search_problem):
+                raise Exception("Checkpoint " + path + " was saved for a different problem")
+
+            unpickler = pickle.Unpickler(f)
+            objects = Checkpoint.objects(search_problem.tpnu)
+            unpickler.persistent_load = lambda key: objects[key]
+            state = unpickler.load()
+
+        search_problem.queue = state["Queue"]
+        search_problem.candidate_table = state["CandidateTable"]
+        search_problem.conflict_index = state["ConflictIndex"]
+        search_problem.candidates_dequeued = state["CandidatesDequeued"]
+        search_problem.minimization_checks = state["MinimizationChecks"]
+        search_problem.candidates_dropped = state["CandidatesDropped"]
+        search_problem.dropped_bound = state["DroppedBound"]
+
+        # the known conflicts are those still in the conflict index
+        search_problem.known_conflicts = set()
+        for conflict in search_problem.conflict_index.conflicts:
+            if conflict is not None:
+                search_problem.known_conflicts.add(conflict)
+
+    @staticmethod
+    def fingerprint(search_problem):
+        tpnu = search_problem.tpnu
+
+        variables = []
+        for variable in tpnu.decision_variables.values():
+            values = sorted(str(assignment.value) for assignment in variable.domain)
+            variables.append((str(variable.id), tuple(values)))
+
+        constraints = sorted(str(constraint_id) for constraint_id in tpnu.temporal_constraints)
+        chance_constraints = sorted(str(constraint_id) for constraint_id in tpnu.chance_constraints)
+
+        return (search_problem.feasibility_type, search_problem.objective_type,
+                search_problem.chance_constrained, tuple(sorted(variables)),
+                tuple(constraints), tuple(chance_constraints))
+
+    @staticmethod
+    def objects(tpnu):
+        # the objects of the tpnu, by the key they are saved with
+        objects = {}
+        for variable in tpnu.decision_variables.values():
+            objects[("DecisionVariable", variable.id)] = variable
+            for assignment in variable.domain:
+                objects[("Assignment", variable.id, assignment.value)] = assignment
+
+        for constraint in tpnu.temporal_constraints.values():
+            objects[("TemporalConstraint", constraint.id)] = constraint
+
+        for constraint in tpnu.chance_constraints.values():
+            objects[("ChanceConstraint", constraint.id)] = constraint
+
+        return objects
+
+    @staticmethod
+    def references(tpnu):
+        # the keys of the objects of the tpnu, by their id()
+        references = {}
+        for key, obj in Checkpoint.objects(tpnu).items():
+            references[id(obj)] = key
+
+        return references
@@ -7,6 +7,9 @@ class Conflict(object):
     def __init__(self):
         self.assignments = set()
         self.negative_cycles = set()
+        # every constraint in the expressions of the conflict,
+        # including the cycles that cannot be relaxed
+        self.constraints = set()
 
     def add_assignment(self,assignment):
         self.assignments.add(assignment)
@@ -27,6 +30,7 @@ class Conflict(object):
         for base_expression, coefficient in expression.items():
             constraint_type, edge_id = base_expression
             constraint = tpnu.temporal_constraints[edge_id]
+            self.constraints.add(constraint)
             if constraint_type == EdgeSupport.LOWER:
                 negative_cycle.add_constraint(constraint, 0, coefficient)
                 if constraint.relaxable_lb:
@@ -41,6 +45,13 @@ class Conflict(object):
         if hasRelaxable:
             self.negative_cycles.add(negative_cycle)
 
+    def add_relaxable_cycle(self,negative_cycle):
+        # a relaxable cycle of another conflict
+        self.negative_cycles.add(negative_cycle)
+        for constraint, bound in negative_cycle.constraints:
+            self.constraints.add(constraint)
+            self.add_guard_assignments(constraint.guards)
+
     def add_negative_cycles(self,cycles,tpnu):
         # print("Adding " + str(len(cycles)) + " cycles")
         for cycle in cycles:
@@ -48,6 +59,20 @@ class Conflict(object):
 
 
 
+    def is_nogood(self):
+        # a conflict without expressions, such as the nogood
+        # of a solution, which no relaxation resolves
+        return len(self.constraints) == 0
+
+    def holds_after(self, changed_constraints):
+        # whether the conflict still holds once the given constraints
+        # changed: none of them is in its expressions.
+        # Nogoods are not kept
+        if self.is_nogood():
+            return False
+
+        return self.constraints.isdisjoint(changed_constraints)
+
     def pretty_print(self):
 
         print("Conflict ASN#:"+str(len(self.assignments))+" NC#:"+str(len(self.negative_cycles)))
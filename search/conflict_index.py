@@ -0,0 +1,210 @@
+__author__ = 'yupeng'
+
+from collections import defaultdict
+
+class ConflictIndex(object):
+
+    # number of conflicts kept, beyond which
+    # the least useful ones are evicted
+    CAPACITY = 10000
+
+    # the usefulness of a conflict halves every HALF_LIFE lookups
+    # in which it does not stop a candidate
+    HALF_LIFE = 1000.0
+
+    def __init__(self):
+        # all known conflicts, in the order they were learned.
+        # Candidates keep a cursor into this list: every conflict
+        # before the cursor is known to be resolved by the candidate.
+        # Conflicts that are removed leave a None in their position,
+        # so that the cursors stay valid
+        self.conflicts = []
+        self.size = 0
+
+        # the watch lists, keyed by decision variable. Each entry is a
+        # (position, assignment) pair, meaning that the conflict at that
+        # position is resolved as soon as the variable takes any value
+        # other than the watched assignment
+        self.watchers = defaultdict(list)
+
+        # usefulness of each conflict, as a (score, lookup) pair
+        # where the score was last updated at that lookup
+        self.usefulness = {}
+
+        # counters
+        self.lookups = 0
+        self.hits = 0
+        self.subsumed = 0
+        self.evicted = 0
+
+    def __len__(self):
+        # the number of positions, including those of removed conflicts
+        return len(self.conflicts)
+
+    def add_conflict(self, conflict):
+        # add a conflict, and return the conflicts it removed from the index:
+        # those it subsumes, and those evicted to stay within the capacity
+        removed = []
+        for position in self.subsumed_by(conflict):
+            removed.append(self.remove(position))
+            self.subsumed += 1
+
+        position = len(self.conflicts)
+        self.conflicts.append(conflict)
+        self.size += 1
+        self.usefulness[position] = (1.0, self.lookups)
+
+        for assignment in conflict.assignments:
+            self.watchers[assignment.decision_variable].append((position, assignment))
+
+        if self.size > ConflictIndex.CAPACITY:
+            removed.extend(self.evict(position))
+
+        return removed
+
+    def subsumed_by(self, conflict):
+        # positions of the conflicts whose assignments are a superset of those
+        # of the given conflict, and whose constraints are a subset of its
+        # own (or that have no relaxable cycles). Any candidate stopped by
+        # one of them is also stopped by the given conflict, and relaxing
+        # the given conflict does not resolve them, so they are redundant.
+        # Conflicts without assignments are not used, as they would subsume all.
+        # Nogoods are never subsumed: the search relies on them
+        # to not return the same solution twice
+        if len(conflict.assignments) == 0:
+            return []
+
+        # the conflicts containing each assignment are found in the watch
+        # list of its variable, so only the shortest one needs to be visited
+        shortest = None
+        for assignment in conflict.assignments:
+            watchers = self.watchers.get(assignment.decision_variable, ())
+            if shortest is None or len(watchers) < len(shortest):
+                shortest = watchers
+
+        positions = []
+        for position, assignment in shortest:
+            if assignment in conflict.assignments:
+                stored = self.conflicts[position]
+                if stored.is_nogood() or not conflict.assignments <= stored.assignments:
+                    continue
+                if len(stored.negative_cycles) == 0 or stored.constraints <= conflict.constraints:
+                    positions.append(position)
+
+        return positions
+
+    def remove(self, position):
+        conflict = self.conflicts[position]
+        self.conflicts[position] = None
+        self.size -= 1
+        del self.usefulness[position]
+
+        for assignment in conflict.assignments:
+            self.watchers[assignment.decision_variable].remove((position, assignment))
+
+        return conflict
+
+    def evict(self, newest):
+        # remove the least useful conflicts, down to 90% of the capacity.
+        # The newest conflict is kept, as the candidate
+        # that revealed it has not been expanded on it yet,
+        # and so are the nogoods
+        ranked = []
+        for position in self.usefulness:
+            if position != newest and not self.conflicts[position].is_nogood():
+                ranked.append((self.score(position), position))
+        ranked.sort()
+
+        removed = []
+        for score, position in ranked[:self.size - int(0.9 * ConflictIndex.CAPACITY)]:
+            removed.append(self.remove(position))
+            self.evicted += 1
+
+        return removed
+
+    def score(self, position):
+        score, lookup = self.usefulness[position]
+        return score * 0.5 ** ((self.lookups - lookup) / ConflictIndex.HALF_LIFE)
+
+    def hit_rate(self):
+        # the fraction of lookups that stopped a candidate on a conflict
+        if self.lookups == 0:
+            return 0.0
+
+        return float(self.hits) / self.lookups
+
+    def resolved_by(self, assignments, start=0):
+        # return the positions (no earlier than start) of the conflicts
+        # that are resolved by any of the given assignments, by only
+        # visiting the watch lists of their decision variables
+        resolved = set()
+        for assignment in assignments:
+            for position, watched_assignment in self.watchers.get(assignment.decision_variable, ()):
+                if position >= start and watched_assignment is not assignment:
+                    resolved.add(position)
+
+        return resolved
+
+    @staticmethod
+    def resolves(candidate, conflict):
+        # a candidate resolves a conflict if it has been resolved explicitly,
+        # or if the candidate assigns a different value to one of its variables
+        if conflict in candidate.resolved_conflicts:
+            return True
+
+        for conflict_assignment in conflict.assignments:
+            if conflict_assignment.decision_variable in candidate.assigned_variables:
+                if conflict_assignment not in candidate.assignments:
+                    return True
+
+        return False
+
+    def first_unresolved(self, candidate):
+        # find the first conflict that is not resolved by the candidate.
+        self.lookups += 1
+
+        # The conflicts between the cursor and the horizon have already been
+        # checked against the parent of this candidate, and were unresolved.
+        # Only the assignments newly added to the candidate, or an explicit
+        # resolution, can resolve them now.
+        position = candidate.conflict_cursor
+        horizon = min(candidate.conflict_horizon, len(self.conflicts))
+
+        if position < horizon:
+            resolved_by_new_assignments = self.resolved_by(candidate.new_assignments, position)
+
+            while position < horizon:
+                conflict = self.conflicts[position]
+                if conflict is None:
+                    position += 1
+                elif position in resolved_by_new_assignments or conflict in candidate.resolved_conflicts:
+                    candidate.resolved_conflicts.add(conflict)
+                    position += 1
+                else:
+                    break
+
+        # Conflicts beyond the horizon were learned after the parent was
+        # checked, so they need to be checked in full
+        if position >= horizon:
+            while position < len(self.conflicts):
+                conflict = self.conflicts[position]
+                if conflict is None:
+                    position += 1
+                elif ConflictIndex.resolves(candidate, conflict):
+                    candidate.resolved_conflicts.add(conflict)
+                    position += 1
+                else:
+                    break
+
+        # resolutions are monotonic along a branch of the search tree,
+        # so the children of this candidate can start from here
+        candidate.conflict_cursor = position
+
+        if position < len(self.conflicts):
+            candidate.conflict_horizon = position + 1
+            self.hits += 1
+            self.usefulness[position] = (self.score(position) + 1, self.lookups)
+            return self.conflicts[position]
+        else:
+            candidate.conflict_horizon = position
+            return None
@@ -0,0 +1,87 @@
+__author__ = 'yupeng'
+
+import heapq
+
+
+class MemoryBound(object):
+    # how the search keeps its frontier within SearchProblem.frontier_limit
+    OFF = 1
+    # drop the worst candidates, backing up their utility into their
+    # parents, which are queued again once all their children are
+    # dropped (SMA*). The search stays complete and optimal
+    SMA = 2
+    # drop the worst candidates for good (beam search)
+    BEAM = 3
+
+
+class Frontier(object):
+
+    # best-first queue of candidates, backed by a plain heap.
+    # It offers the same put/get/empty/qsize interface as
+    # queue.PriorityQueue, without the locks and condition
+    # variables, which the single threaded search does not need
+
+    def __init__(self):
+        self.heap = []
+
+    def put(self, candidate):
+        heapq.heappush(self.heap, candidate)
+
+    def get(self):
+        return heapq.heappop(self.heap)
+
+    def peek(self):
+        return self.heap[0]
+
+    def empty(self):
+        return len(self.heap) == 0
+
+    def qsize(self):
+        return len(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def best(self, count):
+        # the count best candidates, in order, without removing them.
+        # The heap is walked from its root, keeping the nodes
+        # that can come next in a second, small heap
+        best = []
+        walk = []
+        if len(self.heap) > 0:
+            walk.append((self.heap[0], 0))
+
+        while len(walk) > 0 and len(best) < count:
+            candidate, position = heapq.heappop(walk)
+            best.append(candidate)
+
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(self.heap):
+                    heapq.heappush(walk, (self.heap[child], child))
+
+        return best
+
+    def reorder(self):
+        # restore the heap after the utility of queued candidates changed
+        heapq.heapify(self.heap)
+
+    def trim(self, size, droppable=None):
+        # drop the worst candidates, among those for which droppable
+        # is true if given, until at most size are left, and return them.
+        # The best candidate is never dropped.
+        # A sorted list is also a valid heap
+        if len(self.heap) <= size:
+            return []
+
+        self.heap.sort()
+        excess = len(self.heap) - size
+        dropped = []
+        for position in range(len(self.heap) - 1, 0, -1):
+            if len(dropped) == excess:
+                break
+            if droppable is None or droppable(self.heap[position]):
+                dropped.append(self.heap[position])
+                self.heap[position] = None
+
+        self.heap = [candidate for candidate in self.heap if candidate is not None]
+        return dropped
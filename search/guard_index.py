@@ -0,0 +1,47 @@
+__author__ = 'yupeng'
+
+
+class GuardIndex(object):
+
+    def __init__(self, tpnu):
+        # reverse index from each assignment to the
+        # decision variables and temporal constraints it guards
+        self.guarded_variables = {}
+        self.guarded_constraints = {}
+
+        for variable in tpnu.decision_variables.values():
+            for guard in variable.guards:
+                self.guarded_variables.setdefault(guard,[]).append(variable)
+
+        for constraint in tpnu.temporal_constraints.values():
+            for guard in constraint.guards:
+                self.guarded_constraints.setdefault(guard,[]).append(constraint)
+
+    def enabled_variables(self, candidate, new_assignments):
+        # find the decision variables that become available for assignment
+        # after new_assignments were added to the candidate.
+        # Only the variables guarded by the new assignments are visited,
+        # and each one is enabled once none of its guards remain unsatisfied
+        enabled = []
+        visited = set()
+
+        for assignment in new_assignments:
+            for variable in self.guarded_variables.get(assignment,()):
+                if variable not in visited:
+                    visited.add(variable)
+                    if variable not in candidate.assigned_variables:
+                        if self.remaining_guards(candidate, variable) == 0:
+                            enabled.append(variable)
+
+        return enabled
+
+    @staticmethod
+    def remaining_guards(candidate, guarded):
+        # number of guards of a variable or constraint
+        # that are not yet assigned in the candidate
+        remaining = 0
+        for guard in guarded.guards:
+            if guard not in candidate.assignments:
+                remaining += 1
+
+        return remaining
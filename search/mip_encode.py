@@ -4,6 +4,8 @@ from search.candidate import Candidate
 from search.temporal_relaxation import TemporalRelaxation
 from temporal_network.temporal_constraint import TemporalConstraint
 from temporal_network.tpnu import ObjectiveType
+from graph_theory import floyd_warshall, johnson
+import numpy as np
 
 try:
     from gurobipy import *
@@ -11,7 +13,23 @@ except ImportError:
     raise Exception(
         "Missing Gurobi subsolver on this system for MIP encoding. Check if you have it installed correctly.")
 
+class DistanceBounds(object):
+    # (node_a, node_b) -> (lower bound, upper bound) on the distance
+    # from node_a to node_b, from the arrays of MipEncode.calc_distance
+
+    def __init__(self, lower, upper):
+        self.lower = lower
+        self.upper = upper
+
+    def __getitem__(self, pair):
+        node_a, node_b = pair
+        return (float(self.lower[node_a - 1, node_b - 1]), float(self.upper[node_a - 1, node_b - 1]))
+
 class MipEncode(object):
+
+    # Johnson's algorithm is used when there are fewer constraints
+    # than the number of pairs of nodes divided by this
+    SPARSE_RATIO = 32
     
     def __init__(self, tpnu, obj_type):
         self.network = tpnu
@@ -111,14 +129,18 @@ class MipEncode(object):
 
         
     def calc_distance(self):
-        self.dis = {}
-        # for RCPSP Problem, the number of nodes are limited        
-        for node_a in range(1, self.num_nodes + 1):
-            for node_b in range(node_a + 1, self.num_nodes + 1):
-                if (node_a, node_b) not in self.dis:
-                    self.dis[(node_a, node_b)] = self.dis[(node_b, node_a)] = (-self.DEFAULT, self.DEFAULT)
-                    
-        #return 
+        # bounds on the distance from each node to each other: node n is
+        # row and column n - 1 of self.dis_lb and self.dis_ub
+        lower = np.full((self.num_nodes, self.num_nodes), -self.DEFAULT, dtype=np.float64)
+        upper = np.full((self.num_nodes, self.num_nodes), self.DEFAULT, dtype=np.float64)
+        # the pairs of nodes a constraint sets the bounds of
+        edges = np.zeros((self.num_nodes, self.num_nodes), dtype=bool)
+
+        def set_bounds(fro, to, lb, ub):
+            lower[fro - 1, to - 1] = lb
+            upper[fro - 1, to - 1] = ub
+            edges[fro - 1, to - 1] = True
+
         for e in self.network.temporal_constraints.values():
             if e.controllable:
                 tmp_lb = -self.DEFAULT
@@ -128,8 +150,8 @@ class MipEncode(object):
                 if tmp_ub > e.get_upper_bound():
                     tmp_ub = e.get_upper_bound()
                 if self.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
-                    self.dis[(e.fro, e.to)] = (tmp_lb, tmp_ub)
-                    self.dis[(e.to, e.fro)] = (-tmp_ub, -tmp_lb)
+                    set_bounds(e.fro, e.to, tmp_lb, tmp_ub)
+                    set_bounds(e.to, e.fro, -tmp_ub, -tmp_lb)
                 else:
                     if e.relaxable_lb:
                         if tmp_lb > 0:
@@ -138,33 +160,30 @@ class MipEncode(object):
                             tmp_lb = -self.DEFAULT
                     if e.relaxable_ub:
                         tmp_ub = self.DEFAULT
-                    self.dis[(e.fro, e.to)] = (tmp_lb, tmp_ub)
-                    self.dis[(e.to, e.fro)] = (-tmp_ub, -tmp_lb)
+                    set_bounds(e.fro, e.to, tmp_lb, tmp_ub)
+                    set_bounds(e.to, e.fro, -tmp_ub, -tmp_lb)
             else:
                 if self.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
-                    self.dis[(e.fro, e.to)] = (e.get_lower_bound(), self.DEFAULT)
+                    set_bounds(e.fro, e.to, e.get_lower_bound(), self.DEFAULT)
                 else:
-                  #  continue
-                    self.dis[(e.fro, e.to)] = (e.get_lower_bound(), e.get_upper_bound())
-                    #self.dis[(e.to, e.fro)] = (-e.get_upper_bound(), -e.get_lower_bound())
-        
-      
-        #return  
-        for node_k in range(1, self.num_nodes + 1):
-            for node_i in range(1, self.num_nodes + 1):
-                for node_j in range(1, self.num_nodes + 1):
-                    if node_i != node_j and node_i != node_k and node_j != node_k:
-                        #print(self.dis[(node_i, node_k)] )
-                       # print(self.dis[(node_k, node_j)])
-                        new_lb = self.dis[(node_i, node_k)][0] + self.dis[(node_k, node_j)][0]
-                        new_ub = self.dis[(node_i, node_k)][1] + self.dis[(node_k, node_j)][1]
-                        if new_lb < self.dis[(node_i, node_j)][0]:
-                            new_lb = self.dis[(node_i, node_j)][0]
-                        if new_ub > self.dis[(node_i, node_j)][1]:
-                            new_ub = self.dis[(node_i, node_j)][1]
-                        self.dis[(node_i, node_j)] = (new_lb, new_ub)
-                    
-        
+                    set_bounds(e.fro, e.to, e.get_lower_bound(), e.get_upper_bound())
+                    #set_bounds(e.to, e.fro, -e.get_upper_bound(), -e.get_lower_bound())
+
+        # upper bounds are tightened along the shortest paths, and lower
+        # bounds along the longest ones: the shortest paths of their opposites
+        self.dis_ub = self.all_pairs(upper, edges)
+        self.dis_lb = -self.all_pairs(-lower, edges)
+        self.dis = DistanceBounds(self.dis_lb, self.dis_ub)
+
+    def all_pairs(self, weights, edges):
+        # Johnson's algorithm for sparse networks, when it gives
+        # the distances of Floyd-Warshall over all the pairs
+        if np.count_nonzero(edges) * self.SPARSE_RATIO < weights.size:
+            distance = johnson(weights, edges, self.DEFAULT)
+            if distance is not None:
+                return distance
+        return floyd_warshall(weights)
+
     def next_solution(self):
         return self.mip_solver()
         
@@ -0,0 +1,63 @@
+__author__ = 'yupeng'
+
+
+# Edits of the tpnu of a search problem, applied by SearchProblem.resolve.
+# apply() changes the tpnu and returns the temporal constraints
+# whose change may invalidate the conflicts that involve them
+
+
+class BoundEdit(object):
+
+    # change the bounds of a temporal constraint.
+    # A bound left as None is kept
+
+    def __init__(self, constraint_id, lower_bound=None, upper_bound=None):
+        self.constraint_id = constraint_id
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+
+    def apply(self, tpnu):
+        if self.constraint_id not in tpnu.temporal_constraints:
+            raise Exception("Unknown temporal constraint: " + str(self.constraint_id))
+
+        constraint = tpnu.temporal_constraints[self.constraint_id]
+        if self.lower_bound is not None:
+            constraint.lower_bound = self.lower_bound
+        if self.upper_bound is not None:
+            constraint.upper_bound = self.upper_bound
+
+        return [constraint]
+
+
+class ConstraintAddition(object):
+
+    # add a temporal constraint between two existing events.
+    # More constraints cannot resolve a conflict, so none is invalidated
+
+    def __init__(self, constraint):
+        self.constraint = constraint
+
+    def apply(self, tpnu):
+        if self.constraint.id in tpnu.temporal_constraints:
+            raise Exception("Duplicate temporal constraint: " + str(self.constraint.id))
+
+        for node in (self.constraint.fro, self.constraint.to):
+            if node < 1 or node > tpnu.num_nodes:
+                raise Exception("Unknown event " + str(node) + " in temporal constraint " + str(self.constraint.id))
+
+        tpnu.add_temporal_constraint(self.constraint)
+        return []
+
+
+class ConstraintRemoval(object):
+
+    # remove a temporal constraint
+
+    def __init__(self, constraint_id):
+        self.constraint_id = constraint_id
+
+    def apply(self, tpnu):
+        if self.constraint_id not in tpnu.temporal_constraints:
+            raise Exception("Unknown temporal constraint: " + str(self.constraint_id))
+
+        return [tpnu.temporal_constraints.pop(self.constraint_id)]
@@ -0,0 +1,117 @@
+__author__ = 'yupeng'
+
+from concurrent.futures import ProcessPoolExecutor
+
+# each worker process keeps its own copy of the tpnu,
+# received once when the process starts
+worker_tpnu = None
+worker_feasibility_type = None
+
+
+def initialize_worker(tpnu, f_type):
+    global worker_tpnu, worker_feasibility_type
+    worker_tpnu = tpnu
+    worker_feasibility_type = f_type
+
+
+def check_in_worker(constraint_states):
+    # bring the copy of the tpnu to the state of the candidate
+    # and run the same check as the search process would
+    from search.search_problem import SearchProblem
+
+    for id, activated, relaxed_lb, relaxed_ub in constraint_states:
+        constraint = worker_tpnu.temporal_constraints[id]
+        constraint.activated = activated
+        constraint.relaxed_lb = relaxed_lb
+        constraint.relaxed_ub = relaxed_ub
+
+    conflict = SearchProblem.check_feasibility(worker_tpnu, worker_feasibility_type)
+
+    # the checkers build their expressions as defaultdicts,
+    # which cannot be sent back to the search process
+    if conflict is not None:
+        conflict = [dict(expression) for expression in conflict]
+
+    return conflict
+
+
+class ParallelChecker(object):
+
+    # Speculative consistency checking.
+    # While the search checks the candidate it dequeued,
+    # the next best complete candidates in the queue are checked
+    # in a pool of processes. Their results are only kept until
+    # the search reaches these candidates in its usual order,
+    # so that it learns the same conflicts, in the same order,
+    # and returns the same solution as without speculation
+
+    def __init__(self, search_problem, workers):
+        self.search_problem = search_problem
+        self.workers = workers
+        self.pool = None
+
+        # candidate -> future of the raw conflict returned by the checker
+        self.pending = {}
+
+    def speculate(self, current, candidates):
+        # submit the given candidates, dropping the checks that have not
+        # finished for those no longer among them, except the current one
+        for candidate in list(self.pending.keys()):
+            if candidate is current or candidate in candidates:
+                continue
+            if not self.pending[candidate].done():
+                self.pending.pop(candidate).cancel()
+
+        for candidate in candidates:
+            if candidate not in self.pending:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                    initializer=initialize_worker,
+                                                    initargs=(self.search_problem.tpnu, self.search_problem.feasibility_type))
+
+                self.pending[candidate] = self.pool.submit(check_in_worker, self.constraint_states(candidate))
+
+    def constraint_states(self, candidate):
+        # the part of the tpnu that depends on the candidate
+        self.search_problem.implement(candidate)
+
+        states = []
+        for constraint in self.search_problem.tpnu.temporal_constraints.values():
+            states.append((constraint.id, constraint.activated, constraint.relaxed_lb, constraint.relaxed_ub))
+
+        return states
+
+    def has_result(self, candidate):
+        return candidate in self.pending
+
+    def result(self, candidate):
+        # wait for the check of a submitted candidate
+        return self.pending.pop(candidate).result()
+
+    def feasible_candidates(self):
+        # the candidates whose check has finished without a conflict
+        feasible = []
+        for candidate, future in self.pending.items():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                if future.result() is None:
+                    feasible.append(candidate)
+
+        return feasible
+
+    def discard(self, candidate):
+        # the candidate was expanded instead of checked,
+        # so its result will never be used
+        if candidate in self.pending:
+            self.pending.pop(candidate).cancel()
+
+    def shutdown(self):
+        # drop the checks not started yet, and wait for the workers
+        # to finish those they are running and exit.
+        # A later speculation starts a new pool
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,95 @@
+__author__ = 'yupeng'
+
+from itertools import chain
+
+class PersistentSet(object):
+
+    __slots__ = ('base', 'layers', 'own', 'size')
+
+    # number of frozen layers a set can accumulate
+    # before they are merged into a single shared base
+    MAX_LAYERS = 8
+
+    def __init__(self, elements=()):
+        # The content of the set is the union of a shared frozen base,
+        # a tuple of frozen layers shared with the set it was branched from,
+        # and its own layer, which is the only one ever modified
+        self.base = frozenset()
+        self.layers = ()
+        self.own = set(elements)
+        self.size = len(self.own)
+
+    def branch(self):
+        # create a child set that shares all current elements
+        # with this one, without copying them.
+
+        # our own layer becomes frozen, since the child now refers to it,
+        # and any further element added here goes into a new layer
+        if len(self.own) > 0:
+            self.layers = self.layers + (self.own,)
+            self.own = set()
+
+            if len(self.layers) > PersistentSet.MAX_LAYERS:
+                self.base = self.base.union(*self.layers)
+                self.layers = ()
+
+        child = PersistentSet()
+        child.base = self.base
+        child.layers = self.layers
+        child.size = self.size
+        return child
+
+    def copy(self):
+        return self.branch()
+
+    def add(self, element):
+        if element not in self:
+            self.own.add(element)
+            self.size += 1
+
+    def update(self, elements):
+        for element in elements:
+            self.add(element)
+
+    def unshared(self, other):
+        # iterate over the elements of this set that may not be in the other,
+        # skipping the base and layers the two sets share
+        if not isinstance(other, PersistentSet):
+            return iter(self)
+
+        shared_layers = set(id(layer) for layer in other.layers)
+        layers = [layer for layer in self.layers if id(layer) not in shared_layers]
+        if other.base is not self.base:
+            layers.insert(0, self.base)
+        layers.append(self.own)
+
+        return chain.from_iterable(layers)
+
+    def __contains__(self, element):
+        if element in self.own or element in self.base:
+            return True
+
+        for layer in self.layers:
+            if element in layer:
+                return True
+
+        return False
+
+    def __iter__(self):
+        return chain(self.base, chain.from_iterable(self.layers), self.own)
+
+    def __len__(self):
+        return self.size
+
+    def __le__(self, other):
+        for element in self:
+            if element not in other:
+                return False
+        return True
+
+    def __ge__(self, other):
+        # also used for `some_set <= persistent_set`
+        for element in other:
+            if element not in self:
+                return False
+        return True
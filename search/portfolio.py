@@ -0,0 +1,231 @@
+__author__ = 'yupeng'
+
+from multiprocessing import Process, Queue
+from queue import Empty
+from time import perf_counter
+import os
+import signal
+from search.search_problem import SearchProblem
+from temporal_network.tpnu import FeasibilityType, ObjectiveType, ChanceConstrained
+
+
+class SolverType(object):
+    CDRU = 1
+    MIP = 2
+
+
+class SolverConfiguration(object):
+
+    # one solver of a portfolio. Options are passed to the SearchProblem
+    # constructor of CDRU (parallel_checks, conflict_checks, memory_bound...)
+
+    def __init__(self, solver, f_type=FeasibilityType.DYNAMIC_CONTROLLABILITY,
+                 o_type=ObjectiveType.MIN_COST, c_type=ChanceConstrained.OFF, options=None, name=None):
+        self.solver = solver
+        self.feasibility_type = f_type
+        self.objective_type = o_type
+        self.chance_constrained = c_type
+        self.options = {} if options is None else options
+
+        if name is None:
+            if solver == SolverType.CDRU:
+                name = "CDRU:" + SearchProblem.checker_name(f_type)
+                for option in sorted(self.options):
+                    name += ":" + option + "=" + str(self.options[option])
+            elif solver == SolverType.MIP:
+                name = "MIP"
+            else:
+                raise Exception('Unknown solver type')
+        self.name = name
+
+    @staticmethod
+    def from_names(solver="CDRU", feasibility="DYNAMIC_CONTROLLABILITY", objective="MIN_COST",
+                   chance_constrained="OFF", options=None, name=None):
+        # a configuration given by the names of its types,
+        # as in the requests of the solve server
+        return SolverConfiguration(SolverConfiguration.constant(SolverType, solver),
+                                   SolverConfiguration.constant(FeasibilityType, feasibility),
+                                   SolverConfiguration.constant(ObjectiveType, objective),
+                                   SolverConfiguration.constant(ChanceConstrained, chance_constrained),
+                                   options, name)
+
+    @staticmethod
+    def constant(constants, name):
+        if name.startswith("_") or not hasattr(constants, name):
+            raise Exception("Unknown " + constants.__name__ + ": " + name)
+        return getattr(constants, name)
+
+
+def solve_configuration(tpnu, configuration, time_limit=None):
+    # solve the tpnu with one configuration, and return its status
+    # and the json description of the solution (None if there is none)
+    started = perf_counter()
+    description = None
+    if configuration.solver == SolverType.CDRU:
+        search_problem = SearchProblem(tpnu,configuration.feasibility_type,configuration.objective_type,
+                                       configuration.chance_constrained,**configuration.options)
+        search_problem.initialize()
+        solution = search_problem.next_solution(time_limit=time_limit)
+        statistics = search_problem.search_statistics()
+
+        if solution is not None:
+            description = solution.json_description(tpnu.name,configuration.name,perf_counter() - started,
+                                                    search_problem.candidates_dequeued)
+            if configuration.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
+                description["Utility"] = solution.utility
+            # beam search may have dropped better candidates
+            status = "Optimal" if statistics["Gap"] == 0 else "Feasible"
+        elif statistics["BudgetExhausted"]:
+            status = "TimedOut"
+        elif search_problem.candidates_dropped == 0:
+            status = "Infeasible"
+        else:
+            # the queue ran out after dropping candidates,
+            # which does not prove that there is no solution
+            status = "Unknown"
+
+    elif configuration.solver == SolverType.MIP:
+        # Gurobi is only needed by the portfolios that use it
+        from search.mip_encode import MipEncode
+
+        solution = MipEncode(tpnu,configuration.objective_type).mip_solver()
+        # the encoding only returns a solution once proven optimal
+        if solution.utility != -1:
+            description = solution.json_description(tpnu.name,configuration.name,perf_counter() - started,0)
+            description["Utility"] = solution.utility
+            status = "Optimal"
+        else:
+            status = "NoSolution"
+
+    else:
+        raise Exception('Unknown solver type')
+
+    return status, description
+
+
+def run_solver(tpnu, configuration, index, results, time_limit):
+    # solve in a worker process, and report the outcome to the portfolio.
+    # The process leads its own process group, so that the processes
+    # it starts (such as the pool of a parallel checker)
+    # are terminated along with it
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    started = perf_counter()
+    try:
+        status, description = solve_configuration(tpnu, configuration, time_limit)
+    except Exception as e:
+        status = "Error: " + str(e)
+        description = None
+
+    results.put((index, status, description, perf_counter() - started))
+
+
+def terminate(process):
+    # terminate a solver process started by run_solver,
+    # along with the processes it started
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, OSError):
+        # no process groups on this system,
+        # or the solver has not created its own yet
+        process.terminate()
+
+
+class Portfolio(object):
+
+    # Runs several solvers on the same tpnu, each in its own process,
+    # and returns the first proven answer: an optimal solution,
+    # or the proof that there is none. The other solvers are then terminated
+
+    # seconds given to a solver past the time limit before it is terminated
+    GRACE_PERIOD = 10
+
+    # seconds between two checks that the solvers are still alive
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, tpnu, configurations):
+        self.tpnu = tpnu
+        self.configurations = configurations
+
+    def solve(self, time_limit=None):
+        started = perf_counter()
+        results = Queue()
+        processes = []
+        for index in range(len(self.configurations)):
+            process = Process(target=run_solver, name=self.configurations[index].name,
+                              args=(self.tpnu,self.configurations[index],index,results,time_limit,))
+            process.start()
+            processes.append(process)
+
+        # solver index -> (status, description, seconds)
+        outcomes = {}
+        winner = None
+        while len(outcomes) < len(processes):
+            timeout = Portfolio.POLL_INTERVAL
+            if time_limit is not None:
+                remaining = time_limit + Portfolio.GRACE_PERIOD - (perf_counter() - started)
+                timeout = max(0, min(timeout, remaining))
+
+            # the solvers that exited before this poll have
+            # already written their outcome, if they reported one
+            exited = [index for index in range(len(processes))
+                      if index not in outcomes and processes[index].exitcode is not None]
+            try:
+                index, status, description, seconds = results.get(timeout=timeout)
+            except Empty:
+                if time_limit is not None and remaining <= 0:
+                    break
+
+                # a solver that died without reporting
+                # (killed by the system for instance) has failed
+                for index in exited:
+                    outcomes[index] = ("Error: exit code " + str(processes[index].exitcode), None,
+                                       perf_counter() - started)
+                continue
+
+            outcomes[index] = (status, description, seconds)
+            if status == "Optimal" or status == "Infeasible":
+                winner = index
+                break
+
+        # cancel the solvers still running
+        for index in range(len(processes)):
+            process = processes[index]
+            if process.is_alive():
+                terminate(process)
+            process.join()
+
+            if index not in outcomes:
+                outcomes[index] = ("Cancelled", None, perf_counter() - started)
+
+        return self.json_description(winner, outcomes, perf_counter() - started)
+
+    def json_description(self, winner, outcomes, runtime):
+        result = {}
+        result["TestName"] = self.tpnu.name
+        result["Runtime"] = runtime
+
+        if winner is not None:
+            status, description, seconds = outcomes[winner]
+            result["Solver"] = self.configurations[winner].name
+            result["Status"] = status
+            result["Solution"] = description
+        else:
+            result["Solver"] = None
+            result["Status"] = "Unknown"
+            result["Solution"] = None
+
+        solversObj = []
+        for index in range(len(self.configurations)):
+            status, description, seconds = outcomes[index]
+            solverObj = {}
+            solverObj["Solver"] = self.configurations[index].name
+            solverObj["Status"] = status
+            solverObj["Seconds"] = seconds
+            if description is not None:
+                solverObj["Utility"] = description["Utility"]
+            solversObj.append(solverObj)
+        result["Solvers"] = solversObj
+
+        return result
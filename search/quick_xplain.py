@@ -0,0 +1,158 @@
+__author__ = 'yupeng'
+
+from controllability.strong_controllability import Vidal99Reduction
+from controllability.temporal_consistency import NrgativeCycleDetection
+from search.conflict import Conflict
+from temporal_network.tpnu import FeasibilityType
+
+
+class QuickXplain(object):
+
+    # Shrinks a conflict to a minimal set of assignments, then to a minimal
+    # set of its negative cycles, using re-checks of sub-networks
+    # (Junker's QuickXplain).
+    # The sub-network of a set of assignments keeps the unconditional
+    # constraints of the tpnu, and the conditional ones whose guards
+    # are all in the set. The negative cycles of the minimized conflict
+    # are extracted from the sub-network of its assignments, so they
+    # only involve these constraints. The sub-network of a set of
+    # cycles only keeps the constraints of these cycles
+
+    def __init__(self, tpnu, f_type, budget):
+        self.tpnu = tpnu
+        self.feasibility_type = f_type
+        # the maximum number of checks, including the final ones
+        # that extract the negative cycles of each minimized conflict
+        self.budget = budget
+        self.checks = 0
+
+    def minimize(self, conflict):
+        # the tpnu must have the candidate that produced the conflict
+        # implemented, and its activated constraints are restored afterwards
+        if self.budget < 2:
+            return conflict
+
+        activated = {}
+        for constraint in self.tpnu.temporal_constraints.values():
+            activated[constraint] = constraint.activated
+
+        cycles = None
+        try:
+            elements = sorted(conflict.assignments, key=lambda assignment: str(assignment.decision_variable.id))
+            minimal = elements
+            if len(elements) > 0:
+                minimal = self.explain(set(), elements, elements, self.check)
+            if len(minimal) < len(elements):
+                cycles = self.check(set(minimal))
+        finally:
+            for constraint, was_activated in activated.items():
+                constraint.activated = was_activated
+
+        if cycles is not None:
+            minimized = Conflict()
+            minimized.add_negative_cycles(cycles, self.tpnu)
+            conflict = minimized
+
+        return self.minimize_cycles(conflict)
+
+    def minimize_cycles(self, conflict):
+        # keep a minimal set of the negative cycles of the conflict, whose
+        # constraints are inconsistent on their own. A candidate only
+        # needs to relax one cycle of a conflict to resolve it, so each
+        # cycle dropped is a child less when expanding on the conflict.
+        # Conflicts with cycles that cannot be relaxed are kept whole,
+        # as relaxing the others does not resolve them.
+        # So are those of dynamic controllability: its reductions depend on
+        # the bounds, so relaxing one cycle may remove another
+        if self.feasibility_type == FeasibilityType.DYNAMIC_CONTROLLABILITY:
+            return conflict
+        if len(conflict.negative_cycles) < 2 or self.budget - self.checks < 2:
+            return conflict
+
+        relaxable_constraints = set()
+        for negative_cycle in conflict.negative_cycles:
+            for constraint, bound in negative_cycle.constraints:
+                relaxable_constraints.add(constraint)
+        if relaxable_constraints != conflict.constraints:
+            return conflict
+
+        activated = {}
+        for constraint in self.tpnu.temporal_constraints.values():
+            activated[constraint] = constraint.activated
+
+        # the shortest cycles first, as they are kept when they suffice
+        elements = sorted(conflict.negative_cycles, key=lambda negative_cycle: len(negative_cycle.constraints))
+        try:
+            minimal = self.explain(set(), elements, elements, self.check_cycles)
+            # the cycles left are not enough,
+            # or the network is inconsistent without any of them
+            if len(minimal) == 0 or (len(minimal) < len(elements) and self.check_cycles(set(minimal)) is None):
+                minimal = elements
+        finally:
+            for constraint, was_activated in activated.items():
+                constraint.activated = was_activated
+
+        if len(minimal) == len(elements):
+            return conflict
+
+        minimized = Conflict()
+        for negative_cycle in minimal:
+            minimized.add_relaxable_cycle(negative_cycle)
+        return minimized
+
+    def explain(self, background, delta, elements, check):
+        # return a subset of elements that makes the sub-network inconsistent
+        # together with the background. Elements are kept
+        # as they are once the budget is used up
+        if len(delta) > 0 and self.inconsistent(background, check):
+            return []
+
+        if len(elements) == 1 or self.exhausted():
+            return elements
+
+        half = len(elements) // 2
+        first = elements[:half]
+        second = elements[half:]
+
+        delta_second = self.explain(background.union(first), first, second, check)
+        delta_first = self.explain(background.union(delta_second), delta_second, first, check)
+
+        return delta_first + delta_second
+
+    def exhausted(self):
+        # one check is kept to extract the negative cycles
+        return self.checks >= self.budget - 1
+
+    def inconsistent(self, elements, check):
+        if self.exhausted():
+            return False
+
+        return check(elements) is not None
+
+    def check(self, assignments):
+        from search.search_problem import SearchProblem
+
+        for constraint in self.tpnu.temporal_constraints.values():
+            if len(constraint.guards) > 0:
+                constraint.activated = constraint.guards <= assignments
+
+        self.checks += 1
+        return SearchProblem.check_feasibility(self.tpnu, self.feasibility_type)
+
+    def check_cycles(self, negative_cycles):
+        # the sub-network of only the constraints of the given cycles.
+        # The checkers are run without initializing the tpnu,
+        # which would activate all the unconditional constraints again
+        constraints = set()
+        for negative_cycle in negative_cycles:
+            for constraint, bound in negative_cycle.constraints:
+                constraints.add(constraint)
+
+        for constraint in self.tpnu.temporal_constraints.values():
+            constraint.activated = constraint in constraints
+
+        self.checks += 1
+        if self.feasibility_type == FeasibilityType.CONSISTENCY:
+            return NrgativeCycleDetection().check(self.tpnu)
+        else:
+            return Vidal99Reduction().check(self.tpnu)
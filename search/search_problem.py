@@ -1,12 +1,24 @@
 __author__ = 'yupeng'
 
 from controllability.strong_controllability import StrongControllability
-from controllability.temporal_consistency import TemporalConsistency
+from controllability.temporal_consistency import TemporalConsistency, IncrementalConsistency
+from controllability.morris_n3_dc import IncrementalMorrisN3Dc
 
-from queue import PriorityQueue
+import heapq
+from time import perf_counter
+from datetime import datetime
 from search.candidate import Candidate
+from search.candidate_table import CandidateTable
+from search.checkpoint import Checkpoint
+from search.frontier import Frontier, MemoryBound
 from controllability.dynamic_controllability import DynamicControllability
 from search.conflict import Conflict
+from search.conflict_index import ConflictIndex
+from search.guard_index import GuardIndex
+from search.parallel_checker import ParallelChecker
+from search.persistent_set import PersistentSet
+from search.quick_xplain import QuickXplain
+from search.search_statistics import SearchStatistics
 from search.maxflex_relaxation import MaxFlexRelaxation
 from search.mincost_relaxation import MinCostRelaxation
 from temporal_network.tpnu import FeasibilityType, ObjectiveType, ChanceConstrained
@@ -14,15 +26,77 @@ from temporal_network.tpnu import FeasibilityType, ObjectiveType, ChanceConstrai
 
 class SearchProblem(object):
 
-    def __init__(self, tpnu, f_type, o_type, c_type):
+    # number of complete candidates in the queue checked
+    # for a feasible one when the budget of a search runs out
+    INCUMBENT_CHECKS = 4
+
+    def __init__(self, tpnu, f_type, o_type, c_type, parallel_checks=0, conflict_checks=0,
+                 memory_bound=MemoryBound.OFF, frontier_limit=100000,
+                 checkpoint_path=None, checkpoint_interval=600):
         self.tpnu = tpnu
-        self.queue = PriorityQueue()
+        self.queue = Frontier()
+        self.candidate_table = CandidateTable()
         self.known_conflicts = set()
+        self.conflict_index = ConflictIndex()
+
+        # the assignments, relaxations and allocations
+        # currently implemented in the tpnu
+        self.implemented_candidate = None
+        self.implemented_assignments = PersistentSet()
+        self.implemented_relaxations = PersistentSet()
+        self.implemented_allocations = set()
+        self.guard_index = GuardIndex(tpnu)
+        self.satisfied_guards = {}
+
         self.feasibility_type = f_type
         self.objective_type = o_type
         self.chance_constrained = c_type
 
         self.candidates_dequeued = 0;
+        self.statistics = SearchStatistics()
+        self.consistency_checker = None
+
+        # budget use and outcome of the last call to next_solution
+        self.expansions = 0
+        self.runtime = 0
+        self.budget_exhausted = False
+        self.upper_bound = None
+        self.best_utility = None
+
+        # the best feasible candidate found before the search reached it,
+        # returned if the budget runs out before a better one is found
+        self.incumbent = None
+
+        # number of worker processes that check the next best
+        # complete candidates while the search checks the current one.
+        # 0 keeps all checks in this process
+        self.parallel_checks = parallel_checks
+        self.parallel_checker = None
+        if self.parallel_checks > 0:
+            self.parallel_checker = ParallelChecker(self,self.parallel_checks)
+
+        # maximum number of sub-network checks spent on shrinking
+        # each new conflict. 0 keeps conflicts as extracted
+        self.conflict_checks = conflict_checks
+        self.minimization_checks = 0
+
+        # keep at most frontier_limit candidates in the queue,
+        # dropping the worst ones as set by memory_bound.
+        # Beam search loses the dropped candidates, so the best utility
+        # among them still bounds that of the solutions
+        self.memory_bound = memory_bound
+        self.frontier_limit = frontier_limit
+        self.candidates_dropped = 0
+        self.dropped_bound = None
+
+        # number of conflicts carried over by the last call to resolve
+        self.conflicts_reused = 0
+
+        # save the search state to checkpoint_path every
+        # checkpoint_interval seconds, so that it can be resumed
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint = datetime.now()
 
         if self.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
             # Preprocess the uncontrollable durations in the tpnu
@@ -50,16 +124,52 @@ class SearchProblem(object):
 
     def initialize(self):
         # clear the search state
-        self.queue = PriorityQueue()
+        self.queue = Frontier()
+        self.candidate_table = CandidateTable()
         self.known_conflicts = set()
+        self.conflict_index = ConflictIndex()
+        self.incumbent = None
 
         # make any unconditional temporal constraints
-        # active
+        # active, and index the conditional constraints and variables
+        # by their guards, so that only those guarded by a changed
+        # assignment need to be visited later on
+        self.implemented_candidate = None
+        self.implemented_assignments = PersistentSet()
+        self.implemented_relaxations = PersistentSet()
+        self.implemented_allocations = set()
+        self.guard_index = GuardIndex(self.tpnu)
+        self.satisfied_guards = {}
+        self.statistics = SearchStatistics()
+        self.candidates_dropped = 0
+
+        # consecutive candidates mostly share their constraints,
+        # so consistency and dynamic controllability are checked
+        # incrementally from one to the next
+        self.consistency_checker = None
+        if self.feasibility_type == FeasibilityType.CONSISTENCY:
+            self.consistency_checker = IncrementalConsistency()
+        elif self.feasibility_type == FeasibilityType.DYNAMIC_CONTROLLABILITY:
+            self.consistency_checker = IncrementalMorrisN3Dc()
+        self.dropped_bound = None
+        self.conflicts_reused = 0
+        self.last_checkpoint = datetime.now()
+
+        if self.parallel_checker is not None:
+            self.parallel_checker.shutdown()
+
         for constraint in self.tpnu.temporal_constraints.values():
             if len(constraint.guards) == 0:
                 constraint.activated = True
             else:
                 constraint.activated = False
+                self.satisfied_guards[constraint] = 0
+
+            constraint.relaxed_lb = None
+            constraint.relaxed_ub = None
+
+        # initialize the heuristic for each decision variable
+        self.update_variable_heuristics()
 
         # add an empty candidate to the queue
         first_candidate = Candidate()
@@ -68,36 +178,118 @@ class SearchProblem(object):
         # available for assignment
         for variable in self.tpnu.decision_variables.values():
             if len(variable.guards) == 0:
-                first_candidate.unassigned_variables.put(variable)
+                heapq.heappush(first_candidate.unassigned_variables,variable)
+                first_candidate.h += variable.optimal_utility
 
-        self.queue.put(first_candidate)
+        self.add_candidate_to_queue(first_candidate)
 
-        # initialize the heuristic for each decision variable
-        for dv in self.tpnu.decision_variables.values():
-            self.update_variable_heuristics(dv)
+    def update_variable_heuristics(self):
+        # the optimal utility of a decision variable is the best utility of
+        # its domain, or of one of its assignments plus the optimal utility
+        # of a variable guarded by it. It is computed in a single pass
+        # over the guards, visiting each variable after all those it guards
 
-    def update_variable_heuristics(self,variable):
-        # get the domain assignment with the highest reward
-        best_domain_assignment = sorted(list(variable.domain),key=lambda assignment: assignment.utility, reverse=True)[0]
-        if best_domain_assignment.utility > variable.optimal_utility:
-            variable.optimal_utility = best_domain_assignment.utility
+        # variable -> number of guards on it from variables not visited yet
+        remaining = {}
+        for variable in self.tpnu.decision_variables.values():
+            remaining.setdefault(variable,0)
+            for guard_assignment in variable.guards:
+                guard_variable = guard_assignment.decision_variable
+                remaining[guard_variable] = remaining.get(guard_variable,0) + 1
+
+        ready = []
+        for variable in remaining:
+            variable.optimal_utility = 0
+            for assignment in variable.domain:
+                if assignment.utility > variable.optimal_utility:
+                    variable.optimal_utility = assignment.utility
+            if remaining[variable] == 0:
+                ready.append(variable)
+
+        visited = 0
+        while len(ready) > 0:
+            variable = ready.pop()
+            visited += 1
+
+            # propagate it to the parents
+            for guard_assignment in variable.guards:
+                guard_variable = guard_assignment.decision_variable
+                if guard_variable.optimal_utility < guard_assignment.utility + variable.optimal_utility:
+                    guard_variable.optimal_utility = guard_assignment.utility + variable.optimal_utility
+                remaining[guard_variable] -= 1
+                if remaining[guard_variable] == 0:
+                    ready.append(guard_variable)
+
+        if visited < len(remaining):
+            names = sorted(str(variable.name) for variable in remaining if remaining[variable] > 0)
+            raise Exception("Cyclic guards between decision variables: " + ", ".join(names))
+
+    def next_solution(self, time_limit=None, max_expansions=None):
+
+        # time_limit (in seconds) and max_expansions (dequeued candidates)
+        # bound this call. Once either is used up, the search stops
+        # and returns the best feasible candidate found so far, if any.
+        # The queue is kept, so a later call resumes the search,
+        # and search_statistics() reports how far it is from the optimum
+        start_time = datetime.now()
+        self.expansions = 0
+        self.budget_exhausted = False
+
+        try:
+            solution = self.search(start_time,time_limit,max_expansions)
+        finally:
+            # the worker processes are not kept between calls
+            if self.parallel_checker is not None:
+                self.parallel_checker.shutdown()
+
+        self.runtime = (datetime.now() - start_time).total_seconds()
+        if solution is not None and not self.budget_exhausted:
+            # best-first: nothing left in the queue can do better
+            self.upper_bound = solution.g
+            self.incumbent = None
+        elif not self.queue.empty():
+            top = self.queue.peek()
+            self.upper_bound = top.g + top.h
+        else:
+            self.upper_bound = None
+
+        if self.dropped_bound is not None:
+            if self.upper_bound is None or self.dropped_bound > self.upper_bound:
+                self.upper_bound = self.dropped_bound
+        self.best_utility = None if solution is None else solution.g
 
-        # propagate it to the parent
-        for guard_assignment in variable.guards:
-            guard_variable = guard_assignment.decision_variable
-            if guard_variable.optimal_utility < guard_assignment.utility + variable.optimal_utility:
-                guard_variable.optimal_utility = guard_assignment.utility + variable.optimal_utility
-                self.update_variable_heuristics(guard_variable)
+        return solution
 
-    def next_solution(self):
+    def search(self,start_time,time_limit,max_expansions):
 
         # if the search queue is empty
         # no more solution can be found
         while not self.queue.empty():
 
+            if max_expansions is not None and self.expansions >= max_expansions:
+                self.budget_exhausted = True
+            elif time_limit is not None and (datetime.now() - start_time).total_seconds() >= time_limit:
+                self.budget_exhausted = True
+
+            if self.budget_exhausted:
+                return self.best_so_far()
+
+            if self.checkpoint_path is not None:
+                if (datetime.now() - self.last_checkpoint).total_seconds() >= self.checkpoint_interval:
+                    self.checkpoint(self.checkpoint_path)
+
             # dequeue the current candidate
             candidate = self.queue.get()
+            self.candidate_table.close(candidate)
+            if candidate.backed_up is not None:
+                # queued again after some of its children were dropped,
+                # and about to generate them again
+                candidate.h = candidate.original_h
+                candidate.original_h = None
+                candidate.backed_up = None
             self.candidates_dequeued += 1
+            self.expansions += 1
+            self.statistics.sample(self)
             # print(str(self.candidates_dequeued) + "\t" + str(candidate.f))
 
             # print("Dequeue candidate: " + str(candidate.f) + "/" + str(candidate.g) + "\n")
@@ -106,11 +298,17 @@ class SearchProblem(object):
             # check if it has resolved all conflicts
             # unresolved_conflict = None
             # if self.check_complete(candidate) is None:
+            started = perf_counter()
             unresolved_conflict = self.check_conflict_resolution(candidate)
+            self.statistics.record("ConflictResolution",started)
 
             # if not, get an unresolved conflict and expand on it
             if unresolved_conflict is not None:
+                self.discard_speculation(candidate)
+                started = perf_counter()
                 self.expand_on_conflict(candidate,unresolved_conflict)
+                self.statistics.record("ExpandOnConflict",started)
+                self.bound_frontier(candidate)
             else:
 
                 # if yes, check if it is complete
@@ -119,10 +317,17 @@ class SearchProblem(object):
                 if unassigned_variable is not None:
 
                     # if incomplete, get an unassigned variable and expand on it
+                    self.discard_speculation(candidate)
+                    started = perf_counter()
                     self.expand_on_variable(candidate,unassigned_variable)
+                    self.statistics.record("ExpandOnVariable",started)
+                    self.bound_frontier(candidate)
 
                 else:
-                    # if complete, check if it is consistent
+                    # if complete, check if it is consistent,
+                    # and start checking the next candidates
+                    # that would need a check too
+                    self.speculate(candidate)
                     new_conflict = self.consistent(candidate)
 
                     if new_conflict is not None:
@@ -130,62 +335,199 @@ class SearchProblem(object):
                         # if (len(new_conflict.negative_cycles) > 1):
                         #     break
                         # if inconsistent, extract and record a conflict,
-                        self.known_conflicts.add(new_conflict)
+                        self.learn_conflict(new_conflict)
                         # print("new conflict: " + str(len(self.known_conflicts)));
                         # and put the back to the queue
-                        self.add_candidate_to_queue(candidate)
+                        self.candidate_table.reopen(candidate)
+                        self.queue.put(candidate)
 
                     else:
                         # if consistent, return the candidate as a feasible solution
-
-                        if self.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
-                            maxFlex = 99999
-                            self.implement(candidate)
-                            for id in self.tpnu.temporal_constraints:
-                                constraint = self.tpnu.temporal_constraints[id]
-                                if not constraint.controllable:
-                                    if constraint.get_upper_bound() - constraint.get_lower_bound() < maxFlex:
-                                        maxFlex = constraint.get_upper_bound() - constraint.get_lower_bound()
-
-                            candidate.utility = maxFlex
+                        self.update_solution_utility(candidate)
+                        self.release(candidate,None)
                         return candidate
 
         return None
 
-    def check_conflict_resolution(self,candidate):
-
-        # check against the list of known conflicts
-        # and see if the candidate can resolve it
-
-        # TODO: add in more efficient code for conflict detection
+    def checkpoint(self,path):
+        # save the queue, conflicts and counters of the search
+        Checkpoint.save(self,path)
+        self.last_checkpoint = datetime.now()
+
+    def resume(self,path):
+        # continue a search from its checkpoint. The tpnu of this
+        # search problem must be another parse of the same file
+        self.initialize()
+        Checkpoint.load(self,path)
+        self.last_checkpoint = datetime.now()
+
+    def resolve(self, edits, time_limit=None, max_expansions=None):
+        # apply the given edits (see search.network_edit) to the tpnu, and
+        # search again from the start, keeping the known conflicts that
+        # do not involve any changed constraint. They are learned again
+        # in their original order, so most inconsistent candidates
+        # are expanded without being checked again
+        changed_constraints = set()
+        for edit in edits:
+            changed_constraints.update(edit.apply(self.tpnu))
+
+        conflicts = []
+        for conflict in self.conflict_index.conflicts:
+            if conflict is not None and conflict.holds_after(changed_constraints):
+                conflicts.append(conflict)
+
+        self.initialize()
+        for conflict in conflicts:
+            self.learn_conflict(conflict)
+        self.conflicts_reused = len(conflicts)
+
+        return self.next_solution(time_limit,max_expansions)
+
+    def iter_solutions(self, k=None):
+
+        # yield up to k solutions (all of them if k is None) in best-first order,
+        # each with the conflicts learned while searching for it.
+        # The queue and known conflicts carry over from one solution to the next,
+        # and each solution is recorded as a nogood, so that neither it nor
+        # any other candidate with the same assignments is returned again
+        count = 0
+        while k is None or count < k:
+            learned_from = len(self.conflict_index)
+            solution = self.next_solution()
+            if solution is None:
+                return
+
+            learned_conflicts = [conflict for conflict in self.conflict_index.conflicts[learned_from:] if conflict is not None]
+            self.add_nogood(solution)
+            count += 1
+
+            yield solution, learned_conflicts
+
+    def add_nogood(self,solution):
+        # a conflict without negative cycles, resolved only
+        # by assigning a different value to one of its variables
+        nogood = Conflict()
+        for assignment in solution.assignments:
+            nogood.add_assignment(assignment)
+
+        self.learn_conflict(nogood)
+
+    def learn_conflict(self,conflict):
+        # the conflict index drops the conflicts made redundant
+        # by the new one, and the least useful ones above its capacity
+        self.known_conflicts.add(conflict)
+        for removed_conflict in self.conflict_index.add_conflict(conflict):
+            self.known_conflicts.discard(removed_conflict)
+
+    def update_solution_utility(self,candidate):
+        if self.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
+            maxFlex = 99999
+            self.implement(candidate)
+            for id in self.tpnu.temporal_constraints:
+                constraint = self.tpnu.temporal_constraints[id]
+                if not constraint.controllable:
+                    if constraint.get_upper_bound() - constraint.get_lower_bound() < maxFlex:
+                        maxFlex = constraint.get_upper_bound() - constraint.get_lower_bound()
+
+            candidate.utility = maxFlex
+
+    def best_so_far(self):
+        # best-first search returns the first feasible candidate it dequeues,
+        # so the only feasible candidates known before that are the incumbent,
+        # those still in the queue that a speculative check found consistent,
+        # and the best complete ones in the queue, checked here.
+        # A candidate found inconsistent is left in the queue,
+        # and its conflict is learned as if it had been dequeued
+        best = self.incumbent
+        if self.parallel_checker is not None:
+            for candidate in self.parallel_checker.feasible_candidates():
+                if best is None or candidate.g > best.g:
+                    best = candidate
+
+        checks = 0
+        for candidate in self.queue.best(4 * SearchProblem.INCUMBENT_CHECKS):
+            if checks == SearchProblem.INCUMBENT_CHECKS:
+                break
+            if best is not None and candidate.g + candidate.h <= best.g:
+                break
+
+            if self.check_conflict_resolution(candidate) is None:
+                if self.check_complete(candidate) is None:
+                    checks += 1
+                    conflict = self.consistent(candidate)
+                    if conflict is None:
+                        best = candidate
+                        break
+                    self.learn_conflict(conflict)
+
+        if best is not None:
+            self.update_solution_utility(best)
+            self.incumbent = best
+
+        return best
+
+    def search_statistics(self):
+        # progress of the search, and outcome of the last call to next_solution.
+        # Gap is the difference between the best utility any remaining
+        # candidate could reach and the one of the returned candidate
+        result = {}
+
+        result["Candidates"] = self.candidates_dequeued
+        result["Expansions"] = self.expansions
+        result["Runtime"] = self.runtime
+        result["Conflicts"] = len(self.known_conflicts)
+        result["ConflictsReused"] = self.conflicts_reused
+        result["QueueSize"] = self.queue.qsize()
+        result["DuplicatesPruned"] = self.candidate_table.pruned
+        result["CandidatesDropped"] = self.candidates_dropped
+        result["MinimizationChecks"] = self.minimization_checks
+        result["ConflictLookups"] = self.conflict_index.lookups
+        result["ConflictHitRate"] = self.conflict_index.hit_rate()
+        result["ConflictsSubsumed"] = self.conflict_index.subsumed
+        result["ConflictsEvicted"] = self.conflict_index.evicted
+        result["Statistics"] = self.statistics.json_description()
+        result["BudgetExhausted"] = self.budget_exhausted
+        result["UpperBound"] = self.upper_bound
+        result["Utility"] = self.best_utility
+
+        if self.upper_bound is not None and self.best_utility is not None:
+            result["Gap"] = max(0, self.upper_bound - self.best_utility)
+        else:
+            result["Gap"] = None
 
-        unresolved_conflicts = self.known_conflicts.difference(candidate.resolved_conflicts)
-        for unresolved_conflict in unresolved_conflicts:
-            # check if there is one assignment in the candidate that
-            # negates one assignment in the conflict
+        return result
 
-            resolved = False
-            for candidate_assignment in candidate.assignments:
-                for conflict_assignment in unresolved_conflict.assignments:
+    def speculate(self,current):
+        if self.parallel_checker is None:
+            return
 
-                    if not resolved:
-                        # first, find the assignments that share the same decision variable
-                        if candidate_assignment.decision_variable is conflict_assignment.decision_variable:
-                            if candidate_assignment is not conflict_assignment:
-                                # next, if they are different, meaning that this conflict is resolved
-                                resolved = True
+        # the best candidates in the queue that resolve all known conflicts
+        # and are complete. Conflicts learned before they are dequeued
+        # may make some of them unnecessary, but never change their result.
+        # Looking them up in the conflict index only moves their cursors
+        # ahead, as dequeuing them would
+        ready = []
+        for candidate in self.queue.best(4 * self.parallel_checks):
+            if self.check_conflict_resolution(candidate) is None:
+                if self.check_complete(candidate) is None:
+                    ready.append(candidate)
+                    if len(ready) == self.parallel_checks:
+                        break
 
-                                # add to the candidate's resolved conflict
-                                candidate.resolved_conflicts.add(unresolved_conflict)
+        self.parallel_checker.speculate(current,ready)
 
-                                # and move on to the next conflict
-                                break
+    def discard_speculation(self,candidate):
+        if self.parallel_checker is not None:
+            self.parallel_checker.discard(candidate)
 
-            # otherwise, we return this as an unresolved conflict
-            if not resolved:
-                return unresolved_conflict
+    def check_conflict_resolution(self,candidate):
 
-        return None
+        # check against the list of known conflicts
+        # and see if the candidate can resolve it.
+        # The conflict index only revisits the conflicts that
+        # the candidate has not been checked against, or those
+        # watching the variables of its newly added assignments
+        return self.conflict_index.first_unresolved(candidate)
 
     def expand_on_conflict(self,candidate,conflict):
 
@@ -226,7 +568,7 @@ class SearchProblem(object):
                         new_candidate.assignments_to_avoid.update(conflict_assignments)
                         new_candidate.resolved_conflicts.add(conflict)
 
-                        self.add_candidate_to_queue(new_candidate)
+                        self.add_candidate_to_queue(new_candidate,candidate)
                         found_discrete_relaxation = True
 
         # TODO: add in the actual code for expand on conflict,
@@ -253,8 +595,10 @@ class SearchProblem(object):
                         # pass # Gurobi doesn't exist, use default Pulp solver.
                         raise Exception("Missing subsolvers on this system for chance-constrained relaxation. Check if you have scipy and snopt installed correctly.")
 
+                    started = perf_counter()
                     relaxations, allocations, cc_relaxations, utility = ChanceConstrainedRelaxation.generate_cc_relaxations(candidate,
                                                                                                negative_cycle,self.feasibility_type,self.cc)
+                    self.statistics.record("Relaxation:ChanceConstrained",started)
                     if relaxations is not None or allocations is not None:
                         # we construct new candidates using the relaxations and allocations
                         new_candidate = self.create_child_candidate_from_relaxations(candidate, relaxations=relaxations, allocations=allocations)
@@ -263,19 +607,23 @@ class SearchProblem(object):
                                 new_candidate.add_chance_constraint_relaxations(cc_relaxations)
                             new_candidate.resolved_conflicts.add(conflict)
                             new_candidate.continuously_resolved_cycles.add(negative_cycle)
-                            self.add_candidate_to_queue(new_candidate)
+                            self.add_candidate_to_queue(new_candidate,candidate)
                 else:
+                    started = perf_counter()
                     relaxations,utility = MinCostRelaxation.generate_mincost_relaxations(candidate,negative_cycle,self.feasibility_type)
+                    self.statistics.record("Relaxation:MinCost",started)
                     if relaxations is not None:
                         # we construct new candidates using this relaxations
                         new_candidate = self.create_child_candidate_from_relaxations(candidate,relaxations=relaxations)
                         if new_candidate is not None:
                             new_candidate.resolved_conflicts.add(conflict)
                             new_candidate.continuously_resolved_cycles.add(negative_cycle)
-                            self.add_candidate_to_queue(new_candidate)
+                            self.add_candidate_to_queue(new_candidate,candidate)
 
             elif self.objective_type == ObjectiveType.MAX_FLEX_UNCERTAINTY:
+                started = perf_counter()
                 relaxations,max_flex_value = MaxFlexRelaxation.generate_maxflex_relaxations(candidate,negative_cycle)
+                self.statistics.record("Relaxation:MaxFlex",started)
                 if relaxations is not None:
                     # we construct new candidates using this relaxations
                     new_candidate = self.create_child_candidate_from_relaxations(candidate,relaxations=relaxations)
@@ -286,7 +634,7 @@ class SearchProblem(object):
                         new_candidate.g = max_flex_value
                         # print("New flex value: " + str(new_candidate.f))
                         # new_candidate.pretty_print()
-                        self.add_candidate_to_queue(new_candidate)
+                        self.add_candidate_to_queue(new_candidate,candidate)
             else:
                 raise Exception("Unknown objective type: " + str(self.objective_type))
 
@@ -298,13 +646,12 @@ class SearchProblem(object):
         # check if no available variable left
         # that is unassigned
 
-        if candidate.unassigned_variables.empty():
+        if len(candidate.unassigned_variables) == 0:
             return None
         else:
             # get an unassigned variable
             # with the highest expected utility
-            variable = candidate.unassigned_variables.queue[0]
-            # candidate.unassigned_variables.put(variable)
+            variable = candidate.unassigned_variables[0]
             return variable
 
 
@@ -320,47 +667,29 @@ class SearchProblem(object):
             # add the newly created candidates to the
             # queue
             if new_candidate is not None:
-                self.add_candidate_to_queue(new_candidate)
+                self.add_candidate_to_queue(new_candidate,candidate)
 
     def create_child_candidate_from_assignment(self,candidate,assignment):
 
-        new_candidate = Candidate()
+        # the child shares the assignments, resolutions
+        # and relaxations of its parent
+        new_candidate = candidate.create_child()
 
-        new_candidate.resolved_conflicts = candidate.resolved_conflicts.copy()
-        new_candidate.continuously_resolved_cycles = candidate.continuously_resolved_cycles.copy()
-        new_candidate.assignments_to_avoid = candidate.assignments_to_avoid.copy()
-        new_candidate.assigned_variables = candidate.assigned_variables.copy()
-
-        new_candidate.add_assignments(candidate.assignments)
         if not new_candidate.add_assignment(assignment):
             return None
-        new_candidate.add_temporal_relaxations(candidate.temporal_relaxations)
-        new_candidate.add_semantic_relaxations(candidate.semantic_relaxations)
 
         # with this new assignment, find all available/unassigned variables
-        for variable in self.tpnu.decision_variables.values():
-            # it must not have been assigned
-            if not variable in new_candidate.assigned_variables:
-                # and the guard must have been satisfied
-                if len(variable.guards) == 0 or variable.guards <= new_candidate.assignments:
-                    new_candidate.unassigned_variables.put(variable)
-                    new_candidate.h += variable.optimal_utility
+        self.update_unassigned_variables(candidate,new_candidate)
 
         return new_candidate
 
     def create_child_candidate_from_relaxations(self,candidate,relaxations=None,allocations=None):
 
-        new_candidate = Candidate()
+        # We do not inherit the temporal relaxations of the parent,
+        # as the new relaxations already cover all the
+        # continuously resolved cycles.
+        new_candidate = candidate.create_child(keep_relaxations=False)
 
-        new_candidate.resolved_conflicts = candidate.resolved_conflicts.copy()
-        new_candidate.continuously_resolved_cycles = candidate.continuously_resolved_cycles.copy()
-        new_candidate.assignments_to_avoid = candidate.assignments_to_avoid.copy()
-        new_candidate.assigned_variables = candidate.assigned_variables.copy()
-
-        new_candidate.add_assignments(candidate.assignments)
-        # We do not need the following line as it adds duplicated relaxations to the
-        # new candidate.
-        # new_candidate.add_temporal_relaxations(candidate.temporal_relaxations)
         # Add temporal relaxations
         if relaxations is not None:
             for relaxation in relaxations:
@@ -373,39 +702,51 @@ class SearchProblem(object):
                 if not new_candidate.add_temporal_allocation(allocation):
                     return None
 
-        new_candidate.add_semantic_relaxations(candidate.semantic_relaxations)
-
         # find all available variables
-        for variable in self.tpnu.decision_variables.values():
-            # it must not have been assigned
-            if not variable in new_candidate.assigned_variables:
-                # and the guard must have been satisfied
-                if len(variable.guards) == 0 or variable.guards <= new_candidate.assignments:
-                    new_candidate.unassigned_variables.put(variable)
-                    new_candidate.h += variable.optimal_utility
+        self.update_unassigned_variables(candidate,new_candidate)
 
         return new_candidate
 
+    def update_unassigned_variables(self,candidate,new_candidate):
+
+        # the available variables of the child are those of its parent
+        # that remain unassigned, plus those enabled by the
+        # assignments newly added to the child
+        new_candidate.h = candidate.h
+        unassigned_variables = []
+        for variable in candidate.unassigned_variables:
+            if variable in new_candidate.assigned_variables:
+                new_candidate.h -= variable.optimal_utility
+            else:
+                unassigned_variables.append(variable)
+
+        for variable in self.guard_index.enabled_variables(new_candidate,new_candidate.new_assignments):
+            unassigned_variables.append(variable)
+            new_candidate.h += variable.optimal_utility
+
+        heapq.heapify(unassigned_variables)
+        new_candidate.unassigned_variables = unassigned_variables
+
     def consistent(self,candidate):
         # Check if this candidate results
         # in a consistent temporal network
         # print('------Consistency check')
         # candidate.pretty_print()
 
-        self.implement(candidate)
-        # return either a conflict, or None
-        # run the dc checking algorithm
-        # TODO: fix the conflict extraction code
-        conflict = None
-
-        if self.feasibility_type == FeasibilityType.CONSISTENCY:
-            conflict = TemporalConsistency.check(self.tpnu)
-        elif self.feasibility_type == FeasibilityType.STRONG_CONTROLLABILITY:
-            conflict = StrongControllability.check(self.tpnu)
-        elif self.feasibility_type == FeasibilityType.DYNAMIC_CONTROLLABILITY:
-            conflict = DynamicControllability.check(self.tpnu)
+        # use the result of a speculative check if there is one
+        if self.parallel_checker is not None and self.parallel_checker.has_result(candidate):
+            started = perf_counter()
+            conflict = self.parallel_checker.result(candidate)
+            self.statistics.record("Check:Parallel",started)
+            self.implement(candidate)
         else:
-            raise Exception("Unknown feasibility type: " + str(self.feasibility_type))
+            self.implement(candidate)
+            started = perf_counter()
+            if self.consistency_checker is not None:
+                conflict = self.consistency_checker.check(self.tpnu)
+            else:
+                conflict = SearchProblem.check_feasibility(self.tpnu,self.feasibility_type)
+            self.statistics.record("Check:" + SearchProblem.checker_name(self.feasibility_type),started)
 
         # the conflict is a collection of dictionaries
         # each represents a negative cycle
@@ -415,34 +756,188 @@ class SearchProblem(object):
             # reformat the conflict
             kirk_conflict = Conflict()
             kirk_conflict.add_negative_cycles(conflict,self.tpnu)
+
+            if self.conflict_checks > 0:
+                started = perf_counter()
+                minimization = QuickXplain(self.tpnu,self.feasibility_type,self.conflict_checks)
+                kirk_conflict = minimization.minimize(kirk_conflict)
+                self.minimization_checks += minimization.checks
+                self.statistics.record("ConflictMinimization",started)
             # kirk_conflict.pretty_print()
             # print("Conflict size: " + str(len(kirk_conflict.negative_cycles)))
             return kirk_conflict
 
-    def implement(self,candidate):
-        # update the list of active temporal
-        # constraints and their bounds
-        # for consistency checking
-
-        for constraint in self.tpnu.temporal_constraints.values():
-            if set(constraint.guards) <= set(candidate.assignments):
-                # print("Activating: ",constraint.id)
-                constraint.activated = True
-            else:
-                # print("Deactivating: ",constraint.id)
-                constraint.activated = False
+    @staticmethod
+    def checker_name(f_type):
+        if f_type == FeasibilityType.CONSISTENCY:
+            return "TemporalConsistency"
+        elif f_type == FeasibilityType.STRONG_CONTROLLABILITY:
+            return "StrongControllability"
+        elif f_type == FeasibilityType.DYNAMIC_CONTROLLABILITY:
+            return "DynamicControllability"
+        else:
+            raise Exception("Unknown feasibility type: " + str(f_type))
 
-            constraint.relaxed_lb = None
-            constraint.relaxed_ub = None
+    @staticmethod
+    def check_feasibility(tpnu,f_type):
+        # return either a conflict, or None
+        # run the dc checking algorithm
+        # TODO: fix the conflict extraction code
+        conflict = None
 
-        for relaxation in candidate.temporal_relaxations:
-            relaxation.implement()
+        if f_type == FeasibilityType.CONSISTENCY:
+            conflict = TemporalConsistency.check(tpnu)
+        elif f_type == FeasibilityType.STRONG_CONTROLLABILITY:
+            conflict = StrongControllability.check(tpnu)
+        elif f_type == FeasibilityType.DYNAMIC_CONTROLLABILITY:
+            conflict = DynamicControllability.check(tpnu)
+        else:
+            raise Exception("Unknown feasibility type: " + str(f_type))
 
-        for allocation in candidate.temporal_allocations:
-            allocation.implement()
+        return conflict
 
-    def add_candidate_to_queue(self, candidate):
-        self.queue.put(candidate)
+    def implement(self,candidate):
+        # update the list of active temporal
+        # constraints and their bounds
+        # for consistency checking.
+        # Only the difference between this candidate and the
+        # one currently implemented in the tpnu is applied
+        if candidate is self.implemented_candidate:
+            return
+
+        started = perf_counter()
+
+        # deactivate the constraints guarded by assignments
+        # that are no longer there, and activate those whose
+        # guards are now all satisfied.
+        # Candidates share most of their assignments with their ancestors,
+        # so only the unshared part of either set needs to be compared
+        for assignment in self.implemented_assignments.unshared(candidate.assignments):
+            if assignment not in candidate.assignments:
+                for constraint in self.guard_index.guarded_constraints.get(assignment,()):
+                    self.satisfied_guards[constraint] -= 1
+                    # print("Deactivating: ",constraint.id)
+                    constraint.activated = False
+
+        for assignment in candidate.assignments.unshared(self.implemented_assignments):
+            if assignment not in self.implemented_assignments:
+                for constraint in self.guard_index.guarded_constraints.get(assignment,()):
+                    self.satisfied_guards[constraint] += 1
+                    if self.satisfied_guards[constraint] == len(constraint.guards):
+                        # print("Activating: ",constraint.id)
+                        constraint.activated = True
+
+        # retract the relaxations and allocations that are no longer there,
+        # and re-apply, in the original order, every bound of the touched constraints
+        touched_constraints = set()
+        for relaxation in self.implemented_relaxations.unshared(candidate.temporal_relaxations):
+            if relaxation not in candidate.temporal_relaxations:
+                relaxation.retract()
+                touched_constraints.add(relaxation.constraint)
+
+        for relaxation in candidate.temporal_relaxations.unshared(self.implemented_relaxations):
+            if relaxation not in self.implemented_relaxations:
+                touched_constraints.add(relaxation.constraint)
+
+        for allocation in self.implemented_allocations.symmetric_difference(candidate.temporal_allocations):
+            if allocation in self.implemented_allocations:
+                allocation.retract()
+            touched_constraints.add(allocation.constraint)
+
+        if len(touched_constraints) > 0:
+            for relaxation in candidate.temporal_relaxations:
+                if relaxation.constraint in touched_constraints:
+                    relaxation.implement()
+
+            for allocation in candidate.temporal_allocations:
+                if allocation.constraint in touched_constraints:
+                    allocation.implement()
+
+        self.implemented_candidate = candidate
+        self.implemented_assignments = candidate.assignments.branch()
+        self.implemented_relaxations = candidate.temporal_relaxations.branch()
+        self.implemented_allocations = set(candidate.temporal_allocations)
+        self.statistics.record("Implement",started)
+
+    def bound_frontier(self,expanded):
+        if self.memory_bound == MemoryBound.OFF:
+            return
+
+        if self.memory_bound == MemoryBound.SMA and expanded.children == 0:
+            # a dead end: none of its children made it to the queue
+            self.release(expanded,None)
+
+        if self.queue.qsize() <= self.frontier_limit:
+            return
+
+        # drop the worst candidates, down to 90% of the limit,
+        # so that the queue is not sorted again at every expansion.
+        # Candidates queued again for their dropped children
+        # still have others in memory, and are kept
+        started = perf_counter()
+        reorder = False
+        for candidate in self.queue.trim(int(0.9 * self.frontier_limit),SearchProblem.droppable):
+            self.candidates_dropped += 1
+            self.candidate_table.forget(candidate)
+            self.discard_speculation(candidate)
+
+            utility = candidate.g + candidate.h
+            if self.memory_bound == MemoryBound.SMA:
+                reorder = self.release(candidate,utility) or reorder
+            elif self.dropped_bound is None or utility > self.dropped_bound:
+                self.dropped_bound = utility
+
+        if reorder:
+            self.queue.reorder()
+        self.statistics.record("BoundFrontier",started)
+
+    @staticmethod
+    def droppable(candidate):
+        return candidate.children == 0
+
+    def release(self,candidate,utility):
+        # the candidate leaves the memory bounded search: it was dropped
+        # with the given utility, or has no children left to expand (None).
+        # Its parent keeps the best utility of its dropped children, and is
+        # queued again with it, so that they are generated again once that
+        # utility is the best in the queue. Those of its children still in
+        # memory are then pruned as duplicates.
+        # A parent with no children left and none dropped is a dead end too.
+        # Return True if a parent already queued has a better utility
+        if self.memory_bound != MemoryBound.SMA:
+            return False
+
+        parent = candidate.parent
+        while parent is not None:
+            parent.children -= 1
+
+            if utility is not None:
+                if parent.backed_up is None:
+                    parent.backed_up = utility
+                    parent.original_h = parent.h
+                    parent.h = utility - parent.g
+                    self.candidate_table.reopen(parent)
+                    self.queue.put(parent)
+                elif utility > parent.backed_up:
+                    parent.backed_up = utility
+                    parent.h = utility - parent.g
+                    return True
+                return False
+
+            if parent.children > 0 or parent.backed_up is not None:
+                return False
+
+            parent = parent.parent
+
+        return False
+
+    def add_candidate_to_queue(self, candidate, parent=None):
+        # drop the candidate if an equivalent one has been queued before
+        if self.candidate_table.add(candidate):
+            self.queue.put(candidate)
+            if parent is not None and self.memory_bound == MemoryBound.SMA:
+                candidate.parent = parent
+                parent.children += 1
         # print("Adding new candidate to queue: " + str(self.queue.qsize()))
         # candidate.pretty_print()
 
@@ -0,0 +1,78 @@
+__author__ = 'yupeng'
+
+from time import perf_counter
+import json
+
+
+class SearchStatistics(object):
+
+    # the timeline keeps at most this many samples. When it is full,
+    # every other sample is dropped and the interval doubles
+    MAX_SAMPLES = 1000
+
+    def __init__(self):
+        self.start_time = perf_counter()
+
+        # phase name -> [number of calls, total seconds].
+        # Phases may be nested: expanding on a conflict
+        # includes implementing the candidate and solving the LPs
+        self.phases = {}
+
+        # (candidates dequeued, seconds, queue size, conflicts, negative cycles)
+        self.timeline = []
+        self.interval = 1
+
+    def record(self, phase, started):
+        # add a call of the phase that started at the given perf_counter() time
+        elapsed = perf_counter() - started
+        if phase in self.phases:
+            entry = self.phases[phase]
+            entry[0] += 1
+            entry[1] += elapsed
+        else:
+            self.phases[phase] = [1, elapsed]
+
+    def sample(self, search_problem):
+        if search_problem.candidates_dequeued % self.interval != 0:
+            return
+
+        cycles = 0
+        for conflict in search_problem.known_conflicts:
+            cycles += len(conflict.negative_cycles)
+
+        self.timeline.append((search_problem.candidates_dequeued,
+                              perf_counter() - self.start_time,
+                              search_problem.queue.qsize(),
+                              len(search_problem.known_conflicts),
+                              cycles))
+
+        if len(self.timeline) >= SearchStatistics.MAX_SAMPLES:
+            self.interval *= 2
+            self.timeline = [sample for sample in self.timeline if sample[0] % self.interval == 0]
+
+    def json_print(self):
+        return json.dumps(self.json_description())
+
+    def json_description(self):
+        result = {}
+
+        phasesObj = {}
+        for phase, entry in self.phases.items():
+            phaseObj = {}
+            phaseObj["Calls"] = entry[0]
+            phaseObj["Seconds"] = entry[1]
+            phasesObj[phase] = phaseObj
+        result["Phases"] = phasesObj
+
+        timelineObj = []
+        for dequeued, seconds, queue_size, conflicts, cycles in self.timeline:
+            sampleObj = {}
+            sampleObj["Candidates"] = dequeued
+            sampleObj["Seconds"] = seconds
+            sampleObj["QueueSize"] = queue_size
+            sampleObj["Conflicts"] = conflicts
+            sampleObj["NegativeCycles"] = cycles
+            timelineObj.append(sampleObj)
+        result["Timeline"] = timelineObj
+
+        return result
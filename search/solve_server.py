@@ -0,0 +1,363 @@
+__author__ = 'yupeng'
+
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+from io import BytesIO
+from time import perf_counter
+import argparse
+import asyncio
+import json
+import multiprocessing
+from tpn import Tpn
+from temporal_network.tpnu import Tpnu
+from search.portfolio import SolverConfiguration, solve_configuration
+
+
+# A local solve service. Models (CCTP or TPN files) are posted as JSON
+# over HTTP, on a TCP port or a unix socket:
+#
+#   POST /solve    {"Model": "<cctp>...", "Feasibility": "DYNAMIC_CONTROLLABILITY",
+#                   "Objective": "MIN_COST", "ChanceConstrained": "OFF",
+#                   "Solver": "CDRU", "Options": {"conflict_checks": 16},
+#                   "Deadline": 30}
+#   GET  /metrics
+#
+# Models are solved by a pool of worker processes. Each worker caches
+# the models it parsed by the hash of their content, and requests only
+# send it that hash: the content is sent again to a worker that does
+# not have the model (yet, or any more). The server keeps the content
+# of the models that parsed, to answer whether a model is cached
+
+
+class ModelError(Exception):
+    # the model of a request does not parse
+    pass
+
+
+# content hash -> tpnu, of the models parsed by a worker process,
+# least recently used first
+worker_models = OrderedDict()
+worker_cache_size = 32
+
+
+def start_worker(cache_size):
+    global worker_cache_size
+    worker_cache_size = cache_size
+
+
+def parse_model(content):
+    # parse the content of a CCTP or TPN file into a tpnu
+    if Tpnu.isCCTP(BytesIO(content)):
+        return Tpnu.parseCCTP(BytesIO(content))
+    elif Tpnu.isTPN(BytesIO(content)):
+        return Tpnu.from_tpn_autogen(Tpn.parseTPN(BytesIO(content)))
+    else:
+        raise Exception("Model is neither a CCTP nor a TPN")
+
+
+def load_model(key, content):
+    # run in a worker process: parse a model, unless it is already cached
+    if key in worker_models:
+        worker_models.move_to_end(key)
+        return worker_models[key]
+
+    try:
+        tpnu = parse_model(content)
+    except Exception as e:
+        raise ModelError("Model does not parse: " + str(e))
+    worker_models[key] = tpnu
+    if len(worker_models) > worker_cache_size:
+        worker_models.popitem(last=False)
+    return tpnu
+
+
+def check_model(key, content):
+    # run in a worker process: parse a model, without sending it back
+    load_model(key, content)
+
+
+def solve_model(key, content, configuration, time_limit):
+    # run in a worker process. Returns None if the content is needed,
+    # when it is not given and the model is not cached
+    if content is None and key not in worker_models:
+        return None
+    tpnu = load_model(key, content)
+    started = perf_counter()
+    status, description = solve_configuration(tpnu, configuration, time_limit)
+    return status, description, perf_counter() - started
+
+
+class SolveServer(object):
+
+    MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+    # seconds given to a worker past the deadline of a request
+    # before the request is answered as timed out
+    GRACE_PERIOD = 5
+
+    def __init__(self, workers=1, cache_size=32, latency_window=1000):
+        self.workers = workers
+        # the number of models cached by the server, and by each worker
+        self.cache_size = cache_size
+        self.pool = self.new_pool()
+        # a request holds a slot while its solve runs in the pool
+        self.slots = asyncio.Semaphore(workers)
+        self.server = None
+
+        # content hash -> content, of the models that parsed,
+        # least recently used first
+        self.models = OrderedDict()
+        # content hash -> future of a parse in progress
+        self.parsing = {}
+
+        self.waiting = 0
+        self.running = 0
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # seconds from receiving a solve request to answering it
+        self.latencies = deque(maxlen=latency_window)
+
+    def new_pool(self):
+        # workers forked from the server would hold on to the connections
+        # open at the time, which would then not be closed with the response
+        context = None
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                   initializer=start_worker, initargs=(self.cache_size,))
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        # listen on a unix socket if a path is given, on a TCP port otherwise.
+        # Return the address listened on
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, body = await self.read_request(reader)
+                if method == "POST" and path == "/solve":
+                    code, result = await self.solve(body)
+                elif method == "GET" and path == "/metrics":
+                    code, result = 200, self.metrics()
+                else:
+                    code, result = 404, {"Error": "Unknown request: " + method + " " + path}
+            except Exception as e:
+                code, result = 400, {"Error": str(e)}
+
+            content = json.dumps(result).encode()
+            writer.write(("HTTP/1.1 " + str(code) + " " + SolveServer.reason(code) + "\r\n" +
+                          "Content-Type: application/json\r\n" +
+                          "Content-Length: " + str(len(content)) + "\r\n" +
+                          "Connection: close\r\n\r\n").encode() + content)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise Exception("Malformed request line")
+        method, path = request_line[0], request_line[1]
+
+        length = 0
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if line == "":
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+
+        if length > SolveServer.MAX_REQUEST_SIZE:
+            raise Exception("Request larger than " + str(SolveServer.MAX_REQUEST_SIZE) + " bytes")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, path, body
+
+    async def solve(self, body):
+        received = perf_counter()
+        self.requests += 1
+        request = json.loads(body)
+
+        deadline = request.get("Deadline")
+        configuration = SolveServer.configuration(request)
+        content = request["Model"].encode()
+        key = sha256(content).hexdigest()
+        cached = key in self.models
+
+        try:
+            await self.model(key, content)
+
+            # wait for a worker, unless the deadline passes first
+            self.waiting += 1
+            try:
+                if deadline is None:
+                    await self.slots.acquire()
+                else:
+                    await asyncio.wait_for(self.slots.acquire(), deadline - (perf_counter() - received))
+            finally:
+                self.waiting -= 1
+
+            queued = perf_counter() - received
+            time_limit = None if deadline is None else max(0, deadline - queued)
+            self.running += 1
+            future = asyncio.ensure_future(self.run(key, content, configuration, time_limit))
+            # the slot is only free once the worker is, even if the request timed out
+            future.add_done_callback(self.release)
+
+            if deadline is None:
+                status, description, seconds = await future
+            else:
+                status, description, seconds = await asyncio.wait_for(asyncio.shield(future),
+                                                                      time_limit + SolveServer.GRACE_PERIOD)
+            self.completed += 1
+            code = 200
+
+        except ModelError:
+            # answered as a bad request, as malformed JSON is
+            raise
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            code, status, description, seconds = 200, "TimedOut", None, None
+        except BrokenProcessPool:
+            # a worker died: start a new pool for the next requests
+            self.failed += 1
+            self.pool = self.new_pool()
+            code, status, description, seconds = 500, "Error: a worker process died", None, None
+        except Exception as e:
+            self.failed += 1
+            code, status, description, seconds = 500, "Error: " + str(e), None, None
+
+        latency = perf_counter() - received
+        self.latencies.append(latency)
+
+        result = {}
+        result["Status"] = status
+        result["Solution"] = description
+        result["Model"] = key
+        result["Cached"] = cached
+        result["SolveSeconds"] = seconds
+        result["Latency"] = latency
+        return code, result
+
+    async def run(self, key, content, configuration, time_limit):
+        # solve in a worker, sending it the content of the model
+        # only if it does not have the model cached
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.pool, solve_model, key, None, configuration, time_limit)
+        if result is None:
+            result = await loop.run_in_executor(self.pool, solve_model, key, content, configuration, time_limit)
+        return result
+
+    def release(self, future):
+        self.running -= 1
+        self.slots.release()
+        # retrieve the outcome of solves whose request timed out,
+        # so that their errors are not reported as unhandled
+        if not future.cancelled():
+            future.exception()
+
+    async def model(self, key, content):
+        # make sure that the model parses, in a worker which then has it cached.
+        # Raises a ModelError if it does not
+        if key in self.models:
+            self.cache_hits += 1
+            self.models.move_to_end(key)
+            return
+
+        # parse once, even if several requests for the model arrive together
+        self.cache_misses += 1
+        if key not in self.parsing:
+            self.parsing[key] = asyncio.get_running_loop().run_in_executor(self.pool, check_model, key, content)
+        try:
+            await asyncio.shield(self.parsing[key])
+        finally:
+            self.parsing.pop(key, None)
+
+        self.models[key] = content
+        if len(self.models) > self.cache_size:
+            self.models.popitem(last=False)
+
+    def metrics(self):
+        result = {}
+        result["Workers"] = self.workers
+        result["QueueDepth"] = self.waiting
+        result["Running"] = self.running
+        result["Requests"] = self.requests
+        result["Completed"] = self.completed
+        result["Failed"] = self.failed
+        result["TimedOut"] = self.timed_out
+        result["CachedModels"] = len(self.models)
+        result["CacheHits"] = self.cache_hits
+        result["CacheMisses"] = self.cache_misses
+
+        latencyObj = {}
+        latencies = sorted(self.latencies)
+        latencyObj["Count"] = len(latencies)
+        if len(latencies) > 0:
+            latencyObj["Mean"] = sum(latencies) / len(latencies)
+            latencyObj["P50"] = latencies[int(0.5 * (len(latencies) - 1))]
+            latencyObj["P95"] = latencies[int(0.95 * (len(latencies) - 1))]
+            latencyObj["Max"] = latencies[-1]
+        result["Latency"] = latencyObj
+
+        return result
+
+    @staticmethod
+    def configuration(request):
+        # the solver configuration of a request, from the names of its types
+        return SolverConfiguration.from_names(request.get("Solver", "CDRU"),
+                                              request.get("Feasibility", "DYNAMIC_CONTROLLABILITY"),
+                                              request.get("Objective", "MIN_COST"),
+                                              request.get("ChanceConstrained", "OFF"),
+                                              request.get("Options"))
+
+    @staticmethod
+    def reason(code):
+        if code == 200:
+            return "OK"
+        elif code == 400:
+            return "Bad Request"
+        elif code == 404:
+            return "Not Found"
+        else:
+            return "Internal Server Error"
+
+
+async def serve(host, port, path, workers, cache_size):
+    server = SolveServer(workers, cache_size)
+    address = await server.start(host, port, path)
+    print("Solve server listening on " + str(address))
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local CDRU solve server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--socket", default=None, help="listen on this unix socket instead")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache-size", type=int, default=32)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.socket, args.workers, args.cache_size))
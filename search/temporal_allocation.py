@@ -17,6 +17,13 @@ class TemporalAllocation(object):
         if self.allocated_ub is not None:
             self.constraint.relaxed_ub = self.allocated_ub
 
+    def retract(self):
+        if self.allocated_lb is not None:
+            self.constraint.relaxed_lb = None
+
+        if self.allocated_ub is not None:
+            self.constraint.relaxed_ub = None
+
     def pretty_print(self):
 
         a,b = (0-self.constraint.mean)/self.constraint.std,(1e6-self.constraint.mean)/self.constraint.std
@@ -15,6 +15,13 @@ class TemporalRelaxation(object):
         if self.relaxed_ub is not None:
             self.constraint.relaxed_ub = self.relaxed_ub
 
+    def retract(self):
+        if self.relaxed_lb is not None:
+            self.constraint.relaxed_lb = None
+
+        if self.relaxed_ub is not None:
+            self.constraint.relaxed_ub = None
+
     def pretty_print(self):
         if self.relaxed_lb is not None:
             cost = -1 * abs(self.relaxed_lb - self.constraint.lower_bound) * self.constraint.relax_cost_lb
@@ -12,7 +12,27 @@ from temporal_network.decision_variable import DecisionVariable
 from temporal_network.temporal_constraint import TemporalConstraint
 from temporal_network.assignment import Assignment
 from search.mip_encode import MipEncode
+from search.candidate import Candidate
+from search.conflict import Conflict
+from controllability.morris_n4_dc import EdgeSupport
+from search.conflict_index import ConflictIndex
+from search.quick_xplain import QuickXplain
+from search.candidate_table import CandidateTable
+from search.frontier import MemoryBound
+from search.network_edit import BoundEdit
+from search.portfolio import Portfolio, SolverConfiguration, SolverType
+import search.portfolio as portfolio
+from search.solve_server import SolveServer
+from search.batch_runner import BatchRunner
+import search.batch_runner as batch_runner
+from search.persistent_set import PersistentSet
 from datetime import datetime
+import tempfile
+import os
+import multiprocessing
+import json
+import asyncio
+import io
 import cProfile
 
 class SearchTests(unittest.TestCase):
@@ -45,6 +65,7 @@ class SearchTests(unittest.TestCase):
 
             print("Conflicts " + str(len(search_problem.known_conflicts)))
             print("Candidates " + str(search_problem.candidates_dequeued))
+            print("Statistics " + search_problem.statistics.json_print())
         else:
             print(example_file)
             print(None)
@@ -125,6 +146,508 @@ class SearchTests(unittest.TestCase):
 
         return tpnu
             
+    def test_variable_heuristics(self):
+        # z is guarded by y <- c, which is guarded by x <- a
+        tpnu = Tpnu('guards','guards')
+        variables = {}
+        for name in ['x','y','z']:
+            variable = DecisionVariable(name,name)
+            tpnu.add_decision_variable(variable)
+            variables[name] = variable
+        x_a = Assignment(variables['x'],'a',1)
+        y_c = Assignment(variables['y'],'c',2)
+        variables['x'].add_domain_value(x_a)
+        variables['x'].add_domain_value(Assignment(variables['x'],'b',4))
+        variables['y'].add_domain_value(y_c)
+        variables['z'].add_domain_value(Assignment(variables['z'],'e',3))
+        variables['y'].add_guard(x_a)
+        variables['z'].add_guard(y_c)
+
+        search_problem = SearchProblem(tpnu,FeasibilityType.CONSISTENCY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.update_variable_heuristics()
+        self.assertEqual(variables['z'].optimal_utility, 3)
+        self.assertEqual(variables['y'].optimal_utility, 5)
+        self.assertEqual(variables['x'].optimal_utility, 6)
+
+        # guarding x by z <- e closes a cycle
+        variables['x'].add_guard(Assignment(variables['z'],'e',3))
+        self.assertRaises(Exception, search_problem.update_variable_heuristics)
+
+    def test_conflict_index(self):
+        x = DecisionVariable('x','x')
+        x_a = Assignment(x,'a',0)
+        x_b = Assignment(x,'b',0)
+        x.add_domain_value(x_a)
+        x.add_domain_value(x_b)
+        y = DecisionVariable('y','y')
+        y_c = Assignment(y,'c',0)
+        y_d = Assignment(y,'d',0)
+        y.add_domain_value(y_c)
+        y.add_domain_value(y_d)
+
+        index = ConflictIndex()
+        conflict_x = Conflict()
+        conflict_x.add_assignment(x_a)
+        conflict_xy = Conflict()
+        conflict_xy.add_assignment(x_a)
+        conflict_xy.add_assignment(y_c)
+        index.add_conflict(conflict_x)
+        index.add_conflict(conflict_xy)
+
+        # a candidate that assigns x differently resolves both
+        candidate = Candidate()
+        candidate.add_assignment(x_b)
+        self.assertIsNone(index.first_unresolved(candidate))
+        self.assertEqual(candidate.conflict_cursor, 2)
+
+        # a candidate consistent with both is stopped at the first one
+        parent = Candidate()
+        parent.add_assignment(x_a)
+        self.assertIs(index.first_unresolved(parent), conflict_x)
+
+        # once the first conflict is resolved explicitly, the child is
+        # stopped at the second one, until y takes a different value
+        child = Candidate()
+        child.add_assignments(parent.assignments)
+        child.conflict_cursor = parent.conflict_cursor
+        child.conflict_horizon = parent.conflict_horizon
+        child.new_assignments = []
+        child.resolved_conflicts.add(conflict_x)
+        self.assertIs(index.first_unresolved(child), conflict_xy)
+
+        grandchild = Candidate()
+        grandchild.add_assignments(child.assignments)
+        grandchild.resolved_conflicts = child.resolved_conflicts.copy()
+        grandchild.conflict_cursor = child.conflict_cursor
+        grandchild.conflict_horizon = child.conflict_horizon
+        grandchild.new_assignments = []
+        grandchild.add_assignment(y_d)
+        self.assertEqual(index.resolved_by(grandchild.new_assignments), {1})
+        self.assertIsNone(index.first_unresolved(grandchild))
+
+    def test_conflict_store(self):
+        variables = []
+        for name in ['x', 'y', 'z']:
+            variable = DecisionVariable(name,name)
+            variable.add_domain_value(Assignment(variable,'a',0))
+            variable.add_domain_value(Assignment(variable,'b',0))
+            variables.append(variable)
+        x_a, y_a, z_a = [sorted(variable.domain, key=lambda assignment: assignment.value)[0] for variable in variables]
+        z_b = sorted(variables[2].domain, key=lambda assignment: assignment.value)[1]
+
+        tpnu = Tpnu('store','store')
+        for id in [1, 2]:
+            constraint = TemporalConstraint(id,str(id),1,2,0,1)
+            constraint.relaxable_ub = True
+            tpnu.add_temporal_constraint(constraint)
+
+        def conflict_of(assignments, constraint_id):
+            conflict = Conflict()
+            for assignment in assignments:
+                conflict.add_assignment(assignment)
+            conflict.add_negative_cycle({(EdgeSupport.UPPER, constraint_id): 1}, tpnu)
+            return conflict
+
+        index = ConflictIndex()
+        weak = conflict_of([x_a, y_a], 1)
+        other = conflict_of([z_a], 1)
+        nogood = Conflict()
+        nogood.add_assignment(x_a)
+        nogood.add_assignment(y_a)
+        self.assertEqual(index.add_conflict(weak), [])
+        self.assertEqual(index.add_conflict(other), [])
+        self.assertEqual(index.add_conflict(nogood), [])
+
+        # a conflict with fewer assignments does not replace
+        # one that relaxing its constraints does not resolve
+        elsewhere = conflict_of([x_a], 2)
+        self.assertEqual(index.add_conflict(elsewhere), [])
+        self.assertEqual(index.subsumed, 0)
+
+        # a conflict with a subset of the assignments of another, and the
+        # same cycles, replaces it. The nogood is kept
+        strong = conflict_of([x_a], 1)
+        self.assertEqual(index.add_conflict(strong), [weak])
+        self.assertEqual(index.subsumed, 1)
+        self.assertEqual(index.size, 4)
+        self.assertIsNone(index.conflicts[0])
+
+        candidate = Candidate()
+        candidate.add_assignment(x_a)
+        candidate.add_assignment(z_b)
+        self.assertIs(index.first_unresolved(candidate), nogood)
+        self.assertEqual(index.hit_rate(), 1.0)
+
+        # above the capacity, conflicts are evicted down to 90% of it,
+        # starting with those that never stopped a candidate.
+        # Nogoods are never evicted
+        capacity = ConflictIndex.CAPACITY
+        ConflictIndex.CAPACITY = 4
+        try:
+            newest = conflict_of([y_a], 2)
+            self.assertEqual(index.add_conflict(newest), [other, elsewhere])
+            self.assertEqual(index.evicted, 2)
+            self.assertEqual(index.size, 3)
+            self.assertIs(index.conflicts[2], nogood)
+        finally:
+            ConflictIndex.CAPACITY = capacity
+
+    def test_candidate_table(self):
+        x = DecisionVariable('x','x')
+        x_a = Assignment(x,'a',0)
+        x_b = Assignment(x,'b',0)
+        y = DecisionVariable('y','y')
+        y_c = Assignment(y,'c',0)
+
+        table = CandidateTable()
+        first = Candidate()
+        first.add_assignment(x_a)
+        self.assertTrue(table.add(first))
+
+        # same assignments, reached on another path
+        duplicate = Candidate()
+        duplicate.add_assignment(x_a)
+        self.assertFalse(table.add(duplicate))
+
+        # avoiding more assignments only removes solutions
+        restricted = Candidate()
+        restricted.add_assignment(x_a)
+        restricted.assignments_to_avoid.add(y_c)
+        self.assertFalse(table.add(restricted))
+
+        other = Candidate()
+        other.add_assignment(x_b)
+        self.assertTrue(table.add(other))
+        self.assertEqual(table.pruned, 2)
+
+        # dequeued candidates are still remembered,
+        # unless they go back to the queue
+        table.close(first)
+        self.assertFalse(table.add(duplicate))
+        table.reopen(first)
+        self.assertEqual(len(table.closed), 0)
+
+    def test_persistent_set(self):
+        parent = PersistentSet([1, 2])
+        child = parent.branch()
+        child.add(3)
+        # the parent keeps changing after branching
+        parent.add(4)
+        grandchild = child.branch()
+        grandchild.update([2, 5])
+
+        self.assertEqual(set(parent), {1, 2, 4})
+        self.assertEqual(set(child), {1, 2, 3})
+        self.assertEqual(set(grandchild), {1, 2, 3, 5})
+        self.assertEqual(len(grandchild), 4)
+        self.assertTrue({1, 3} <= grandchild)
+        self.assertFalse(4 in grandchild)
+        # only the elements added since the shared layers are revisited
+        self.assertEqual(set(grandchild.unshared(child)), {5})
+
+        # long chains are merged into a shared base
+        node = grandchild
+        for element in range(10, 10 + 2 * PersistentSet.MAX_LAYERS):
+            node.add(element)
+            node = node.branch()
+        self.assertTrue(len(node.layers) <= PersistentSet.MAX_LAYERS)
+        self.assertEqual(len(node), 4 + 2 * PersistentSet.MAX_LAYERS)
+        self.assertEqual(set(node), set(grandchild) | set(range(10, 10 + 2 * PersistentSet.MAX_LAYERS)))
+
+    def test_parallel_checks(self):
+        # speculative checks in worker processes
+        # must not change the solution
+        utilities = []
+        for parallel_checks in [0, 2]:
+            tpnu = self.getProblemFromFile(join(self.examples_dir, 'Route1_2_2.cctp'))
+            search_problem = SearchProblem(tpnu,FeasibilityType.DYNAMIC_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF,parallel_checks)
+            search_problem.initialize()
+            solution = search_problem.next_solution()
+            self.assertIsNone(search_problem.consistent(solution))
+            utilities.append(solution.g)
+
+        self.assertAlmostEqual(utilities[0], utilities[1])
+
+        # the worker processes end with the search
+        self.assertIsNone(search_problem.parallel_checker.pool)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_anytime(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.initialize()
+
+        # stop early, then resume from where the search stopped
+        self.assertIsNone(search_problem.next_solution(max_expansions=10))
+        statistics = search_problem.search_statistics()
+        self.assertTrue(statistics["BudgetExhausted"])
+        self.assertEqual(statistics["Expansions"], 10)
+        bound = statistics["UpperBound"]
+
+        solution = search_problem.next_solution(time_limit=600)
+        statistics = search_problem.search_statistics()
+        self.assertFalse(statistics["BudgetExhausted"])
+        self.assertEqual(statistics["Gap"], 0)
+        self.assertTrue(solution.g <= bound)
+        self.assertTrue(fabs(solution.g - 19140.6285) < 1e-3)
+
+        # without parallel checks, the best complete candidates
+        # in the queue are checked once the budget runs out
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF,
+                                       parallel_checks=0)
+        search_problem.initialize()
+        incumbent = None
+        while incumbent is None:
+            incumbent = search_problem.next_solution(max_expansions=5)
+        self.assertIsNone(search_problem.consistent(incumbent))
+        statistics = search_problem.search_statistics()
+        self.assertTrue(statistics["BudgetExhausted"])
+        self.assertTrue(statistics["Gap"] > 0)
+        self.assertTrue(incumbent.g <= search_problem.next_solution().g)
+
+    def test_memory_bound(self):
+        # SMA* drops candidates but stays optimal
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF,
+                                       memory_bound=MemoryBound.SMA,frontier_limit=32)
+        search_problem.initialize()
+        solution = search_problem.next_solution()
+        self.assertTrue(search_problem.search_statistics()["CandidatesDropped"] > 0)
+        self.assertTrue(fabs(solution.g - 19140.6285) < 1e-3)
+
+        # beam search may not, but bounds the utility it misses
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF,
+                                       memory_bound=MemoryBound.BEAM,frontier_limit=4)
+        search_problem.initialize()
+        solution = search_problem.next_solution()
+        self.assertIsNone(search_problem.consistent(solution))
+        self.assertTrue(search_problem.queue.qsize() <= 4)
+        self.assertTrue(search_problem.upper_bound >= solution.g)
+
+    def test_checkpoint(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.initialize()
+        self.assertIsNone(search_problem.next_solution(max_expansions=20))
+
+        # resume on another parse of the same problem
+        path = join(tempfile.mkdtemp(), 'AUV-2.checkpoint')
+        search_problem.checkpoint(path)
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        resumed_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        resumed_problem.resume(path)
+        self.assertEqual(resumed_problem.candidates_dequeued, 20)
+        self.assertEqual(resumed_problem.queue.qsize(), search_problem.queue.qsize())
+        self.assertEqual(len(resumed_problem.known_conflicts), len(search_problem.known_conflicts))
+
+        solution = resumed_problem.next_solution()
+        self.assertIsNone(resumed_problem.consistent(solution))
+        self.assertTrue(fabs(solution.g - 19140.6285) < 1e-3)
+
+        # but not on another problem
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-3.cctp'))
+        other_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        self.assertRaises(Exception, other_problem.resume, path)
+
+    def test_resolve(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'Route1_2_2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.DYNAMIC_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.initialize()
+        search_problem.next_solution()
+
+        # tighten a constraint of one of the conflicts
+        conflicts = [conflict for conflict in search_problem.known_conflicts if len(conflict.negative_cycles) > 0]
+        constraint = sorted(conflicts[0].negative_cycles.pop().constraints.keys(), key=lambda key: str(key[0].id))[0][0]
+        upper_bound = constraint.lower_bound + 0.9 * (constraint.upper_bound - constraint.lower_bound)
+        kept = [conflict for conflict in search_problem.known_conflicts if constraint not in conflict.constraints]
+
+        solution = search_problem.resolve([BoundEdit(constraint.id,upper_bound=upper_bound)])
+        self.assertEqual(search_problem.conflicts_reused, len(kept))
+        self.assertEqual(constraint.upper_bound, upper_bound)
+        self.assertIsNone(search_problem.consistent(solution))
+
+        # same solution as from scratch
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'Route1_2_2.cctp'))
+        BoundEdit(constraint.id,upper_bound=upper_bound).apply(tpnu)
+        cold_problem = SearchProblem(tpnu,FeasibilityType.DYNAMIC_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        cold_problem.initialize()
+        self.assertTrue(fabs(solution.g - cold_problem.next_solution().g) < 1e-3)
+
+    def test_portfolio(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        configurations = [SolverConfiguration(SolverType.CDRU,FeasibilityType.STRONG_CONTROLLABILITY),
+                          SolverConfiguration(SolverType.CDRU,FeasibilityType.STRONG_CONTROLLABILITY,options={"conflict_checks":16})]
+        result = Portfolio(tpnu,configurations).solve()
+
+        self.assertEqual(result["Status"], "Optimal")
+        self.assertTrue(fabs(result["Solution"]["Utility"] - 19140.6285) < 1e-3)
+        self.assertEqual(len(result["Solvers"]), 2)
+        for solver in result["Solvers"]:
+            self.assertIn(solver["Status"], ["Optimal", "Cancelled"])
+
+        # a solver that dies without reporting is recorded as failed
+        def crash(tpnu, configuration, time_limit=None):
+            os._exit(137)
+
+        solve_configuration = portfolio.solve_configuration
+        portfolio.solve_configuration = crash
+        try:
+            result = Portfolio(tpnu,configurations[:1]).solve()
+        finally:
+            portfolio.solve_configuration = solve_configuration
+        self.assertEqual(result["Status"], "Unknown")
+        self.assertEqual(result["Solvers"][0]["Status"], "Error: exit code 137")
+
+        # beam search that runs out of candidates after dropping some
+        # has not proven the problem infeasible, so the exact solver wins.
+        # Here the best value of x is inconsistent, and beam search drops the other
+        tpnu = Tpnu('beam','beam')
+        tpnu.num_nodes = 2
+        tpnu.node_number_to_id[1] = 'A'
+        tpnu.node_number_to_id[2] = 'B'
+        x = DecisionVariable('x','x')
+        tpnu.add_decision_variable(x)
+        x_a = Assignment(x,'a',10)
+        x.add_domain_value(x_a)
+        x.add_domain_value(Assignment(x,'b',1))
+        tpnu.add_temporal_constraint(TemporalConstraint(1,'c1',1,2,0,10))
+        guarded = TemporalConstraint(2,'c2',1,2,20,30)
+        guarded.add_guard(x_a)
+        tpnu.add_temporal_constraint(guarded)
+
+        beam = SolverConfiguration(SolverType.CDRU,FeasibilityType.CONSISTENCY,
+                                   options={"memory_bound":MemoryBound.BEAM,"frontier_limit":1})
+        exact = SolverConfiguration(SolverType.CDRU,FeasibilityType.CONSISTENCY)
+        self.assertEqual(portfolio.solve_configuration(tpnu,beam), ("Unknown", None))
+        result = Portfolio(tpnu,[beam,exact]).solve()
+        self.assertEqual(result["Solver"], exact.name)
+        self.assertEqual(result["Status"], "Optimal")
+        self.assertEqual(result["Solution"]["Utility"], 1)
+
+    def test_solve_server(self):
+        with open(join(self.examples_dir, 'Route1_2_2.cctp')) as f:
+            model = f.read()
+
+        async def request(address, method, path, body=b""):
+            reader, writer = await asyncio.open_connection(address[0], address[1])
+            writer.write((method + " " + path + " HTTP/1.1\r\nContent-Length: " + str(len(body)) + "\r\n\r\n").encode() + body)
+            response = await reader.read()
+            writer.close()
+            head, _, content = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(content)
+
+        async def run():
+            server = SolveServer(workers=1)
+            address = await server.start()
+            try:
+                body = json.dumps({"Model": model, "Feasibility": "DYNAMIC_CONTROLLABILITY"}).encode()
+                first = await request(address, "POST", "/solve", body)
+                second = await request(address, "POST", "/solve", body)
+                metrics = await request(address, "GET", "/metrics")
+                # a model that does not parse is a bad request
+                malformed = await request(address, "POST", "/solve", json.dumps({"Model": "<cctp"}).encode())
+            finally:
+                await server.close()
+            return first, second, metrics, malformed
+
+        (code, first), (_, second), (_, metrics), (malformed_code, malformed) = asyncio.run(run())
+        self.assertEqual(code, 200)
+        self.assertEqual(first["Status"], "Optimal")
+        self.assertFalse(first["Cached"])
+        self.assertTrue(second["Cached"])
+        self.assertTrue(fabs(first["Solution"]["Utility"] - second["Solution"]["Utility"]) < 1e-3)
+        self.assertEqual(metrics["Completed"], 2)
+        self.assertEqual(metrics["CacheHits"], 1)
+        self.assertEqual(metrics["QueueDepth"], 0)
+        self.assertEqual(metrics["Latency"]["Count"], 2)
+        self.assertEqual(malformed_code, 400)
+        self.assertTrue("Error" in malformed)
+
+    def test_batch_runner(self):
+        paths = BatchRunner.files(join(self.examples_dir, 'Route1_2_*.cctp'))
+        self.assertEqual(len(paths), 2)
+
+        output = io.StringIO()
+        configuration = SolverConfiguration.from_names(feasibility="DYNAMIC_CONTROLLABILITY")
+        records = BatchRunner(configuration,workers=2,time_limit=60,output=output).run(paths)
+
+        self.assertEqual([record["Path"] for record in records], paths)
+        self.assertEqual([record["Status"] for record in records], ["Optimal", "Optimal"])
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(sorted(line["TestName"] for line in lines), ["Route1_2_1.cctp", "Route1_2_2.cctp"])
+
+        # a worker that dies fails its file, and is replaced for the next one
+        def crash(tpnu, configuration, time_limit=None):
+            os._exit(137)
+
+        solve_configuration = batch_runner.solve_configuration
+        batch_runner.solve_configuration = crash
+        try:
+            records = BatchRunner(configuration,workers=1).run(paths)
+        finally:
+            batch_runner.solve_configuration = solve_configuration
+        self.assertEqual([record["Status"] for record in records], ["Error: the worker process died"] * 2)
+
+    def test_conflict_minimization(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'AUV-2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.STRONG_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF,conflict_checks=16)
+        search_problem.initialize()
+
+        solution = search_problem.next_solution()
+        self.assertTrue(search_problem.minimization_checks > 0)
+        self.assertTrue(fabs(solution.g - 19140.6285) < 1e-3)
+        self.assertIsNone(search_problem.consistent(solution))
+
+        # of two negative cycles, each inconsistent on its own,
+        # only the shortest one is kept
+        tpnu = Tpnu('cycles','cycles')
+        tpnu.num_nodes = 3
+        for node in [1, 2, 3]:
+            tpnu.node_number_to_id[node] = str(node)
+        for id, fro, to, lower_bound, upper_bound in [(1,1,2,0,2), (2,2,3,0,2), (3,1,3,5,5), (4,1,2,3,3)]:
+            constraint = TemporalConstraint(id,str(id),fro,to,lower_bound,upper_bound)
+            constraint.relaxable_ub = True
+            tpnu.add_temporal_constraint(constraint)
+        tpnu.initialize()
+
+        conflict = Conflict()
+        conflict.add_negative_cycle({(EdgeSupport.UPPER, 1): 1, (EdgeSupport.UPPER, 2): 1, (EdgeSupport.LOWER, 3): -1}, tpnu)
+        conflict.add_negative_cycle({(EdgeSupport.UPPER, 1): 1, (EdgeSupport.LOWER, 4): -1}, tpnu)
+        minimization = QuickXplain(tpnu,FeasibilityType.CONSISTENCY,16)
+        minimized = minimization.minimize(conflict)
+        self.assertTrue(minimization.checks > 0)
+        self.assertEqual(len(minimized.negative_cycles), 1)
+        self.assertEqual(minimized.constraints, {tpnu.temporal_constraints[1], tpnu.temporal_constraints[4]})
+        self.assertTrue(all(constraint.activated for constraint in tpnu.temporal_constraints.values()))
+
+    def test_search_statistics(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'Route1_2_2.cctp'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.DYNAMIC_CONTROLLABILITY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.initialize()
+        search_problem.next_solution()
+
+        statistics = json.loads(search_problem.statistics.json_print())
+        phases = statistics["Phases"]
+        self.assertEqual(phases["ConflictResolution"]["Calls"], search_problem.candidates_dequeued)
+        self.assertTrue(phases["Check:DynamicControllability"]["Calls"] > 0)
+        self.assertTrue(phases["Relaxation:MinCost"]["Calls"] > 0)
+        self.assertEqual(statistics["Timeline"][-1]["Candidates"], search_problem.candidates_dequeued)
+
+    def test_iter_solutions(self):
+        tpnu = self.getProblemFromFile(join(self.examples_dir, 'Zipcar-8.tpn'))
+        search_problem = SearchProblem(tpnu,FeasibilityType.CONSISTENCY,ObjectiveType.MIN_COST,ChanceConstrained.OFF)
+        search_problem.initialize()
+
+        solutions = [solution for solution, conflicts in search_problem.iter_solutions(4)]
+        self.assertEqual(len(solutions), 4)
+        self.assertTrue(fabs(solutions[0].g - 29943.3936) < 1e-3)
+        # best first, and never the same assignments twice
+        for previous, solution in zip(solutions, solutions[1:]):
+            self.assertTrue(solution.g <= previous.g)
+        self.assertEqual(len(set(frozenset(solution.assignments) for solution in solutions)), 4)
+
     def test_cdru_basic(self):
         f_type = FeasibilityType.CONSISTENCY
         o_type = ObjectiveType.MIN_COST